@@ -0,0 +1,86 @@
+"""Capacity-aware admission control for the tasks that the AWS Executors launch"""
+
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+
+# Failure reasons that RunTask returns when the cluster (RESOURCE:*, AGENT) or Fargate (ex: Fargate Spot) is out of
+# capacity. Fargate's reason reads 'Capacity is unavailable at this time. Please try again later or in a different
+# availability zone'.
+CAPACITY_FAILURE_REASONS = ('AGENT',)
+CAPACITY_FAILURE_PREFIXES = ('RESOURCE:', 'Capacity is unavailable')
+
+
+class CapacityAdmissionController:
+    """
+    Decides how many pending tasks of each launch target (the executor's default kwargs, or a queue route) may be
+    launched on each heartbeat, based on the capacity failures of the target's previous launches. After a capacity
+    failure (ex: RESOURCE:MEMORY), the target's launches stop for an exponentially growing backoff that's tracked per
+    failure reason. Once every backoff of the target has elapsed, a single task is admitted as a probe. If the probe
+    launches, the target's backoffs are reset and the rest of its tasks are released; otherwise its failure reasons
+    back off again, for twice as long. Targets don't hold each other back.
+    A backoff of zero seconds disables admission control, so that every pending task is always admitted.
+    """
+
+    def __init__(self, initial_backoff: float = 0.0, max_backoff: float = 300.0,
+                 capacity_reasons: Iterable[str] = CAPACITY_FAILURE_REASONS,
+                 capacity_prefixes: Iterable[str] = CAPACITY_FAILURE_PREFIXES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.capacity_reasons = frozenset(capacity_reasons)
+        self.capacity_prefixes = tuple(capacity_prefixes)
+        self.clock = clock
+        # Target -> failure reason -> (consecutive capacity failures, time at which launches may be probed again), of
+        # the targets that are backing off
+        self._backoffs: Dict[Hashable, Dict[str, Tuple[int, float]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether capacity failures hold back launches"""
+        return self.initial_backoff > 0
+
+    @property
+    def holding_back(self) -> bool:
+        """Whether any target's launches are being held back"""
+        return bool(self._backoffs)
+
+    def backing_off(self, target: Hashable = None) -> List[str]:
+        """The capacity failure reasons that are currently holding back the launches of the target"""
+        return sorted(self._backoffs.get(target, ()))
+
+    def is_capacity_failure(self, reason: str) -> bool:
+        """Whether a RunTask failure reason means that the cluster or Fargate is out of capacity"""
+        return reason in self.capacity_reasons or reason.startswith(self.capacity_prefixes)
+
+    def admit(self, target: Hashable, queue_len: int) -> int:
+        """The number of tasks, out of the target's queue_len pending tasks, that may be launched now"""
+        backoffs = self._backoffs.get(target)
+        if not self.enabled or not backoffs or not queue_len:
+            return queue_len
+        if self.clock() < max(retry_at for _, retry_at in backoffs.values()):
+            return 0
+        return 1
+
+    def record(self, target: Hashable, failure_reasons: Dict[str, int], launched: int):
+        """
+        Records the outcome of a round of the target's launches, given the failure reasons of its tasks that didn't
+        launch and the number of its tasks that did. Capacity failures (re)start the backoff of their reasons.
+        Otherwise, every backoff of the target is reset as long as a task launched; a probe that failed for any other
+        reason says nothing about capacity.
+        """
+        if not self.enabled:
+            return
+        capacity_failures = [reason for reason in failure_reasons if self.is_capacity_failure(reason)]
+        if not capacity_failures:
+            if launched:
+                self._backoffs.pop(target, None)
+            return
+        now = self.clock()
+        backoffs = self._backoffs.setdefault(target, {})
+        for reason in capacity_failures:
+            failures = backoffs.get(reason, (0, now))[0] + 1
+            backoffs[reason] = (failures, now + self.backoff(failures))
+
+    def backoff(self, failures: int) -> float:
+        """Seconds to hold back launches after the given number of consecutive capacity failures"""
+        return min(self.initial_backoff * 2 ** (failures - 1), self.max_backoff)
@@ -0,0 +1,95 @@
+"""
+Batch array jobs: one SubmitJob call for a burst of same-shaped tasks. Every child of an array job runs this module,
+which picks the child's Airflow command out of the job's command manifest by the child's array index:
+
+    python -m airflow_aws_executors.array_jobs '<base64 of the zlib-compressed JSON list of commands>'
+"""
+
+import base64
+import json
+import logging
+import os
+import sys
+import zlib
+from typing import Any, Iterable, List, Optional
+
+from .packing import TaskArray, group_compatible
+
+log = logging.getLogger(__name__)
+
+# AWS Batch array jobs have between 2 and 10,000 children
+MIN_ARRAY_SIZE = 2
+MAX_ARRAY_SIZE = 10000
+ARRAY_JOB_COMMAND = ['python', '-m', 'airflow_aws_executors.array_jobs']
+ARRAY_INDEX_VARIABLE = 'AWS_BATCH_JOB_ARRAY_INDEX'
+# SubmitJob requests can't be larger than 30 KiB, so array jobs are split until their manifest is at most this long
+MAX_MANIFEST_LENGTH = 20 * 1024
+
+
+def encode_manifest(commands: Iterable[List[str]]) -> str:
+    """Encodes a command manifest. The commands of a burst of tasks are much alike, so they compress well"""
+    manifest = json.dumps([list(command) for command in commands], separators=(',', ':'))
+    return base64.b64encode(zlib.compress(manifest.encode('utf-8'), 9)).decode('ascii')
+
+
+def decode_manifest(manifest: str) -> List[List[str]]:
+    """Decodes a command manifest"""
+    return json.loads(zlib.decompress(base64.b64decode(manifest)).decode('utf-8'))
+
+
+class ArrayJobBuilder:
+    """
+    Groups compatible queued jobs (same queue and same executor config) into array jobs of at most array_size
+    children. Queued jobs are namedtuples of (key, command, queue, executor_config), such as the Batch executor's
+    pending jobs; an array job is one of them whose key is a TaskArray, and whose command runs the command of the
+    child's array index. Array jobs are ordered by their first job, and jobs that are alone in their group, or that are
+    already array jobs (ex: held for resubmission), are left as they are.
+    """
+
+    def __init__(self, array_size: int):
+        if not MIN_ARRAY_SIZE <= array_size <= MAX_ARRAY_SIZE:
+            raise ValueError('array_size must be between {} and {}. Got {}'.format(
+                MIN_ARRAY_SIZE, MAX_ARRAY_SIZE, array_size))
+        self.array_size = array_size
+
+    def build(self, queued_jobs: Iterable[Any]) -> List[Any]:
+        """Groups the given queued jobs into array jobs, in order"""
+        array_jobs = []
+        for group in group_compatible(queued_jobs, self.array_size,
+                                      lambda queued_job: not isinstance(queued_job.key, TaskArray)):
+            array_jobs.extend(self.__make_array_jobs(group))
+        return array_jobs
+
+    def __make_array_jobs(self, group: List[Any]) -> List[Any]:
+        if len(group) < MIN_ARRAY_SIZE:
+            return group
+        manifest = encode_manifest(queued_job.command for queued_job in group)
+        if len(manifest) > MAX_MANIFEST_LENGTH:
+            middle = len(group) // 2
+            return self.__make_array_jobs(group[:middle]) + self.__make_array_jobs(group[middle:])
+        return [group[0]._replace(
+            key=TaskArray(tuple(queued_job.key for queued_job in group)),
+            command=ARRAY_JOB_COMMAND + [manifest]
+        )]
+
+
+def child_job_id(array_job_id: str, array_index: int) -> str:
+    """The job ID of a child of an array job"""
+    return '{}:{}'.format(array_job_id, array_index)
+
+
+def main(args: Optional[List[str]] = None, environ=os.environ, execvp=os.execvp):
+    """Runs the Airflow command of this child of an array job, in place of this process"""
+    logging.basicConfig(level=logging.INFO)
+    args = args if args is not None else sys.argv[1:]
+    if len(args) != 1 or ARRAY_INDEX_VARIABLE not in environ:
+        raise SystemExit('Usage: {} MANIFEST, in a child of an AWS Batch array job'.format(
+            ' '.join(ARRAY_JOB_COMMAND)))
+    array_index = int(environ[ARRAY_INDEX_VARIABLE])
+    command = decode_manifest(args[0])[array_index]
+    log.info('Running command %s of the array job: %s', array_index, command)
+    execvp(command[0], command)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 """AWS Batch Executor. Each Airflow task gets deligated out to an AWS Batch Job"""
 
 import time
-from copy import deepcopy
-from typing import Any, Dict, List, Optional, Tuple
+from collections import defaultdict, namedtuple
+from concurrent.futures import Future
+from concurrent.futures import wait as wait_for_futures
+from numbers import Real
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 import boto3
 from airflow.configuration import conf
@@ -11,9 +14,24 @@ from airflow.utils.module_loading import import_string
 from airflow.utils.state import State
 from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load
 
+from .array_jobs import ArrayJobBuilder, child_job_id
+from .concurrency import BotoClientPool
+from .decoding import load_list, load_member, load_object
+from .journal import StateJournal
+from .metrics import ExecutorMetrics
+from .packing import TaskArray, TaskPacker, task_keys, unpack_states
+from .polling import StatusPollingScheduler
+from .routing import QueueRoute, distinct_routes, load_queue_routes
+from .tagging import TaggedTaskMatcher, task_key_tags
+from .templating import RequestTemplate
+from .throttling import AdaptiveRateLimiter, error_code
+from .timeline import (FINISHED, LAUNCH_FAILED, LAUNCHED, QUEUED, RUNNING,
+                       STOPPED, TaskTimeline, epoch_seconds)
+
 CommandType = List[str]
 TaskInstanceKeyType = Tuple[Any]
 ExecutorConfigType = Dict[str, Any]
+BatchQueuedJob = namedtuple('BatchQueuedJob', ('key', 'command', 'queue', 'executor_config'))
 
 
 class BatchJob:
@@ -30,10 +48,17 @@ class BatchJob:
         'FAILED': State.FAILED
     }
 
-    def __init__(self, job_id: str, status: str, status_reason: Optional[str] = None):
+    def __init__(self, job_id: str, status: str, status_reason: Optional[str] = None,
+                 stopped_at: Optional[int] = None, exit_code: Optional[int] = None,
+                 created_at: Optional[float] = None):
         self.job_id = job_id
         self.status = status
         self.status_reason = status_reason
+        # Milliseconds since the epoch
+        self.stopped_at = stopped_at
+        self.created_at = created_at
+        # The exit code of the job's container, once it has exited
+        self.exit_code = exit_code
 
     def get_job_state(self) -> str:
         """
@@ -67,47 +92,304 @@ class AwsBatchExecutor(BaseExecutor):
     """
     # AWS only allows a maximum number of JOBs in the describe_jobs function
     DESCRIBE_JOBS_BATCH_SIZE = 99
+    # Number of SubmitJob attempts for a task in the submission pipeline before the task is marked as failed.
+    MAX_SUBMIT_JOB_ATTEMPTS = 3
+    # How sync() finds finished jobs. 'describe_jobs' describes every active job that is due for a status check.
+    # 'list_jobs' lists the SUCCEEDED and FAILED jobs in the job queue, and only describes the active ones.
+    SYNC_STRATEGIES = ('describe_jobs', 'list_jobs')
+    # AWS returns at most 1000 jobs per ListJobs page when filtering by status
+    LIST_JOBS_PAGE_SIZE = 1000
+    FINISHED_JOB_STATUSES = ('SUCCEEDED', 'FAILED')
+    # The list_jobs strategy only lists the jobs that were created after the oldest tracked job, less this margin for
+    # the skew between the scheduler's clock and AWS', and for jobs that are tracked a while after they're submitted
+    LIST_JOBS_CLOCK_SKEW_SECONDS = 300
+    LIVE_JOB_STATUSES = ('SUBMITTED', 'PENDING', 'RUNNABLE', 'STARTING', 'RUNNING')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.active_workers: Optional[BatchJobCollection] = None
         self.batch = None
         self.submit_job_kwargs = None
+        self.submit_job_template: Optional[RequestTemplate] = None
+        self.region: Optional[str] = None
+        self.submit_pool: Optional[BotoClientPool] = None
+        self.status_poller: Optional[StatusPollingScheduler] = None
+        self.sync_strategy = 'describe_jobs'
+        self.full_sync_interval = 300.0
+        self.last_full_sync: Optional[float] = None
+        # Seconds since the epoch, when jobs are submitted
+        self.wall_clock: Callable[[], float] = time.time
+        self.pending_submissions: Dict[Future, BatchQueuedJob] = {}
+        self.submit_failure_counts: Dict[TaskInstanceKeyType, int] = defaultdict(int)
+        self.rate_limiter: Optional[AdaptiveRateLimiter] = None
+        self.journal: Optional[StateJournal] = None
+        self.adopt_by_tags = False
+        self.max_runnable_seconds = 0.0
+        self.stuck_job_ids: Set[str] = set()
+        self.metrics = ExecutorMetrics('batch_executor')
+        self.timeline: Optional[TaskTimeline] = None
+        self.packer: Optional[TaskPacker] = None
+        self.array_builder: Optional[ArrayJobBuilder] = None
+        self.pending_jobs: List[BatchQueuedJob] = []
+        self.routes: Dict[str, QueueRoute] = {}
 
     def start(self):
         """Initialize Boto3 Batch Client, and other internal variables"""
-        region = conf.get('batch', 'region')
-        self.active_workers = BatchJobCollection()
-        self.batch = boto3.client('batch', region_name=region)
+        self.region = conf.get('batch', 'region')
+        # Optionally journal the tracked jobs, so that a restarted scheduler adopts them instead of resubmitting them
+        state_journal = conf.get('batch', 'state_journal', fallback=None)
+        self.journal = StateJournal(
+            state_journal, compact_rows=conf.getint('batch', 'state_journal_compact_rows', fallback=10000)
+        ) if state_journal else None
+        self.active_workers = BatchJobCollection(self.journal)
+        self.batch = boto3.client('batch', region_name=self.region)
         self.submit_job_kwargs = self._load_submit_kwargs()
+        self.status_poller = StatusPollingScheduler.from_config(conf.get('batch', 'polling_tiers', fallback=None))
+        self.sync_strategy = conf.get('batch', 'sync_strategy', fallback='describe_jobs')
+        if self.sync_strategy not in self.SYNC_STRATEGIES:
+            raise ValueError('Batch sync_strategy must be one of {}. Got {}'.format(
+                self.SYNC_STRATEGIES, self.sync_strategy))
+        self.full_sync_interval = conf.getfloat('batch', 'full_sync_interval', fallback=300.0)
+        # Optionally tag submitted jobs with their Airflow task key, so that orphaned task instances can be adopted
+        self.adopt_by_tags = conf.getboolean('batch', 'adopt_by_tags', fallback=False)
+        # Optionally warn about jobs that have been waiting in RUNNABLE for longer than this many seconds
+        self.max_runnable_seconds = conf.getfloat('batch', 'max_runnable_seconds', fallback=0.0)
+        # Every Batch call is rate limited by a limiter that's shared by all threads, and throttled calls are retried
+        self.rate_limiter = AdaptiveRateLimiter.from_config(
+            conf.get('batch', 'api_rate_limits', fallback=None),
+            max_retries=conf.getint('batch', 'api_max_retries', fallback=3)
+        )
+        self.rate_limiter.on_call = self.metrics.api_call
+        # Optionally record the lifecycle of every job to a rotating JSONL file, or to a custom sink
+        task_timeline_sink = conf.get('batch', 'task_timeline_sink', fallback=None)
+        self.timeline = TaskTimeline.from_config(
+            'batch', conf.get('batch', 'task_timeline', fallback=None),
+            import_string(task_timeline_sink) if task_timeline_sink else None
+        )
+        # Optionally submit jobs in the background on a pool of threads, each with its own Boto3 client.
+        # The pool size is the maximum number of SubmitJob calls in-flight at any time.
+        submit_job_concurrency = conf.getint('batch', 'submit_job_concurrency', fallback=0)
+        if submit_job_concurrency > 0:
+            self.submit_pool = BotoClientPool(self._create_batch_client, submit_job_concurrency,
+                                              thread_name_prefix='batch-submit-job')
+        # Optionally pack compatible tasks into one job that runs all of their commands. Tasks are then held until the
+        # next heartbeat, and submitted in packs.
+        pack_size = conf.getint('batch', 'pack_size', fallback=1)
+        if pack_size > 1:
+            self.packer = TaskPacker(pack_size, conf.get('batch', 'pack_mode', fallback='concurrent'))
+        # Optionally submit compatible tasks (or packs) as the children of one array job. Tasks are then held until the
+        # next heartbeat as well.
+        array_size = conf.getint('batch', 'array_size', fallback=0)
+        if array_size > 1:
+            # The children of an array job can't all be tagged with their task keys (AWS allows 50 tags per job)
+            if self.adopt_by_tags:
+                raise ValueError('Batch array_size and adopt_by_tags can\'t both be set: array jobs can\'t be adopted '
+                                 'by their tags')
+            self.array_builder = ArrayJobBuilder(array_size)
+        # Optionally submit the jobs of some Airflow queues with their own SubmitJob kwargs (ex: job queue, job
+        # definition) and region. Every other queue uses submit_job_kwargs.
+        self.routes = load_queue_routes(
+            conf.get('batch', 'queue_routes', fallback=None), self.submit_job_kwargs, self.region,
+            lambda region: boto3.client('batch', region_name=region),
+            lambda submit_job_kwargs: RequestTemplate(submit_job_kwargs, ('containerOverrides',))
+        )
+        if self.journal:
+            self.__restore_journaled_jobs()
+
+    def __restore_journaled_jobs(self):
+        """Rebuilds the active jobs from the state journal, and reconciles them with one bulk describe"""
+        records = self.journal.load()
+        self.journal.compact(records)
+        if not records:
+            return
+        for record in records:
+            self.active_workers.restore(record.task_id, record.key, record.info)
+            self.running.update(task_keys(record.key))
+        self.log.info('Restored %s jobs from the state journal at %s', len(records), self.journal.path)
+        self.status_poller.full_sweep = True
+        try:
+            self.sync_running_jobs()
+        finally:
+            self.status_poller.full_sweep = False
+        self.journal.flush()
+
+    def try_adopt_task_instances(self, tis):
+        """
+        Adopts the task instances that are being tracked, for example after being restored from the state journal.
+        The scheduler resets the rest.
+        """
+        tracked_keys = {key for task_key in self.active_workers.key_to_id for key in task_keys(task_key)}
+        not_adopted = [ti for ti in tis if ti.key not in tracked_keys]
+        if self.adopt_by_tags and not_adopted:
+            adopted_keys = self.__adopt_tagged_jobs(not_adopted)
+            self.log.info('Adopted %s of %s orphaned tasks by their tags', len(adopted_keys), len(not_adopted))
+            not_adopted = [ti for ti in not_adopted if ti.key not in adopted_keys]
+        return not_adopted
+
+    def __adopt_tagged_jobs(self, tis) -> Set[TaskInstanceKeyType]:
+        """
+        Finds the live Batch jobs that were submitted for the given task instances, by the Airflow task key that
+        they were tagged with, and tracks them. A pack is adopted once all of its tasks are orphaned. Returns the keys
+        of the adopted task instances.
+        """
+        matcher = TaggedTaskMatcher(tis)
+        adopted_keys = set()
+        for route in [None] + self.__listed_routes():
+            if not matcher:
+                break
+            adopted_keys.update(self.__adopt_tagged_route_jobs(matcher, route))
+        return adopted_keys
+
+    def __adopt_tagged_route_jobs(self, matcher: TaggedTaskMatcher,
+                                  route: Optional[QueueRoute]) -> Set[TaskInstanceKeyType]:
+        """Adopts the tagged jobs in the job queue of a route (or the default one), popping their task instances"""
+        batch_client = route.client if route else self.batch
+        untracked_job_ids = [job_id for job_id in sorted(self._list_job_ids(self.LIVE_JOB_STATUSES, route))
+                             if job_id not in self.active_workers.id_to_key]
+        adopted_keys = set()
+        for i in range(0, len(untracked_job_ids), self.DESCRIBE_JOBS_BATCH_SIZE):
+            if not matcher:
+                break
+            boto_describe_jobs = self.rate_limiter.call(
+                'describe_jobs', batch_client.describe_jobs,
+                jobs=untracked_job_ids[i: i + self.DESCRIBE_JOBS_BATCH_SIZE]
+            )
+            try:
+                tagged_jobs = load_tagged_jobs_response(boto_describe_jobs)
+            except ValidationError as err:
+                self.log.error('Batch DescribeJobs API Response: %s', boto_describe_jobs)
+                raise BatchError(
+                    'DescribeJobs API call does not match expected JSON shape. '
+                    'Are you sure that the correct version of Boto3 is installed? {}'.format(
+                        err
+                    )
+                )
+            for job, tags in tagged_jobs:
+                match = matcher.match(tags)
+                if match is None:
+                    continue
+                task_key, tis = match
+                queue = tis[0].queue
+                self.active_workers.add_job(job.job_id, task_key, queue if queue in self.routes else None,
+                                            created_at=None if job.created_at is None else int(job.created_at))
+                keys = task_keys(task_key)
+                self.running.update(keys)
+                adopted_keys.update(keys)
+        return adopted_keys
+
+    def _create_batch_client(self, region: Optional[str] = None):
+        """
+        Creates a new Boto3 Batch client, for the executor's region unless another one is given. Boto3 sessions are not
+        thread-safe, so each thread gets its own.
+        """
+        return boto3.session.Session().client('batch', region_name=region or self.region)
 
     def sync(self):
-        """Checks and update state on all running tasks"""
+        """Registers submitted jobs, then checks and update state on all running tasks"""
+        started_at = time.monotonic()
+        if self.pending_jobs:
+            self.submit_pending_jobs()
+        if self.pending_submissions:
+            self.sync_submissions()
+        self.log.debug('Batch API rates: %s', self.rate_limiter.stats())
+        self.sync_running_jobs()
+        if self.journal:
+            self.journal.flush()
+        self.metrics.gauge('pending_tasks', len(self.pending_submissions) + len(self.pending_jobs))
+        self.metrics.gauge('active_tasks', len(self.active_workers))
+        jobs_by_status = self.active_workers.count_by_status()
+        for job_status in self.LIVE_JOB_STATUSES:
+            self.metrics.gauge('jobs.' + job_status, jobs_by_status.get(job_status, 0))
+        self.metrics.timing('sync', time.monotonic() - started_at)
+
+    def sync_running_jobs(self):
+        """Checks and update state on all running jobs"""
         all_job_ids = self.active_workers.get_all_jobs()
         if not all_job_ids:
             self.log.debug("No active tasks, skipping sync")
             return
 
-        describe_job_response = self._describe_tasks(all_job_ids)
+        if self.sync_strategy == 'list_jobs' and not self.status_poller.full_sweep:
+            due_job_ids = self.__finished_or_reconciled_job_ids(all_job_ids)
+        else:
+            due_job_ids = self.status_poller.due(all_job_ids)
+        if not due_job_ids:
+            self.log.debug("No active tasks are due for a status check, skipping sync")
+            return
+
+        describe_job_response = self._describe_tasks(due_job_ids)
         self.log.debug('Active Workers: %s', describe_job_response)
 
         for job in describe_job_response:
-            if job.get_job_state() == State.FAILED:
-                task_key = self.active_workers.pop_by_id(job.job_id)
-                self.fail(task_key)
-            elif job.get_job_state() == State.SUCCESS:
+            if job.created_at is not None:
+                self.active_workers.set_created_at(job.job_id, int(job.created_at))
+            transition = self.active_workers.update_status(job.job_id, job.status)
+            if self.status_poller.tiers:
+                self.status_poller.observe(job.job_id, job.get_job_state())
+            # Only jobs that have changed status need handling
+            if transition is None:
+                continue
+            previous_status, seconds_in_status = transition
+            self.metrics.timing('job_status.' + previous_status, seconds_in_status)
+            self.stuck_job_ids.discard(job.job_id)
+            job_state = job.get_job_state()
+            if job_state == State.RUNNING:
+                task_key = self.active_workers.id_to_key[job.job_id]
+                self.metrics.task_running(task_key)
+                if self.timeline:
+                    self.timeline.record(task_key, RUNNING, job_id=job.job_id)
+            elif job_state in (State.FAILED, State.SUCCESS):
                 task_key = self.active_workers.pop_by_id(job.job_id)
-                self.success(task_key)
+                if self.timeline:
+                    self.timeline.record(task_key, STOPPED, job_id=job.job_id, reason=job.status_reason,
+                                         stopped_at=epoch_seconds(job.stopped_at))
+                self.__report_final_states(task_key, job_state, exit_code=job.exit_code)
+        self.log.debug('Batch jobs by status: %s', self.active_workers.count_by_status())
+        if self.max_runnable_seconds > 0:
+            self.__warn_stuck_jobs()
+
+    def __report_final_states(self, task_key: TaskInstanceKeyType, job_state: str,
+                              exit_code: Optional[int] = None, **details):
+        """Reports the final state of every Airflow task behind a finished job (one, or the tasks of a pack)"""
+        for airflow_task_key, airflow_task_state in unpack_states(task_key, job_state, exit_code):
+            if airflow_task_state == State.SUCCESS:
+                self.success(airflow_task_key)
+            else:
+                self.fail(airflow_task_key)
+            self.metrics.task_finished(airflow_task_key)
+            self.metrics.incr('jobs_failed' if airflow_task_state == State.FAILED else 'jobs_succeeded')
+            if self.timeline:
+                self.timeline.record(airflow_task_key, FINISHED, state=airflow_task_state, **details)
+
+    def __warn_stuck_jobs(self):
+        """Logs the jobs that have been RUNNABLE for longer than max_runnable_seconds, once per job"""
+        for job_id in self.active_workers.jobs_in_status('RUNNABLE', self.max_runnable_seconds):
+            if job_id in self.stuck_job_ids:
+                continue
+            self.stuck_job_ids.add(job_id)
+            self.log.warning('Batch job %s for task %s has been RUNNABLE for %.0f seconds. The job queue\'s compute '
+                             'environments may not have the capacity or the resources that it needs.',
+                             job_id, self.active_workers.id_to_key[job_id], self.active_workers.status_age(job_id))
 
     def _describe_tasks(self, job_ids) -> List[BatchJob]:
+        """Describes the given jobs in batches, and each route's jobs in batches of their own"""
+        all_jobs = []
+        for route, route_job_ids in self.__group_by_route(job_ids):
+            all_jobs.extend(self.__describe_route_jobs(route, route_job_ids))
+        return all_jobs
+
+    def __describe_route_jobs(self, route: Optional[QueueRoute], job_ids: List[str]) -> List[BatchJob]:
         all_jobs = []
+        batch_client = route.client if route else self.batch
         for i in range(0, len(job_ids), self.__class__.DESCRIBE_JOBS_BATCH_SIZE):
             batched_job_ids = job_ids[i: i + self.__class__.DESCRIBE_JOBS_BATCH_SIZE]
             if not batched_job_ids:
                 continue
-            boto_describe_tasks = self.batch.describe_jobs(jobs=batched_job_ids)
+            boto_describe_tasks = self.rate_limiter.call(
+                'describe_jobs', batch_client.describe_jobs, jobs=batched_job_ids
+            )
             try:
-                describe_tasks_response = BatchDescribeJobsResponseSchema().load(boto_describe_tasks)
+                describe_tasks_response = load_describe_jobs_response(boto_describe_tasks)
             except ValidationError as err:
                 self.log.error('Batch DescribeJobs API Response: %s', boto_describe_tasks)
                 raise BatchError(
@@ -119,29 +401,215 @@ class AwsBatchExecutor(BaseExecutor):
             all_jobs.extend(describe_tasks_response['jobs'])
         return all_jobs
 
+    def __group_by_route(self, job_ids: List[str]) -> List[Tuple[Optional[QueueRoute], List[str]]]:
+        """Groups the given jobs by the route of their Airflow queue. Jobs of queues without a route map to None"""
+        if not self.routes:
+            return [(None, job_ids)]
+        job_ids_by_route = defaultdict(list)
+        for job_id in job_ids:
+            job_ids_by_route[self.routes.get(self.active_workers.queue_by_id(job_id))].append(job_id)
+        return list(job_ids_by_route.items())
+
+    def __listed_routes(self) -> List[QueueRoute]:
+        """One route per job queue that jobs are routed to, other than the default job queue"""
+        return distinct_routes(self.routes, 'jobQueue', self.region, self.submit_job_kwargs['jobQueue'])
+
+    def __finished_or_reconciled_job_ids(self, all_job_ids: List[str]) -> List[str]:
+        """
+        Every full_sync_interval seconds all active jobs are reconciled; this also catches jobs that ListJobs missed.
+        Otherwise only the active jobs that ListJobs reports as finished are returned. The children of an array job
+        ('jobId:index') aren't listed, so they're checked once their array job is finished.
+        """
+        now = time.monotonic()
+        if self.last_full_sync is None or now - self.last_full_sync >= self.full_sync_interval:
+            self.last_full_sync = now
+            return all_job_ids
+        finished_job_ids = self._list_finished_job_ids()
+        return [job_id for job_id in all_job_ids if job_id.split(':')[0] in finished_job_ids]
+
+    def _list_finished_job_ids(self) -> Set[str]:
+        """
+        Pages through Boto3's ListJobs API for the SUCCEEDED and FAILED jobs in the configured job queue, and in the job
+        queue of every route. Once the creation time of every tracked job is known, only the jobs that were created
+        after the oldest of them are listed, so that the listing doesn't grow with the job queue's history.
+        """
+        oldest_created_at = self.active_workers.oldest_created_at()
+        created_after = None
+        if oldest_created_at is not None:
+            created_after = oldest_created_at - self.LIST_JOBS_CLOCK_SKEW_SECONDS * 1000
+        job_ids = set()
+        for route in [None] + self.__listed_routes():
+            job_ids.update(self._list_job_ids(self.FINISHED_JOB_STATUSES, route, created_after))
+        return job_ids
+
+    def _list_job_ids(self, job_statuses: Sequence[str], route: Optional[QueueRoute] = None,
+                      created_after: Optional[int] = None) -> Set[str]:
+        """
+        Pages through Boto3's ListJobs API for the jobs in the configured job queue (or the given route's) with the
+        given statuses. If created_after (milliseconds since the epoch) is given, then only the jobs that were created
+        after it are listed; ListJobs ignores the job status when it's given a filter, so every status is listed at
+        once, and the given statuses are picked out of it.
+        """
+        batch_client = route.client if route else self.batch
+        job_queue = (route.kwargs if route else self.submit_job_kwargs)['jobQueue']
+        job_ids = set()
+        if created_after is None:
+            listings = [{'jobStatus': job_status} for job_status in job_statuses]
+        else:
+            listings = [{'filters': [{'name': 'AFTER_CREATED_AT', 'values': [str(created_after)]}]}]
+        for listing in listings:
+            list_jobs_api = dict(listing, jobQueue=job_queue, maxResults=self.LIST_JOBS_PAGE_SIZE)
+            while True:
+                boto_list_jobs = self.rate_limiter.call('list_jobs', batch_client.list_jobs, **list_jobs_api)
+                try:
+                    list_jobs_response = load_list_jobs_response(boto_list_jobs)
+                except ValidationError as err:
+                    self.log.error('Batch ListJobs API Response: %s', boto_list_jobs)
+                    raise BatchError(
+                        'ListJobs API call does not match expected JSON shape. '
+                        'Are you sure that the correct version of Boto3 is installed? {}'.format(
+                            err
+                        )
+                    )
+                if created_after is None:
+                    job_ids.update(list_jobs_response['job_ids'])
+                else:
+                    job_ids.update(job_id for job_id, job_status in zip(list_jobs_response['job_ids'],
+                                                                         list_jobs_response['statuses'])
+                                   if job_status in job_statuses)
+                if not list_jobs_response['next_token']:
+                    break
+                list_jobs_api['nextToken'] = list_jobs_response['next_token']
+        return job_ids
+
+    def sync_submissions(self):
+        """
+        Registers every job that the submission pipeline has finished submitting. Failed submissions are sent back
+        into the pipeline until the task has failed MAX_SUBMIT_JOB_ATTEMPTS times, at which point the task is failed.
+        """
+        for future in [future for future in self.pending_submissions if future.done()]:
+            queued_job = self.pending_submissions.pop(future)
+            task_key = queued_job.key
+            if future.cancelled():
+                continue
+            err = future.exception()
+            if err is None:
+                self.submit_failure_counts.pop(task_key, None)
+                self.__track_submitted_job(future.result(), queued_job)
+            elif self.__submit_failed(queued_job, err):
+                self.__enqueue_submission(queued_job)
+
+    def __submit_failed(self, queued_job: BatchQueuedJob, err: Exception) -> bool:
+        """
+        Counts a failed submission of a job. Returns True if the job should be resubmitted, or fails its tasks and
+        returns False once it has failed MAX_SUBMIT_JOB_ATTEMPTS times.
+        """
+        task_key = queued_job.key
+        self.metrics.incr('submit_job_failures')
+        if self.timeline:
+            self.timeline.record(task_key, LAUNCH_FAILED, reason=error_code(err))
+        self.submit_failure_counts[task_key] += 1
+        failure_count = self.submit_failure_counts[task_key]
+        if failure_count < self.__class__.MAX_SUBMIT_JOB_ATTEMPTS:
+            self.log.warning('Task %s failed to submit due to %s. Failure %s out of %s. Resubmitting.',
+                             task_key, err, failure_count, self.__class__.MAX_SUBMIT_JOB_ATTEMPTS)
+            return True
+        self.log.error('Task %s has failed to submit a maximum of %s times. Marking as failed',
+                       task_key, failure_count)
+        del self.submit_failure_counts[task_key]
+        self.__report_final_states(task_key, State.FAILED, reason=error_code(err))
+        return False
+
     def execute_async(self, key: TaskInstanceKeyType, command: CommandType, queue=None, executor_config=None):
         """
-        Save the task to be executed in the next sync using Boto3's RunTask API
+        Save the task to be executed in the next sync using Boto3's RunTask API.
+        If the submission pipeline is enabled then the job is only enqueued here, and it is registered as an
+        active worker in a following sync once a submitter thread has submitted it.
         """
         if executor_config and 'command' in executor_config:
             raise ValueError('Executor Config should never override "command"')
-        job_id = self._submit_job(key, command, queue, executor_config or {})
-        self.active_workers.add_job(job_id, key)
+        self.metrics.task_queued(key)
+        if self.timeline:
+            self.timeline.record(key, QUEUED)
+        queued_job = BatchQueuedJob(key, command, queue, executor_config or {})
+        if self.packer or self.array_builder:
+            self.pending_jobs.append(queued_job)
+        else:
+            self.__submit(queued_job)
+
+    def submit_pending_jobs(self):
+        """
+        Packs the tasks that were queued since the last heartbeat and groups them into array jobs, as configured, then
+        submits them. A job whose submission raises is kept for the next heartbeat, until it has failed
+        MAX_SUBMIT_JOB_ATTEMPTS times, so that one bad job neither holds back the others nor the status sync.
+        """
+        grouped_jobs = self.pending_jobs
+        if self.packer:
+            grouped_jobs = self.packer.pack(grouped_jobs)
+        if self.array_builder:
+            grouped_jobs = self.array_builder.build(grouped_jobs)
+        self.pending_jobs = []
+        for queued_job in grouped_jobs:
+            try:
+                self.__submit(queued_job)
+            except Exception as err:  # pylint: disable=broad-except
+                if self.__submit_failed(queued_job, err):
+                    self.pending_jobs.append(queued_job)
+
+    def __submit(self, queued_job: BatchQueuedJob):
+        if self.submit_pool:
+            self.__enqueue_submission(queued_job)
+            return
+        self.__track_submitted_job(self._submit_job(*queued_job), queued_job)
+
+    def __track_submitted_job(self, job_id: str, queued_job: BatchQueuedJob):
+        """
+        Tracks a submitted job, along with its queue if it was routed. The children of an array job are tracked one
+        by one, by their own job IDs.
+        """
+        task_key = queued_job.key
+        routed_queue = queued_job.queue if queued_job.queue in self.routes else None
+        submitted_at = int(self.wall_clock() * 1000)
+        if isinstance(task_key, TaskArray):
+            tracked_jobs = [(child_job_id(job_id, i), key) for i, key in enumerate(task_key.keys)]
+        else:
+            tracked_jobs = [(job_id, task_key)]
+        for tracked_job_id, key in tracked_jobs:
+            self.active_workers.add_job(tracked_job_id, key, routed_queue, created_at=submitted_at)
+            self.metrics.task_launched(key)
+            if self.timeline:
+                self.timeline.record(key, LAUNCHED, job_id=tracked_job_id)
+
+    def __enqueue_submission(self, queued_job: BatchQueuedJob):
+        route = self.routes.get(queued_job.queue)
+        # Submitter threads submit routed jobs with their own client of the route's region
+        region = route.region if route and route.region != self.region else None
+        future = self.submit_pool.submit(self.__submit_queued_job, queued_job, region=region)
+        self.pending_submissions[future] = queued_job
+
+    def __submit_queued_job(self, batch_client, queued_job: BatchQueuedJob) -> str:
+        """Runs on a submitter thread"""
+        return self._submit_job(*queued_job, batch_client=batch_client)
 
     def _submit_job(
-        self, 
+        self,
         key: TaskInstanceKeyType,
         cmd: CommandType, queue: str,
-        exec_config: ExecutorConfigType
+        exec_config: ExecutorConfigType,
+        batch_client=None
     ) -> str:
         """
         The command and executor config will be placed in the container-override section of the JSON request, before
-        calling Boto3's "submit_job" function.
+        calling Boto3's "submit_job" function. Submitter threads pass in their own Boto3 client of the job's region.
+        Otherwise, the jobs of a routed queue are submitted with their route's client.
         """
         submit_job_api = self._submit_job_kwargs(key, cmd, queue, exec_config)
-        boto_run_task = self.batch.submit_job(**submit_job_api)
+        if batch_client is None:
+            route = self.routes.get(queue)
+            batch_client = route.client if route else self.batch
+        boto_run_task = self.rate_limiter.call('submit_job', batch_client.submit_job, **submit_job_api)
         try:
-            submit_job_response = BatchSubmitJobResponseSchema().load(boto_run_task)
+            submit_job_response = load_submit_job_response(boto_run_task)
         except ValidationError as err:
             self.log.error('Batch SubmitJob Response: %s', err)
             raise BatchError(
@@ -163,30 +631,64 @@ class AwsBatchExecutor(BaseExecutor):
         the container overrides.
 
         One last chance to modify Boto3's "submit_job" kwarg params before it gets passed into the Boto3 client.
+        The returned kwargs share unmodified members with submit_job_kwargs, so replace members instead of mutating
+        them in place. The jobs of a routed queue are rendered from their route's template.
         For the latest kwarg parameters:
         .. seealso:: https://docs.aws.amazon.com/batch/latest/APIReference/API_SubmitJob.html
         """
-        submit_job_api = deepcopy(self.submit_job_kwargs)
-        submit_job_api['containerOverrides'].update(exec_config)
-        submit_job_api['containerOverrides']['command'] = cmd
+        route = self.routes.get(queue)
+        # The SubmitJob template is (re)compiled whenever submit_job_kwargs is replaced
+        if self.submit_job_template is None or self.submit_job_template.kwargs is not self.submit_job_kwargs:
+            self.submit_job_template = RequestTemplate(self.submit_job_kwargs, ('containerOverrides',))
+        submit_job_api = (route.template if route else self.submit_job_template).render(cmd, exec_config)
+        if isinstance(key, TaskArray):
+            submit_job_api['arrayProperties'] = {'size': len(key.keys)}
+        if self.adopt_by_tags:
+            submit_job_api['tags'] = dict(submit_job_api.get('tags') or {}, **task_key_tags(key))
         return submit_job_api
 
     def end(self, heartbeat_interval=10):
         """
-        Waits for all currently running tasks to end, and doesn't launch any tasks
+        Waits for all currently running tasks to end, and doesn't launch any tasks.
+        Every running job is checked on every heartbeat, regardless of the polling tiers.
         """
+        self.status_poller.full_sweep = True
         while True:
             self.sync()
-            if not self.active_workers:
+            if not self.active_workers and not self.pending_submissions and not self.pending_jobs:
                 break
             time.sleep(heartbeat_interval)
+        if self.submit_pool:
+            self.submit_pool.shutdown()
+            self.submit_pool = None
+        if self.journal:
+            self.journal.close()
+            self.journal = self.active_workers.journal = None
+        if self.timeline:
+            self.timeline.close()
+            self.timeline = None
 
     def terminate(self):
         """
         Kill all Batch Jobs by calling Boto3's TerminateJob API.
+        Jobs that the submission pipeline hasn't started submitting are dropped; in-flight submissions are awaited
+        so that they can be terminated as well.
         """
+        if self.pending_submissions:
+            for future in self.pending_submissions:
+                future.cancel()
+            wait_for_futures(list(self.pending_submissions))
+            for future, queued_job in self.pending_submissions.items():
+                # Jobs whose submission failed are not retried during shutdown
+                if not future.cancelled() and future.exception() is None:
+                    self.__track_submitted_job(future.result(), queued_job)
+            self.pending_submissions.clear()
+        # Tasks that were held for packing or for array jobs were never submitted
+        self.pending_jobs = []
         for job_id in self.active_workers.get_all_jobs():
-            self.batch.terminate_job(
+            route = self.routes.get(self.active_workers.queue_by_id(job_id))
+            self.rate_limiter.call(
+                'terminate_job', (route.client if route else self.batch).terminate_job,
                 jobId=job_id,
                 reason='Airflow Executor received a SIGTERM'
             )
@@ -208,28 +710,124 @@ class AwsBatchExecutor(BaseExecutor):
 
 class BatchJobCollection:
     """
-    A Two-way dictionary between Airflow task ids and Batch Job IDs
+    A Two-way dictionary between Airflow task ids and Batch Job IDs.
+    Jobs are also bucketed by their last known Batch status, along with the time that they entered it, so that sync()
+    only handles the jobs whose status has changed, and so that the jobs in any one status (ex: the oldest RUNNABLE
+    jobs) are found without walking every tracked job. Jobs start out as SUBMITTED.
     """
-    def __init__(self):
+    INITIAL_STATUS = 'SUBMITTED'
+
+    def __init__(self, journal: Optional[StateJournal] = None, clock: Callable[[], float] = time.monotonic):
+        self.journal = journal
+        self.clock = clock
         self.key_to_id: Dict[TaskInstanceKeyType, str] = {}
         self.id_to_key: Dict[str, TaskInstanceKeyType] = {}
-
-    def add_job(self, job_id: str, airflow_task_key: TaskInstanceKeyType):
-        """Adds a task to the collection"""
+        # Job ID -> Airflow queue, for the jobs of routed queues
+        self._queue_by_id: Dict[str, str] = {}
+        self._status_by_id: Dict[str, str] = {}
+        # Job ID -> milliseconds since the epoch at which the job was created (or tracked), where it's known
+        self._created_at_by_id: Dict[str, int] = {}
+        # Batch status -> {job ID: time at which the job entered that status}, in the order that jobs entered it
+        self._ids_by_status: Dict[str, Dict[str, float]] = defaultdict(dict)
+
+    def add_job(self, job_id: str, airflow_task_key: TaskInstanceKeyType, queue: Optional[str] = None,
+                created_at: Optional[int] = None):
+        """
+        Adds a task to the collection, along with the Airflow queue that it was routed by, if any, and the time at which
+        it was created, if it's known
+        """
+        self.restore(job_id, airflow_task_key, queue)
+        if created_at is not None:
+            self._created_at_by_id[job_id] = created_at
+        if self.journal:
+            self.journal.record_add(job_id, airflow_task_key, queue)
+
+    def restore(self, job_id: str, airflow_task_key: TaskInstanceKeyType, queue: Optional[str] = None):
+        """Adds a job that was replayed from the state journal, without journaling it again"""
         self.key_to_id[airflow_task_key] = job_id
         self.id_to_key[job_id] = airflow_task_key
+        if queue is not None:
+            self._queue_by_id[job_id] = queue
+        self.__set_status(job_id, self.INITIAL_STATUS)
 
     def pop_by_id(self, job_id: str) -> TaskInstanceKeyType:
         """Deletes task from collection based off of Batch Job ID"""
         task_key = self.id_to_key[job_id]
         del self.key_to_id[task_key]
         del self.id_to_key[job_id]
+        self._queue_by_id.pop(job_id, None)
+        self._created_at_by_id.pop(job_id, None)
+        self.__set_status(job_id, None)
+        if self.journal:
+            self.journal.record_pop(task_key)
         return task_key
 
+    def update_status(self, job_id: str, status: str) -> Optional[Tuple[str, float]]:
+        """
+        Records the Batch status of a tracked job. If the job has changed status, returns its previous status and the
+        seconds that it spent in it; otherwise returns None.
+        """
+        previous_status = self._status_by_id.get(job_id, status)
+        if previous_status == status:
+            return None
+        seconds_in_status = self.status_age(job_id)
+        self.__set_status(job_id, status)
+        return previous_status, seconds_in_status
+
+    def set_created_at(self, job_id: str, created_at: int):
+        """Records the time (milliseconds since the epoch) at which a tracked job was created"""
+        self._created_at_by_id[job_id] = created_at
+
+    def oldest_created_at(self) -> Optional[int]:
+        """The creation time of the oldest tracked job, or None if that of any tracked job isn't known"""
+        if len(self._created_at_by_id) < len(self.id_to_key):
+            return None
+        return min(self._created_at_by_id.values(), default=None)
+
+    def queue_by_id(self, job_id: str) -> Optional[str]:
+        """The Airflow queue that a tracked job was routed by, if any"""
+        return self._queue_by_id.get(job_id)
+
+    def job_status(self, job_id: str) -> Optional[str]:
+        """The last known Batch status of a tracked job"""
+        return self._status_by_id.get(job_id)
+
+    def status_age(self, job_id: str) -> float:
+        """Seconds since a tracked job entered its last known Batch status"""
+        return self.clock() - self._ids_by_status[self._status_by_id[job_id]][job_id]
+
+    def count_by_status(self) -> Dict[str, int]:
+        """The number of tracked jobs in each Batch status"""
+        return {status: len(job_ids) for status, job_ids in self._ids_by_status.items() if job_ids}
+
+    def oldest_in_status(self, status: str) -> Optional[Tuple[str, float]]:
+        """The job that has been in the given Batch status for the longest, along with its age in seconds"""
+        for job_id, since in self._ids_by_status.get(status, {}).items():
+            return job_id, self.clock() - since
+        return None
+
+    def jobs_in_status(self, status: str, min_age: float = 0.0) -> List[str]:
+        """The jobs that have been in the given Batch status for at least min_age seconds, oldest first"""
+        entered_before = self.clock() - min_age
+        job_ids = []
+        for job_id, since in self._ids_by_status.get(status, {}).items():
+            if since > entered_before:
+                break
+            job_ids.append(job_id)
+        return job_ids
+
     def get_all_jobs(self) -> List[str]:
         """Get all AWS ARNs in collection"""
         return list(self.id_to_key.keys())
 
+    def __set_status(self, job_id: str, status: Optional[str]):
+        previous_status = self._status_by_id.pop(job_id, None)
+        if previous_status is not None:
+            del self._ids_by_status[previous_status][job_id]
+        if status is not None:
+            self._status_by_id[job_id] = status
+            self._ids_by_status[status][job_id] = self.clock()
+
     def __len__(self):
         """Determines the number of jobs in collection"""
         return len(self.key_to_id)
@@ -244,6 +842,15 @@ class BatchSubmitJobResponseSchema(Schema):
         unknown = EXCLUDE
 
 
+class BatchContainerDetailSchema(Schema):
+    """API Response for Describe Jobs: the container of a job"""
+    # The exit code of the container, once it has exited
+    exit_code = fields.Integer(data_key='exitCode')
+
+    class Meta:
+        unknown = EXCLUDE
+
+
 class BatchJobDetailSchema(Schema):
     """API Response for Describe Jobs"""
     # The unique identifier for the job.
@@ -252,11 +859,18 @@ class BatchJobDetailSchema(Schema):
     status = fields.String(required=True)
     # A short, human-readable string to provide additional details about the current status of the job.
     status_reason = fields.String(data_key='statusReason')
+    # The Unix timestamp (in milliseconds) for when the job stopped.
+    stopped_at = fields.Integer(data_key='stoppedAt')
+    # The Unix timestamp (in milliseconds) for when the job was created.
+    created_at = fields.Float(data_key='createdAt')
+    # The details of the job's container, including its exit code
+    container = fields.Nested(BatchContainerDetailSchema)
 
     @post_load
     def make_job(self, data, **kwargs):
         """Overwrites marshmallow load() to return an instance of BatchJob instead of a dictionary"""
-        return BatchJob(**data)
+        container = data.pop('container', None) or {}
+        return BatchJob(exit_code=container.get('exit_code'), **data)
 
     class Meta:
         unknown = EXCLUDE
@@ -271,5 +885,78 @@ class BatchDescribeJobsResponseSchema(Schema):
         unknown = EXCLUDE
 
 
+def load_submit_job_response(boto_response: Any) -> Dict[str, str]:
+    """Low-overhead equivalent of BatchSubmitJobResponseSchema().load()"""
+    boto_response = load_object(boto_response)
+    return {'job_id': load_member(boto_response, 'jobId', str, required=True)}
+
+
+def load_job(boto_job: Any, path: str = '') -> BatchJob:
+    """
+    Low-overhead equivalent of BatchJobDetailSchema().load(). Builds a BatchJob straight from a Botocore
+    'JobDetail' shape, reading only the members that the executor uses.
+    :raises ValidationError: if the job does not match the expected shape.
+    """
+    boto_job = load_object(boto_job, path + '_schema')
+    return BatchJob(
+        job_id=load_member(boto_job, 'jobId', str, required=True, path=path),
+        status=load_member(boto_job, 'status', str, required=True, path=path),
+        status_reason=load_member(boto_job, 'statusReason', str, path=path),
+        stopped_at=load_member(boto_job, 'stoppedAt', int, path=path),
+        exit_code=load_container_exit_code(boto_job, path),
+        created_at=load_member(boto_job, 'createdAt', Real, path=path)
+    )
+
+
+def load_container_exit_code(boto_job: Dict[str, Any], path: str = '') -> Optional[int]:
+    """The exit code of a 'JobDetail' shape's container, if it has exited"""
+    boto_container = load_member(boto_job, 'container', path=path)
+    if boto_container is None:
+        return None
+    return load_member(load_object(boto_container, path + 'container._schema'), 'exitCode', int,
+                       path=path + 'container.')
+
+
+def load_tagged_jobs_response(boto_response: Any) -> List[Tuple[BatchJob, Dict[str, str]]]:
+    """Loads the jobs of a DescribeJobs response, along with their tags"""
+    boto_response = load_object(boto_response)
+    tagged_jobs = []
+    for i, boto_job in enumerate(load_list(boto_response, 'jobs', required=True)):
+        path = 'jobs.{}.'.format(i)
+        job = load_job(boto_job, path)
+        tags = load_member(boto_job, 'tags', dict, path=path) or {}
+        tagged_jobs.append((job, tags))
+    return tagged_jobs
+
+
+def load_describe_jobs_response(boto_response: Any) -> Dict[str, List[BatchJob]]:
+    """
+    Low-overhead equivalent of BatchDescribeJobsResponseSchema().load()
+    :raises ValidationError: if the response does not match the expected shape.
+    """
+    boto_response = load_object(boto_response)
+    return {
+        'jobs': [
+            load_job(boto_job, 'jobs.{}.'.format(i))
+            for i, boto_job in enumerate(load_list(boto_response, 'jobs', required=True))
+        ]
+    }
+
+
+def load_list_jobs_response(boto_response: Any) -> Dict[str, Any]:
+    """
+    Low-overhead decoder for the ListJobs response. Only the job IDs, their statuses and the pagination token are read.
+    :raises ValidationError: if the response does not match the expected shape.
+    """
+    boto_response = load_object(boto_response)
+    job_ids, statuses = [], []
+    for i, boto_job_summary in enumerate(load_list(boto_response, 'jobSummaryList', required=True)):
+        path = 'jobSummaryList.{}.'.format(i)
+        boto_job_summary = load_object(boto_job_summary, path + '_schema')
+        job_ids.append(load_member(boto_job_summary, 'jobId', str, True, path))
+        statuses.append(load_member(boto_job_summary, 'status', str, path=path))
+    return {'job_ids': job_ids, 'statuses': statuses, 'next_token': load_member(boto_response, 'nextToken', str)}
+
+
 class BatchError(Exception):
     """Thrown when something unexpected has occurred within the AWS Batch ecosystem"""
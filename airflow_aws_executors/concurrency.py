@@ -0,0 +1,52 @@
+"""Thread-pool helpers shared by the AWS Executors for fanning out Boto3 API calls"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+
+class BotoClientPool:
+    """
+    A bounded pool of worker threads where every worker owns its own Boto3 clients.
+    Boto3 sessions are not thread-safe, so each worker thread lazily builds a client with the given factory the
+    first time it runs a call, and re-uses it afterwards. Submitted functions receive that client as their
+    first argument. Calls may ask for a client of another region (ex: for a queue route), which each worker builds
+    with client_factory(region) and re-uses in the same way.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], max_workers: int, thread_name_prefix: str = ''):
+        if max_workers < 1:
+            raise ValueError('BotoClientPool needs at least one worker. Got {}'.format(max_workers))
+        self.client_factory = client_factory
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def client(self, region: Optional[str] = None) -> Any:
+        """Get the Boto3 client owned by the calling thread, for the given region or else for the factory's default"""
+        clients = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {}
+        client = clients.get(region)
+        if client is None:
+            client = clients[region] = self.client_factory(region) if region else self.client_factory()
+        return client
+
+    def submit(self, func: Callable[..., Any], *args, region: Optional[str] = None, **kwargs) -> Future:
+        """Schedules func(client, *args, **kwargs) on a worker thread, with its client of the given region"""
+        return self._executor.submit(self.__call_with_client, func, region, *args, **kwargs)
+
+    def map(self, func: Callable[..., Any], items: Iterable[Any]) -> List[Any]:
+        """
+        Calls func(client, item) for every item on the pool and blocks until all calls complete.
+        Results are returned in the same order as the items. The first exception raised by a call is re-raised.
+        """
+        futures = [self.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting work and releases the worker threads"""
+        self._executor.shutdown(wait=wait)
+
+    def __call_with_client(self, func: Callable[..., Any], region: Optional[str], *args, **kwargs) -> Any:
+        return func(self.client(region), *args, **kwargs)
@@ -0,0 +1,43 @@
+"""
+Low-overhead helpers for decoding Botocore response dictionaries.
+Botocore has already parsed each response against the service model, so the executors only need to check the
+handful of members that they actually read. These helpers raise the same marshmallow ValidationError as the
+Schema classes do, so callers can keep a single error-handling path.
+"""
+
+from typing import Any, Dict, List, Optional, Type
+
+from marshmallow import ValidationError
+
+MISSING_MESSAGE = 'Missing data for required field.'
+
+
+def load_object(data: Any, path: str = '_schema') -> Dict[str, Any]:
+    """Asserts that the given value is a Botocore structure (a dictionary)"""
+    if not isinstance(data, dict):
+        raise ValidationError({path: ['Invalid input type.']})
+    return data
+
+
+def load_member(data: Dict[str, Any], key: str, member_type: Optional[Type] = None, required: bool = False,
+                path: str = '') -> Any:
+    """
+    Gets a member of a Botocore structure, or None if an optional member is missing.
+    If a member_type is given, then the member's value must be an instance of that type.
+    """
+    if key not in data:
+        if required:
+            raise ValidationError({path + key: [MISSING_MESSAGE]})
+        return None
+    value = data[key]
+    if member_type is not None and (
+            not isinstance(value, member_type) or (member_type is int and isinstance(value, bool))
+    ):
+        raise ValidationError({path + key: ['Not a valid {}.'.format(member_type.__name__)]})
+    return value
+
+
+def load_list(data: Dict[str, Any], key: str, required: bool = False, path: str = '') -> List[Any]:
+    """Gets a list member of a Botocore structure, or an empty list if an optional member is missing"""
+    value = load_member(data, key, list, required, path)
+    return [] if value is None else value
@@ -1,9 +1,11 @@
 """AWS ECS Executor. Each Airflow task gets deligated out to an AWS ECS or Fargate Task"""
 
+import json
+import shlex
 import time
-from collections import defaultdict, deque, namedtuple
-from copy import deepcopy
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import defaultdict, namedtuple
+from sys import intern
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import boto3
 from airflow.configuration import conf
@@ -12,6 +14,26 @@ from airflow.utils.module_loading import import_string
 from airflow.utils.state import State
 from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load
 
+from .admission import CapacityAdmissionController
+from .concurrency import BotoClientPool
+from .decoding import load_list, load_member, load_object
+from .failover import FAILOVER, CapacityFailover
+from .journal import StateJournal
+from .metrics import ExecutorMetrics
+from .packing import (TaskPack, TaskPacker, pack_command, task_keys,
+                      unpack_states)
+from .pending import PendingTaskQueue
+from .polling import StatusPollingScheduler
+from .relaunch import RelaunchScheduler
+from .routing import QueueRoute, distinct_routes, load_queue_routes
+from .tagging import TaggedTaskMatcher, task_key_tags
+from .templating import RequestTemplate
+from .throttling import AdaptiveRateLimiter, error_code
+from .timeline import (FINISHED, LAUNCH_FAILED, LAUNCHED, QUEUED, RUNNING,
+                       STOPPED, TaskTimeline, epoch_seconds)
+from .warm_pool import WarmWorkerPool
+from .work_queue import DEFAULT_WORK_QUEUE
+
 CommandType = List[str]
 TaskInstanceKeyType = Tuple[Any]
 ExecutorConfigFunctionType = Callable[[CommandType], dict]
@@ -22,16 +44,38 @@ EcsFargateTaskInfo = namedtuple('EcsFargateTaskInfo', ('cmd', 'queue', 'config')
 
 class EcsFargateTask:
     """
-    Data Transfer Object for an ECS Fargate Task
+    Data Transfer Object for an ECS Fargate Task.
+    Only the name, exit code, and last status of each container are kept, packed into tuples, because thousands of
+    tasks are tracked at once.
     """
+    __slots__ = ('task_arn', 'last_status', 'desired_status', '_containers', 'started_at', 'stopped_reason',
+                 'stopped_at')
+    CONTAINER_FIELDS = ('name', 'exit_code', 'last_status')
+
     def __init__(self, task_arn: str, last_status: str, desired_status: str, containers: List[Dict[str, Any]],
-                 started_at: Optional[Any] = None, stopped_reason: Optional[str] = None):
+                 started_at: Optional[Any] = None, stopped_reason: Optional[str] = None,
+                 stopped_at: Optional[Any] = None):
         self.task_arn = task_arn
         self.last_status = last_status
         self.desired_status = desired_status
         self.containers = containers
         self.started_at = started_at
         self.stopped_reason = stopped_reason
+        self.stopped_at = stopped_at
+
+    @property
+    def containers(self) -> List[Dict[str, Any]]:
+        """The containers of the task, with the name, exit_code, and last_status members that are known"""
+        return [
+            {field: value for field, value in zip(self.CONTAINER_FIELDS, container) if value is not None}
+            for container in self._containers
+        ]
+
+    @containers.setter
+    def containers(self, containers: List[Dict[str, Any]]):
+        self._containers = tuple(
+            tuple(container.get(field) for field in self.CONTAINER_FIELDS) for container in containers
+        )
 
     def get_task_state(self) -> str:
         """
@@ -48,13 +92,13 @@ class EcsFargateTask:
         elif self.desired_status == 'RUNNING':
             return State.QUEUED
         is_finished = self.desired_status == 'STOPPED'
-        has_exit_codes = all(['exit_code' in x for x in self.containers])
+        has_exit_codes = all(exit_code is not None for _, exit_code, _ in self._containers)
         # sometimes fargate tasks may time out. Whoops.
         if not self.started_at and is_finished:
             return State.REMOVED
         if not is_finished or not has_exit_codes:
             return State.RUNNING
-        all_containers_succeeded = all([x['exit_code'] == 0 for x in self.containers])
+        all_containers_succeeded = all(exit_code == 0 for _, exit_code, _ in self._containers)
         return State.SUCCESS if all_containers_succeeded else State.FAILED
 
     def __repr__(self):
@@ -79,34 +123,357 @@ class AwsEcsFargateExecutor(BaseExecutor):
      Airflow TaskInstance's executor_config.
     """
 
-    # Number of retries in the scenario where the API cannot find a task key. We do this because sometimes
+    # Default number of relaunches in the scenario where the API cannot find a task key. We do this because sometimes
     # AWS misplaces RunTask executions; even if they have a valid ARN.
     MAX_FAILURE_CHECKS = 3
     # AWS only allows a maximum number of ARNs in the describe_tasks function
     DESCRIBE_TASKS_BATCH_SIZE = 99
+    # How sync_running_tasks() finds finished tasks. 'describe_tasks' describes every active task that is due for
+    # a status check. 'list_tasks' lists the STOPPED tasks launched by this executor, and only describes the active
+    # ones, along with a periodic full reconciliation of every active task.
+    SYNC_STRATEGIES = ('describe_tasks', 'list_tasks')
+    # AWS returns at most 100 ARNs per ListTasks page
+    LIST_TASKS_PAGE_SIZE = 100
+    DEFAULT_STARTED_BY = 'airflow-aws-executors'
+    # RunTask launches at most 10 tasks per call
+    MAX_RUN_TASK_COUNT = 10
+    DEFAULT_WARM_WORKER_COMMAND = 'python -m airflow_aws_executors.worker'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cluster: Optional[str] = None
         self.container_name: Optional[str] = None
         self.active_workers: Optional[EcsFargateTaskCollection] = None
-        self.pending_tasks: Optional[deque] = None
+        self.pending_tasks: Optional[PendingTaskQueue] = None
+        self.task_priorities: Dict[TaskInstanceKeyType, int] = {}
+        self.failed_launches: List[EcsFargateQueuedTask] = []
         self.ecs = None
         self.run_task_kwargs = None
+        self.run_task_template: Optional[RequestTemplate] = None
+        self.region: Optional[str] = None
+        self.describe_pool: Optional[BotoClientPool] = None
+        self.launch_pool: Optional[BotoClientPool] = None
+        self.status_poller: Optional[StatusPollingScheduler] = None
+        self.sync_strategy = 'describe_tasks'
+        self.full_sync_interval = 300.0
+        self.last_full_sync: Optional[float] = None
+        self.capacity_admission: Optional[CapacityAdmissionController] = None
+        self.rate_limiter: Optional[AdaptiveRateLimiter] = None
+        self.journal: Optional[StateJournal] = None
+        self.adopt_by_tags = False
+        self.metrics = ExecutorMetrics('ecs_executor')
+        self.timeline: Optional[TaskTimeline] = None
+        self.warm_pool: Optional[WarmWorkerPool] = None
+        self.warm_worker_command: Optional[CommandType] = None
+        self.packer: Optional[TaskPacker] = None
+        self.routes: Dict[str, QueueRoute] = {}
+        self.failover: Optional[CapacityFailover] = None
+        self.max_failure_checks = self.MAX_FAILURE_CHECKS
+        self.relaunches: Optional[RelaunchScheduler] = None
+        # Airflow task key -> failure count, of the tasks that are being relaunched
+        self.relaunch_failures: Dict[TaskInstanceKeyType, int] = {}
+        # Whether the executor is ending (or terminating), so idle warm workers are no longer replaced
+        self.ending = False
 
     def start(self):
         """Initialize Boto3 ECS Client, and other internal variables"""
-        region = conf.get('ecs_fargate', 'region')
+        self.region = conf.get('ecs_fargate', 'region')
         self.cluster = conf.get('ecs_fargate', 'cluster')
         self.container_name = conf.get('ecs_fargate', 'container_name')
-        self.active_workers = EcsFargateTaskCollection()
-        self.pending_tasks = deque()
-        self.ecs = boto3.client('ecs', region_name=region)  # noqa
+        # Optionally journal the tracked tasks, so that a restarted scheduler adopts them instead of relaunching them
+        state_journal = conf.get('ecs_fargate', 'state_journal', fallback=None)
+        self.journal = StateJournal(
+            state_journal, compact_rows=conf.getint('ecs_fargate', 'state_journal_compact_rows', fallback=10000)
+        ) if state_journal else None
+        self.active_workers = EcsFargateTaskCollection(self.journal)
+        # Pending tasks launch by priority weight (aged by the time that they've waited), and take turns fairly across
+        # DAGs and queues
+        self.pending_tasks = PendingTaskQueue.from_config(
+            conf.getfloat('ecs_fargate', 'priority_aging_seconds', fallback=60.0),
+            conf.get('ecs_fargate', 'fair_share_weights', fallback=None)
+        )
+        self.ecs = boto3.client('ecs', region_name=self.region)  # noqa
         self.run_task_kwargs = self._load_run_kwargs()
+        self.status_poller = StatusPollingScheduler.from_config(
+            conf.get('ecs_fargate', 'polling_tiers', fallback=None)
+        )
+        self.sync_strategy = conf.get('ecs_fargate', 'sync_strategy', fallback='describe_tasks')
+        if self.sync_strategy not in self.SYNC_STRATEGIES:
+            raise ValueError('ECS sync_strategy must be one of {}. Got {}'.format(
+                self.SYNC_STRATEGIES, self.sync_strategy))
+        if self.sync_strategy == 'list_tasks' and not self.run_task_kwargs.get('startedBy'):
+            # Mark launched tasks so that ListTasks only returns the tasks of this executor
+            self.run_task_kwargs = dict(
+                self.run_task_kwargs,
+                startedBy=conf.get('ecs_fargate', 'started_by', fallback=self.DEFAULT_STARTED_BY)
+            )
+        self.full_sync_interval = conf.getfloat('ecs_fargate', 'full_sync_interval', fallback=300.0)
+        # Tasks that go missing, or that stop before they run, are relaunched after an exponential backoff
+        self.max_failure_checks = conf.getint('ecs_fargate', 'max_relaunch_attempts', fallback=self.MAX_FAILURE_CHECKS)
+        self.relaunches = RelaunchScheduler(
+            initial_delay=conf.getfloat('ecs_fargate', 'relaunch_backoff', fallback=10.0),
+            max_delay=conf.getfloat('ecs_fargate', 'max_relaunch_backoff', fallback=300.0)
+        )
+        # Optionally hold back launches after capacity failures, with exponential backoff
+        self.capacity_admission = CapacityAdmissionController(
+            initial_backoff=conf.getfloat('ecs_fargate', 'capacity_backoff', fallback=0.0),
+            max_backoff=conf.getfloat('ecs_fargate', 'max_capacity_backoff', fallback=300.0)
+        )
+        # Optionally tag launched tasks with their Airflow task key, so that orphaned task instances can be adopted
+        self.adopt_by_tags = conf.getboolean('ecs_fargate', 'adopt_by_tags', fallback=False)
+        # Every ECS call is rate limited by a limiter that's shared by all threads, and throttled calls are retried
+        self.rate_limiter = AdaptiveRateLimiter.from_config(
+            conf.get('ecs_fargate', 'api_rate_limits', fallback=None),
+            max_retries=conf.getint('ecs_fargate', 'api_max_retries', fallback=3)
+        )
+        self.rate_limiter.on_call = self.metrics.api_call
+        # Optionally record the lifecycle of every task to a rotating JSONL file, or to a custom sink
+        task_timeline_sink = conf.get('ecs_fargate', 'task_timeline_sink', fallback=None)
+        self.timeline = TaskTimeline.from_config(
+            'ecs', conf.get('ecs_fargate', 'task_timeline', fallback=None),
+            import_string(task_timeline_sink) if task_timeline_sink else None
+        )
+        # Optionally fan DescribeTasks batches out onto a pool of threads, each with its own Boto3 client
+        describe_tasks_concurrency = conf.getint('ecs_fargate', 'describe_tasks_concurrency', fallback=1)
+        if describe_tasks_concurrency > 1:
+            self.describe_pool = BotoClientPool(self._create_ecs_client, describe_tasks_concurrency,
+                                                thread_name_prefix='ecs-describe-tasks')
+        # Optionally issue RunTask calls concurrently; the pool size bounds the number of calls in-flight
+        run_task_concurrency = conf.getint('ecs_fargate', 'run_task_concurrency', fallback=1)
+        if run_task_concurrency > 1:
+            self.launch_pool = BotoClientPool(self._create_ecs_client, run_task_concurrency,
+                                              thread_name_prefix='ecs-run-task')
+        # Optionally keep warm workers that pull commands from a work queue, instead of launching a task per command
+        warm_workers = conf.getint('ecs_fargate', 'warm_workers', fallback=0)
+        if warm_workers > 0:
+            self.warm_pool = WarmWorkerPool(
+                import_string(conf.get('ecs_fargate', 'work_queue', fallback=DEFAULT_WORK_QUEUE))(),
+                max_workers=warm_workers,
+                min_workers=conf.getint('ecs_fargate', 'min_warm_workers', fallback=0)
+            )
+            self.warm_worker_command = shlex.split(
+                conf.get('ecs_fargate', 'warm_worker_command', fallback=self.DEFAULT_WARM_WORKER_COMMAND)
+            )
+        # Optionally pack compatible pending tasks into one ECS task that runs all of their commands
+        pack_size = conf.getint('ecs_fargate', 'pack_size', fallback=1)
+        if pack_size > 1:
+            self.packer = TaskPacker(pack_size, conf.get('ecs_fargate', 'pack_mode', fallback='concurrent'))
+        # Optionally launch the tasks of some Airflow queues with their own RunTask kwargs (ex: cluster, task
+        # definition, capacity provider strategy) and region. Every other queue uses run_task_kwargs.
+        failover_strategy = conf.get('ecs_fargate', 'failover_capacity_provider_strategy', fallback=None)
+        failover_strategy = json.loads(failover_strategy) if failover_strategy else None
+        self.routes = load_queue_routes(
+            conf.get('ecs_fargate', 'queue_routes', fallback=None), self.run_task_kwargs, self.region,
+            lambda region: boto3.client('ecs', region_name=region), self._compile_run_task_template,
+            failover_strategy
+        )
+        # Optionally launch with another capacity provider strategy (ex: on-demand Fargate) while the default kwargs or
+        # a route are out of capacity (ex: Fargate Spot), or slow to provision
+        failover_strategies = {queue: route.failover_strategy for queue, route in self.routes.items()}
+        failover_strategies[None] = failover_strategy
+        self.failover = CapacityFailover(
+            failover_strategies,
+            failure_threshold=conf.getint('ecs_fargate', 'failover_after_capacity_failures', fallback=3),
+            latency_budget=conf.getfloat('ecs_fargate', 'failover_provisioning_seconds', fallback=300.0),
+            recovery_interval=conf.getfloat('ecs_fargate', 'failover_recovery_seconds', fallback=600.0),
+            max_recovery_interval=conf.getfloat('ecs_fargate', 'max_failover_recovery_seconds', fallback=3600.0),
+            on_switch=self.__capacity_mode_switched
+        )
+        if self.journal:
+            self.__restore_journaled_tasks()
+
+    def __restore_journaled_tasks(self):
+        """Rebuilds the active tasks from the state journal, and reconciles them with one bulk describe"""
+        records = self.journal.load()
+        self.journal.compact(records)
+        if not records:
+            return
+        for record in records:
+            self.running.update(task_keys(record.key))
+            if record.task_id is None:
+                # The task was waiting to be relaunched, so it waits out a new backoff
+                task_cmd, queue, exec_info = record.info
+                self.relaunches.schedule(EcsFargateQueuedTask(record.key, task_cmd, queue, exec_info),
+                                         record.failure_count)
+                self.relaunch_failures[record.key] = record.failure_count
+                continue
+            # The real state of the task is unknown until it's described
+            task = EcsFargateTask(record.task_id, 'PROVISIONING', 'RUNNING', [])
+            self.active_workers.restore(task, record.key, record.info, record.failure_count)
+        self.log.info('Restored %s tasks from the state journal at %s', len(records), self.journal.path)
+        self.status_poller.full_sweep = True
+        try:
+            self.sync_running_tasks()
+        finally:
+            self.status_poller.full_sweep = False
+        self.journal.flush()
+
+    def try_adopt_task_instances(self, tis):
+        """
+        Adopts the task instances that are being tracked, for example after being restored from the state journal.
+        The scheduler resets the rest.
+        """
+        tracked_keys = {key for task_key in self.active_workers.get_all_task_keys() + list(self.relaunch_failures)
+                        for key in task_keys(task_key)}
+        not_adopted = [ti for ti in tis if ti.key not in tracked_keys]
+        if self.adopt_by_tags and not_adopted:
+            adopted_keys = self.__adopt_tagged_tasks(not_adopted)
+            self.log.info('Adopted %s of %s orphaned tasks by their tags', len(adopted_keys), len(not_adopted))
+            not_adopted = [ti for ti in not_adopted if ti.key not in adopted_keys]
+        return not_adopted
+
+    def __adopt_tagged_tasks(self, tis) -> Set[TaskInstanceKeyType]:
+        """
+        Finds the live ECS tasks that were launched for the given task instances, by the Airflow task key that they
+        were tagged with, and tracks them. A pack is adopted once all of its tasks are orphaned. Returns the keys of
+        the adopted task instances.
+        """
+        matcher = TaggedTaskMatcher(tis)
+        adopted_keys = set()
+        for route in [None] + self.__listed_routes():
+            if not matcher:
+                break
+            adopted_keys.update(self.__adopt_tagged_route_tasks(matcher, route))
+        return adopted_keys
+
+    def __adopt_tagged_route_tasks(self, matcher: TaggedTaskMatcher,
+                                   route: Optional[QueueRoute]) -> Set[TaskInstanceKeyType]:
+        """Adopts the tagged tasks in the cluster of a route (or the default cluster), popping their task instances"""
+        ecs_client, cluster = self.__route_target(route)
+        untracked_arns = [arn for arn in sorted(self._list_task_arns('RUNNING', route))
+                          if not self.active_workers.has_arn(arn)]
+        adopted_keys = set()
+        for i in range(0, len(untracked_arns), self.DESCRIBE_TASKS_BATCH_SIZE):
+            if not matcher:
+                break
+            boto_describe_tasks = self.rate_limiter.call(
+                'describe_tasks', ecs_client.describe_tasks,
+                tasks=untracked_arns[i: i + self.DESCRIBE_TASKS_BATCH_SIZE], cluster=cluster, include=['TAGS']
+            )
+            try:
+                tagged_tasks = load_tagged_tasks_response(boto_describe_tasks)
+            except ValidationError as err:
+                self.log.error('ECS DescribeTasks Response: %s', boto_describe_tasks)
+                raise EcsFargateError(
+                    'DescribeTasks API call does not match expected JSON shape. '
+                    'Are you sure that the correct version of Boto3 is installed? {}'.format(
+                        err
+                    )
+                )
+            for task, tags in tagged_tasks:
+                match = matcher.match(tags)
+                if match is None:
+                    continue
+                task_key, tis = match
+                if isinstance(task_key, TaskPack):
+                    command = pack_command([ti.command_as_list() for ti in tis],
+                                           self.packer.mode if self.packer else 'concurrent')
+                else:
+                    command = tis[0].command_as_list()
+                self.active_workers.add_task(task, task_key, tis[0].queue, command, tis[0].executor_config)
+                keys = task_keys(task_key)
+                self.running.update(keys)
+                adopted_keys.update(keys)
+        return adopted_keys
+
+    def _create_ecs_client(self, region: Optional[str] = None):
+        """
+        Creates a new Boto3 ECS client, for the executor's region unless another one is given. Boto3 sessions are not
+        thread-safe, so each thread gets its own.
+        """
+        return boto3.session.Session().client('ecs', region_name=region or self.region)
 
     def sync(self):
+        started_at = time.monotonic()
+        if self.warm_pool:
+            self.sync_warm_pool()
         self.sync_running_tasks()
         self.attempt_task_runs()
+        self.log.debug('ECS API rates: %s', self.rate_limiter.stats())
+        if self.journal:
+            self.journal.flush()
+        self.metrics.gauge('pending_tasks', len(self.pending_tasks))
+        self.metrics.gauge('active_tasks', len(self.active_workers))
+        if self.warm_pool:
+            self.metrics.gauge('warm_workers', len(self.warm_pool.workers))
+            self.metrics.gauge('warm_pool_tasks', self.warm_pool.outstanding)
+        self.metrics.timing('sync', time.monotonic() - started_at)
+
+    def sync_warm_pool(self):
+        """
+        Sends the commands that were queued since the last heartbeat to the warm workers, reports the commands that
+        the workers have started and finished, fails the commands that were lost with a stopped worker, and launches
+        workers for the backlog. The pool is only kept topped up to min_warm_workers until the executor is ending.
+        """
+        for task_key in self.warm_pool.flush():
+            self.metrics.task_launched(task_key)
+            if self.timeline:
+                self.timeline.record(task_key, LAUNCHED)
+        worker_arns = sorted(self.warm_pool.workers)
+        if worker_arns:
+            describe_tasks_response = self.__describe_tasks(worker_arns)
+            for failure in describe_tasks_response['failures']:
+                # Failures aren't always about a particular task
+                if failure.get('arn'):
+                    self.warm_pool.worker_stopped(failure['arn'])
+            for worker in describe_tasks_response['tasks']:
+                if worker.last_status == 'STOPPED':
+                    self.warm_pool.worker_stopped(worker.task_arn)
+        for task_key, worker_arn, exit_code in self.warm_pool.collect():
+            if exit_code is None:
+                self.metrics.task_running(task_key)
+                if self.timeline:
+                    self.timeline.record(task_key, RUNNING, arn=worker_arn)
+            else:
+                self.__report_final_states(task_key, State.SUCCESS if exit_code == 0 else State.FAILED,
+                                           arn=worker_arn, exit_code=exit_code)
+        for task_key, worker_arn in self.warm_pool.pop_lost():
+            self.log.error('Task %s was lost with warm worker %s. Marking as failed', task_key, worker_arn)
+            self.__report_final_states(task_key, State.FAILED, arn=worker_arn, reason='Warm worker stopped')
+        self.__launch_warm_workers(self.warm_pool.workers_wanted(keep_warm=not self.ending))
+
+    def __report_final_states(self, task_key: TaskInstanceKeyType, task_state: str,
+                              exit_code: Optional[int] = None, **details):
+        """Reports the final state of every Airflow task behind a finished ECS task (one, or the tasks of a pack)"""
+        self.pending_tasks.forget(task_key)
+        for airflow_task_key, airflow_task_state in unpack_states(task_key, task_state, exit_code):
+            if airflow_task_state == State.SUCCESS:
+                self.success(airflow_task_key)
+            else:
+                self.fail(airflow_task_key)
+            self.metrics.task_finished(airflow_task_key)
+            self.metrics.incr('tasks_failed' if airflow_task_state == State.FAILED else 'tasks_succeeded')
+            if self.timeline:
+                self.timeline.record(airflow_task_key, FINISHED, state=airflow_task_state, **details)
+
+    def __launch_warm_workers(self, count: int):
+        """
+        Launches up to count warm workers, MAX_RUN_TASK_COUNT per RunTask call. Launches stop at the first failure,
+        and are retried on the next heartbeat.
+        """
+        while count > 0:
+            run_task_api = dict(self.__get_run_task_template().render(self.warm_worker_command, {}),
+                                count=min(count, self.MAX_RUN_TASK_COUNT))
+            boto_run_task = self.rate_limiter.call('run_task', self.ecs.run_task, **run_task_api)
+            try:
+                run_task_response = load_tasks_response(boto_run_task)
+            except ValidationError as err:
+                self.log.error('ECS RunTask Response: %s', err)
+                raise EcsFargateError(
+                    'RunTask API call does not match expected JSON shape. '
+                    'Are you sure that the correct version of Boto3 is installed? {}'.format(
+                        err
+                    )
+                )
+            for worker in run_task_response['tasks']:
+                self.warm_pool.worker_launched(worker.task_arn)
+            for failure in run_task_response['failures']:
+                self.metrics.incr('run_task_failures.' + failure['reason'])
+            if run_task_response['failures'] or not run_task_response['tasks']:
+                self.log.debug('Warm workers failed to launch for the following reasons: %s. Will retry later.',
+                               [failure['reason'] for failure in run_task_response['failures']])
+                return
+            count -= len(run_task_response['tasks'])
 
     def sync_running_tasks(self):
         """Checks and update state on all running tasks"""
@@ -115,73 +482,219 @@ class AwsEcsFargateExecutor(BaseExecutor):
             self.log.debug("No active tasks, skipping sync")
             return
 
-        describe_tasks_response = self.__describe_tasks(all_task_arns)
+        if self.sync_strategy == 'list_tasks' and not self.status_poller.full_sweep:
+            due_task_arns = self.__stopped_or_reconciled_task_arns(all_task_arns)
+        else:
+            due_task_arns = self.status_poller.due(all_task_arns)
+        # Failover waits for provisioning tasks to start running, so they're described on every heartbeat. Otherwise,
+        # the tasks that started between two describes would be taken for stuck once the latency budget has elapsed.
+        due_arns = set(due_task_arns)
+        due_task_arns = due_task_arns + [arn for arn in self.failover.provisioning
+                                         if arn not in due_arns and self.active_workers.has_arn(arn)]
+        if not due_task_arns:
+            self.log.debug("No active tasks are due for a status check, skipping sync")
+            return
+
+        describe_tasks_response = self.__describe_tasks(due_task_arns)
         self.log.debug('Active Workers: %s', describe_tasks_response)
 
         if describe_tasks_response['failures']:
             for failure in describe_tasks_response['failures']:
-                self.__handle_failed_task(failure['arn'], failure['reason'])
+                self.metrics.incr('describe_tasks_failures.' + failure['reason'])
+                if failure.get('arn'):
+                    self.__handle_failed_task(failure['arn'], failure['reason'])
 
         updated_tasks = describe_tasks_response['tasks']
         for task in updated_tasks:
             self.__update_running_task(task)
 
+    def __stopped_or_reconciled_task_arns(self, all_task_arns: List[str]) -> List[str]:
+        """
+        Every full_sync_interval seconds all active tasks are reconciled; this also catches ARNs that AWS has
+        dropped. Otherwise only the active tasks that ListTasks reports as stopped are returned.
+        """
+        now = time.monotonic()
+        if self.last_full_sync is None or now - self.last_full_sync >= self.full_sync_interval:
+            self.last_full_sync = now
+            return all_task_arns
+        stopped_task_arns = self._list_stopped_task_arns()
+        return [arn for arn in all_task_arns if arn in stopped_task_arns]
+
+    def _list_stopped_task_arns(self) -> Set[str]:
+        """
+        Pages through Boto3's ListTasks API for the STOPPED tasks that were started by this executor, in the default
+        cluster and in the cluster of every route
+        """
+        task_arns = set()
+        for route in [None] + self.__listed_routes():
+            task_arns.update(self._list_task_arns('STOPPED', route))
+        return task_arns
+
+    def _list_task_arns(self, desired_status: str, route: Optional[QueueRoute] = None) -> Set[str]:
+        """
+        Pages through Boto3's ListTasks API for the tasks in the cluster (of the given route, if any) with the given
+        desired status. If launched tasks are marked with startedBy, then only the tasks that were started by this
+        executor are listed.
+        """
+        ecs_client, cluster = self.__route_target(route)
+        run_task_kwargs = route.kwargs if route else self.run_task_kwargs
+        task_arns = set()
+        list_tasks_api = {
+            'cluster': cluster,
+            'desiredStatus': desired_status,
+            'maxResults': self.LIST_TASKS_PAGE_SIZE
+        }
+        if run_task_kwargs.get('startedBy'):
+            list_tasks_api['startedBy'] = run_task_kwargs['startedBy']
+        while True:
+            boto_list_tasks = self.rate_limiter.call('list_tasks', ecs_client.list_tasks, **list_tasks_api)
+            try:
+                list_tasks_response = load_list_tasks_response(boto_list_tasks)
+            except ValidationError as err:
+                self.log.error('ECS ListTasks Response: %s', boto_list_tasks)
+                raise EcsFargateError(
+                    'ListTasks API call does not match expected JSON shape. '
+                    'Are you sure that the correct version of Boto3 is installed? {}'.format(
+                        err
+                    )
+                )
+            task_arns.update(list_tasks_response['task_arns'])
+            if not list_tasks_response['next_token']:
+                return task_arns
+            list_tasks_api['nextToken'] = list_tasks_response['next_token']
+
     def __update_running_task(self, task):
         self.active_workers.update_task(task)
         # get state of current task
         task_state = task.get_task_state()
-        task_key = self.active_workers.arn_to_key[task.task_arn]
+        self.status_poller.observe(task.task_arn, task_state)
+        task_key = self.active_workers.key_by_arn(task.task_arn)
+        if self.timeline:
+            self.__record_task_state(task_key, task, task_state)
         # mark finished tasks as either a success/failure
-        if task_state == State.FAILED:
-            self.fail(task_key)
-        elif task_state == State.SUCCESS:
-            self.success(task_key)
+        if task_state == State.RUNNING:
+            self.metrics.task_running(task_key)
+            self.failover.task_running(task.task_arn)
         elif task_state == State.REMOVED:
             self.__handle_failed_task(task.task_arn, task.stopped_reason)
-        if task_state in (State.FAILED, State.SUCCESS):
+        elif task_state in (State.FAILED, State.SUCCESS):
             self.log.debug('Task %s marked as %s after running on %s', task_key, task_state, task.task_arn)
+            self.failover.task_stopped(task.task_arn)
             self.active_workers.pop_by_key(task_key)
+            # A pack's exit code tells which of its commands failed
+            exit_code = self.__airflow_exit_code(task) if isinstance(task_key, TaskPack) else None
+            self.__report_final_states(task_key, task_state, exit_code=exit_code)
+
+    def __airflow_exit_code(self, task: EcsFargateTask) -> Optional[int]:
+        """The exit code of the Airflow container of a stopped task, if it's known"""
+        for container in task.containers:
+            if container['name'] == self.container_name:
+                return container.get('exit_code')
+        return None
+
+    def __record_task_state(self, task_key: TaskInstanceKeyType, task: EcsFargateTask, task_state: str):
+        """Records the first time that a task is seen running, and when it's seen stopped, on the timeline"""
+        if task_state == State.RUNNING:
+            self.timeline.record(task_key, RUNNING, arn=task.task_arn)
+        elif task_state in (State.FAILED, State.SUCCESS, State.REMOVED):
+            self.timeline.record(task_key, STOPPED, arn=task.task_arn, reason=task.stopped_reason,
+                                 stopped_at=epoch_seconds(task.stopped_at))
 
     def __describe_tasks(self, task_arns):
+        """Describes the given tasks in batches, and each route's tasks in batches of their own"""
         all_task_descriptions = {'tasks': [], 'failures': []}
-        for i in range(0, len(task_arns), self.DESCRIBE_TASKS_BATCH_SIZE):
-            batched_task_arns = task_arns[i: i + self.DESCRIBE_TASKS_BATCH_SIZE]
-            if not batched_task_arns:
-                continue
-            boto_describe_tasks = self.ecs.describe_tasks(tasks=batched_task_arns, cluster=self.cluster)
-            try:
-                describe_tasks_response = BotoDescribeTasksSchema().load(boto_describe_tasks)
-            except ValidationError as err:
-                self.log.error('ECS DescribeTask Response: %s', boto_describe_tasks)
-                raise EcsFargateError(
-                    'DescribeTasks API call does not match expected JSON shape. '
-                    'Are you sure that the correct version of Boto3 is installed? {}'.format(
-                        err
-                    )
-                )
+        batches = [
+            (route_task_arns[i: i + self.DESCRIBE_TASKS_BATCH_SIZE], route)
+            for route, route_task_arns in self.__group_by_route(task_arns)
+            for i in range(0, len(route_task_arns), self.DESCRIBE_TASKS_BATCH_SIZE)
+        ]
+        if self.describe_pool and len(batches) > 1:
+            futures = [
+                self.describe_pool.submit(self._describe_tasks_batch, *batch, region=self.__client_region(batch[1]))
+                for batch in batches
+            ]
+            describe_tasks_responses = [future.result() for future in futures]
+        else:
+            describe_tasks_responses = [
+                self._describe_tasks_batch(self.__route_target(route)[0], batch_task_arns, route)
+                for batch_task_arns, route in batches
+            ]
+        for describe_tasks_response in describe_tasks_responses:
             all_task_descriptions['tasks'].extend(describe_tasks_response['tasks'])
             all_task_descriptions['failures'].extend(describe_tasks_response['failures'])
         return all_task_descriptions
 
+    def _describe_tasks_batch(self, ecs_client, batched_task_arns: List[str],
+                              route: Optional[QueueRoute] = None) -> dict:
+        """
+        Calls Boto3's DescribeTasks API for at most DESCRIBE_TASKS_BATCH_SIZE ARNs with the given client (of the route's
+        region, if any), and loads the response. The tasks of a route are described in the route's cluster.
+        """
+        cluster = self.__route_target(route)[1]
+        boto_describe_tasks = self.rate_limiter.call(
+            'describe_tasks', ecs_client.describe_tasks, tasks=batched_task_arns, cluster=cluster
+        )
+        try:
+            return load_tasks_response(boto_describe_tasks)
+        except ValidationError as err:
+            self.log.error('ECS DescribeTask Response: %s', boto_describe_tasks)
+            raise EcsFargateError(
+                'DescribeTasks API call does not match expected JSON shape. '
+                'Are you sure that the correct version of Boto3 is installed? {}'.format(
+                    err
+                )
+            )
+
+    def __group_by_route(self, task_arns: List[str]) -> List[Tuple[Optional[QueueRoute], List[str]]]:
+        """Groups the given tasks by the route of their Airflow queue. Tasks of queues without a route map to None"""
+        if not self.routes:
+            return [(None, task_arns)]
+        arns_by_route = defaultdict(list)
+        for arn in task_arns:
+            arns_by_route[self.routes.get(self.active_workers.queue_by_arn(arn))].append(arn)
+        return list(arns_by_route.items())
+
+    def __route_target(self, route: Optional[QueueRoute]) -> Tuple[Any, str]:
+        """The Boto3 client and the cluster of a route, or the executor's own"""
+        if route is None:
+            return self.ecs, self.cluster
+        return route.client, route.kwargs.get('cluster', self.cluster)
+
+    def __client_region(self, route: Optional[QueueRoute]) -> Optional[str]:
+        """The region of the clients that a pool thread calls a route with; None for the executor's own region"""
+        return route.region if route and route.region != self.region else None
+
+    def __listed_routes(self) -> List[QueueRoute]:
+        """One route per cluster that tasks are routed to, other than the default cluster"""
+        return distinct_routes(self.routes, 'cluster', self.region, self.cluster)
+
     def __handle_failed_task(self, task_arn: str, reason: str):
         """
         AWS' APIs aren't perfect. For example, sometimes task-arns get dropped and never make it to the
-        ECS/Fargate Cloud. If an API failure occurs the task is simply rescheduled.
+        ECS/Fargate Cloud. If an API failure occurs the task is rescheduled: it's no longer tracked under the failed
+        ARN, so the failure isn't seen again, and it's relaunched once its backoff has elapsed. The failure count
+        carries over to the relaunched task.
         """
-        task_key = self.active_workers.arn_to_key[task_arn]
+        self.failover.task_stopped(task_arn)
+        task_key = self.active_workers.key_by_arn(task_arn)
         task_cmd, queue, exec_info = self.active_workers.info_by_key(task_key)
-        failure_count = self.active_workers.failure_count_by_key(task_key)
-        if failure_count < self.__class__.MAX_FAILURE_CHECKS:
+        failure_count = self.active_workers.failure_count_by_key(task_key) + 1
+        if failure_count <= self.max_failure_checks:
+            self.active_workers.pop_for_relaunch(task_key, failure_count)
+            delay = self.relaunches.schedule(EcsFargateQueuedTask(task_key, task_cmd, queue, exec_info), failure_count)
+            self.relaunch_failures[task_key] = failure_count
             self.log.warning('Task %s has failed due to %s. '
-                             'Failure %s out of %s occurred on %s. Rescheduling.',
-                             task_key, reason, failure_count, self.__class__.MAX_FAILURE_CHECKS, task_arn)
-            self.active_workers.increment_failure_count(task_key)
-            self.pending_tasks.appendleft(EcsFargateQueuedTask(task_key, task_cmd, queue, exec_info))
+                             'Failure %s out of %s occurred on %s. Relaunching in %.1f seconds.',
+                             task_key, reason, failure_count, self.max_failure_checks, task_arn, delay)
+            self.metrics.incr('task_relaunches')
+            self.metrics.task_queued(task_key)
+            if self.timeline:
+                self.timeline.record(task_key, QUEUED, arn=task_arn, reason=reason)
         else:
-            self.log.error('Task %s has failed a maximum of %s times. Marking as failed', task_key,
-                           failure_count)
             self.active_workers.pop_by_key(task_key)
-            self.fail(task_key)
+            self.log.error('Task %s has failed a maximum of %s times. Marking as failed', task_key,
+                           failure_count - 1)
+            self.__report_final_states(task_key, State.FAILED, reason=reason)
 
     def attempt_task_runs(self):
         """
@@ -191,37 +704,174 @@ class AwsEcsFargateExecutor(BaseExecutor):
         If the launch type is FARGATE, then this will attempt to place tasks on an AWS Fargate/Fargate-spot
         instance (based off of your task defition).
         """
-        queue_len = len(self.pending_tasks)
+        self.failover.tick()
+        for ecs_task in self.relaunches.pop_due():
+            self.pending_tasks.requeue(ecs_task)
+        if self.packer:
+            self.pending_tasks.regroup(self.packer.pack)
         failure_reasons = defaultdict(int)
-        for _ in range(queue_len):
-            ecs_task = self.pending_tasks.popleft()
-            task_key, cmd, queue, exec_config = ecs_task
-            run_task_response = self._run_task(task_key, cmd, queue, exec_config)
-            if run_task_response['failures']:
-                for f in run_task_response['failures']:
-                    failure_reasons[f['reason']] += 1
-                self.pending_tasks.append(ecs_task)
-            elif not run_task_response['tasks']:
-                self.log.error('ECS RunTask Response: %s', run_task_response)
-                raise EcsFargateError('No failures and no tasks provided in response. This should never happen.')
-            else:
-                task = run_task_response['tasks'][0]
-                self.active_workers.add_task(task, task_key, queue, cmd, exec_config)
+        held_back = []
+        try:
+            # Each launch target's first tasks are admitted, unless the target is backing off after capacity failures
+            ecs_tasks, held_back = self.__admit(self.__pop_pending_tasks())
+            self.__launch_admitted_tasks(ecs_tasks, failure_reasons)
+            # The probes went out. The rest of the tasks of each target that had capacity for its probe are released.
+            ecs_tasks, held_back = self.__admit(held_back)
+            self.__launch_admitted_tasks(ecs_tasks, failure_reasons)
+        finally:
+            # Tasks that failed to launch are requeued once this heartbeat's launches are done, so that a task at the
+            # front of the queue isn't retried in place of the tasks behind it
+            for ecs_task in self.failed_launches + held_back:
+                self.pending_tasks.requeue(ecs_task)
+            self.failed_launches = []
         if failure_reasons:
             self.log.debug('Pending tasks failed to launch for the following reasons: %s. Will retry later.',
                            dict(failure_reasons))
+        if held_back:
+            self.log.debug('Holding back %s pending tasks due to capacity failures: %s', len(held_back), {
+                target: self.capacity_admission.backing_off(target)
+                for target in {self.__launch_target(ecs_task.queue) for ecs_task in held_back}
+            })
+
+    def __pop_pending_tasks(self) -> List[EcsFargateQueuedTask]:
+        """Pops every pending task, unless every launch target is backing off, in which case the queue is left as is"""
+        if self.capacity_admission.holding_back and not any(
+                self.capacity_admission.admit(target, 1) for target in [None] + list(self.routes)
+        ):
+            return []
+        return [self.pending_tasks.pop() for _ in range(len(self.pending_tasks))]
+
+    def __admit(self, ecs_tasks: List[EcsFargateQueuedTask]) -> Tuple[List[EcsFargateQueuedTask],
+                                                                      List[EcsFargateQueuedTask]]:
+        """
+        Splits the given tasks into the ones that capacity admission lets launch now, and the ones that it holds back,
+        per launch target. Both keep the order of the given tasks.
+        """
+        target_lens = defaultdict(int)
+        for ecs_task in ecs_tasks:
+            target_lens[self.__launch_target(ecs_task.queue)] += 1
+        admitted = {target: self.capacity_admission.admit(target, target_len)
+                    for target, target_len in target_lens.items()}
+        admitted_tasks, held_back = [], []
+        for ecs_task in ecs_tasks:
+            target = self.__launch_target(ecs_task.queue)
+            if admitted[target]:
+                admitted[target] -= 1
+                admitted_tasks.append(ecs_task)
+            else:
+                held_back.append(ecs_task)
+        return admitted_tasks, held_back
+
+    def __launch_admitted_tasks(self, ecs_tasks: List[EcsFargateQueuedTask], failure_reasons: Dict[str, int]):
+        """Launches the given tasks, and records the outcome of each launch target's launches for capacity admission"""
+        failure_reasons_by_target = defaultdict(lambda: defaultdict(int))
+        try:
+            launched = self.__launch_pending_tasks(ecs_tasks, failure_reasons_by_target)
+        finally:
+            for target_failure_reasons in failure_reasons_by_target.values():
+                for reason, count in target_failure_reasons.items():
+                    failure_reasons[reason] += count
+        for target in {self.__launch_target(ecs_task.queue) for ecs_task in ecs_tasks}:
+            self.capacity_admission.record(target, failure_reasons_by_target[target], launched[target])
+
+    def __launch_pending_tasks(self, ecs_tasks: List[EcsFargateQueuedTask],
+                               failure_reasons: Dict[Optional[str], Dict[str, int]]) -> Dict[Optional[str], int]:
+        """
+        Attempts to launch the given tasks, and returns the number of tasks launched, and the failure reasons of the
+        rest, by launch target. RunTask calls are issued on the launch pool if there is one, which bounds the number of
+        calls in-flight. If admission control is enabled, a target's launches stop at its first capacity failure (its
+        calls that haven't started yet are cancelled), and the rest of its tasks are put back into the queue, along
+        with the tasks whose call raised. The first error is re-raised once every response has been handled, so that
+        every task that was launched is tracked.
+        """
+        futures = None
+        if self.launch_pool and len(ecs_tasks) > 1:
+            futures = [
+                self.launch_pool.submit(self.__run_queued_task, ecs_task,
+                                        region=self.__client_region(self.routes.get(ecs_task.queue)))
+                for ecs_task in ecs_tasks
+            ]
+        launch_error = None
+        launched = defaultdict(int)
+        stopped_targets = set()
+        for i, ecs_task in enumerate(ecs_tasks):
+            target = self.__launch_target(ecs_task.queue)
+            if futures[i].cancelled() if futures else target in stopped_targets:
+                self.failed_launches.append(ecs_task)
+                continue
+            try:
+                run_task_response = futures[i].result() if futures else self._run_task(*ecs_task)
+            except Exception as err:  # pylint: disable=broad-except
+                self.failed_launches.append(ecs_task)
+                launch_error = launch_error or err
+                if self.timeline:
+                    self.timeline.record(ecs_task.key, LAUNCH_FAILED, reason=error_code(err))
+                continue
+            try:
+                launched[target] += self.__handle_run_task_response(ecs_task, run_task_response,
+                                                                    failure_reasons[target])
+            except EcsFargateError as err:
+                launch_error = launch_error or err
+                continue
+            if self.capacity_admission.enabled and self.__capacity_failed(run_task_response):
+                stopped_targets.add(target)
+                for other_task, future in zip(ecs_tasks, futures or ()):
+                    if self.__launch_target(other_task.queue) == target:
+                        future.cancel()
+        if launch_error:
+            raise launch_error
+        return launched
+
+    def __run_queued_task(self, ecs_client, ecs_task: EcsFargateQueuedTask):
+        """Runs on a launcher thread"""
+        return self._run_task(*ecs_task, ecs_client=ecs_client)
+
+    def __handle_run_task_response(self, ecs_task: EcsFargateQueuedTask, run_task_response: dict,
+                                   failure_reasons: Dict[str, int]) -> bool:
+        """Tracks the task that RunTask launched, or requeues it; returns whether it was launched"""
+        task_key, cmd, queue, exec_config = ecs_task
+        if run_task_response['failures']:
+            for f in run_task_response['failures']:
+                failure_reasons[f['reason']] += 1
+                self.metrics.incr('run_task_failures.' + f['reason'])
+                if self.timeline:
+                    self.timeline.record(task_key, LAUNCH_FAILED, reason=f['reason'])
+            self.failover.record_launch(self.__launch_target(queue),
+                                        capacity_failure=self.__capacity_failed(run_task_response))
+            self.failed_launches.append(ecs_task)
+            return False
+        if not run_task_response['tasks']:
+            self.log.error('ECS RunTask Response: %s', run_task_response)
+            self.failed_launches.append(ecs_task)
+            raise EcsFargateError('No failures and no tasks provided in response. This should never happen.')
+        task = run_task_response['tasks'][0]
+        self.active_workers.add_task(task, task_key, queue, cmd, exec_config,
+                                     self.relaunch_failures.pop(task_key, 0))
+        self.failover.record_launch(self.__launch_target(queue), task.task_arn)
+        self.metrics.task_launched(task_key)
+        if self.timeline:
+            self.timeline.record(task_key, LAUNCHED, arn=task.task_arn)
+        return True
+
+    def __capacity_failed(self, run_task_response: dict) -> bool:
+        """Whether RunTask failed for lack of capacity"""
+        return any(self.capacity_admission.is_capacity_failure(f['reason']) for f in run_task_response['failures'])
 
-    def _run_task(self, task_id: TaskInstanceKeyType, cmd: CommandType, queue: str, exec_config: ExecutorConfigType):
+    def _run_task(self, task_id: TaskInstanceKeyType, cmd: CommandType, queue: str, exec_config: ExecutorConfigType,
+                  ecs_client=None):
         """
         This function is the actual attempt to run a queued-up airflow task. Not to be confused with
         execute_async() which inserts tasks into the queue.
         The command and executor config will be placed in the container-override section of the JSON request, before
-        calling Boto3's "run_task" function.
+        calling Boto3's "run_task" function. Launcher threads pass in their own Boto3 client of the task's region.
+        Otherwise, the tasks of a routed queue are launched with their route's client.
         """
         run_task_api = self._run_task_kwargs(task_id, cmd, queue, exec_config)
-        boto_run_task = self.ecs.run_task(**run_task_api)
+        if ecs_client is None:
+            ecs_client = self.__route_target(self.routes.get(queue))[0]
+        boto_run_task = self.rate_limiter.call('run_task', ecs_client.run_task, **run_task_api)
         try:
-            run_task_response = BotoRunTaskSchema().load(boto_run_task)
+            run_task_response = load_tasks_response(boto_run_task)
         except ValidationError as err:
             self.log.error('ECS RunTask Response: %s', err)
             raise EcsFargateError(
@@ -239,38 +889,113 @@ class AwsEcsFargateExecutor(BaseExecutor):
         the container overrides.
 
         One last chance to modify Boto3's "run_task" kwarg params before it gets passed into the Boto3 client.
+        The returned kwargs share unmodified members with run_task_kwargs, so replace members instead of mutating
+        them in place. The tasks of a routed queue are rendered from their route's template, and the tasks of a
+        route (or of the defaults) that has failed over are launched with its failover capacity provider strategy.
         """
-        run_task_api = deepcopy(self.run_task_kwargs)
-        container_override = self.get_container(run_task_api['overrides']['containerOverrides'])
-        container_override['command'] = cmd
-        container_override.update(exec_config)
+        route = self.routes.get(queue)
+        run_task_api = (route.template if route else self.__get_run_task_template()).render(cmd, exec_config)
+        failover_strategy = self.failover.strategy(self.__launch_target(queue))
+        if failover_strategy is not None:
+            run_task_api.pop('launchType', None)
+            run_task_api['capacityProviderStrategy'] = failover_strategy
+        if self.adopt_by_tags:
+            run_task_api['tags'] = list(run_task_api.get('tags', [])) + [
+                {'key': key, 'value': value} for key, value in task_key_tags(task_id).items()
+            ]
         return run_task_api
 
+    def __launch_target(self, queue: Optional[str]) -> Optional[str]:
+        """The queue of a routed task, or None for the tasks that launch with run_task_kwargs"""
+        return queue if queue in self.routes else None
+
+    def __capacity_mode_switched(self, target: Optional[str], old_mode: str, new_mode: str, seconds: float):
+        """Logs every failover and recovery, and reports the time spent in the capacity mode that ended"""
+        target_name = 'queue {}'.format(target) if target is not None else 'the default run_task_kwargs'
+        if new_mode == FAILOVER:
+            self.log.warning('Launches for %s are failing over to their failover capacity provider strategy after '
+                             '%.0f seconds', target_name, seconds)
+        else:
+            self.log.info('Launches for %s are returning to their own capacity provider strategy after %.0f seconds',
+                          target_name, seconds)
+        self.metrics.incr('capacity_mode_switches.' + new_mode)
+        self.metrics.timing('capacity_mode.' + old_mode, seconds)
+
+    def __get_run_task_template(self) -> RequestTemplate:
+        """The RunTask template is (re)compiled whenever run_task_kwargs is replaced"""
+        if self.run_task_template is None or self.run_task_template.kwargs is not self.run_task_kwargs:
+            self.run_task_template = self._compile_run_task_template(self.run_task_kwargs)
+        return self.run_task_template
+
+    def _compile_run_task_template(self, run_task_kwargs: dict) -> RequestTemplate:
+        """Compiles RunTask kwargs into a template that sets the command of the Airflow container"""
+        container_overrides = run_task_kwargs['overrides']['containerOverrides']
+        airflow_container = self.get_container(container_overrides)
+        index = next(i for i, container in enumerate(container_overrides) if container is airflow_container)
+        return RequestTemplate(run_task_kwargs, ('overrides', 'containerOverrides', index))
+
+    def trigger_tasks(self, open_slots: int) -> None:
+        """
+        Remembers the priority weights of the queued tasks, which Airflow doesn't pass on to execute_async(), while
+        they're triggered. They're only kept for the call, so that tasks that Airflow drops from its queue without
+        executing them aren't remembered.
+        """
+        self.task_priorities = {key: priority for key, (_, priority, _, _) in self.queued_tasks.items()}
+        try:
+            super().trigger_tasks(open_slots)
+        finally:
+            self.task_priorities = {}
+
     def execute_async(self, key: TaskInstanceKeyType, command: CommandType, queue=None, executor_config=None):
         """
         Save the task to be executed in the next sync by inserting the commands into a queue.
         """
         if executor_config and ('name' in executor_config or 'command' in executor_config):
             raise ValueError('Executor Config should never override "name" or "command"')
-        self.pending_tasks.append(EcsFargateQueuedTask(key, command, queue, executor_config or {}))
+        priority = self.task_priorities.get(key, 1)
+        if self.warm_pool:
+            # Warm workers all run the same task definition, so the executor config doesn't apply
+            self.warm_pool.submit(key, command)
+        else:
+            self.pending_tasks.push(EcsFargateQueuedTask(key, command, queue, executor_config or {}), priority)
+        self.metrics.task_queued(key)
+        if self.timeline:
+            self.timeline.record(key, QUEUED)
 
     def end(self, heartbeat_interval=10):
         """
-        Waits for all currently running tasks to end, and doesn't launch any tasks
+        Waits for all currently running tasks to end, and doesn't launch any tasks.
+        Every running task is checked on every heartbeat, regardless of the polling tiers.
         """
+        self.ending = True
+        self.status_poller.full_sweep = True
         while True:
             self.sync()
-            if not self.active_workers:
+            if not self.active_workers and not self.relaunches and not (self.warm_pool and self.warm_pool.outstanding):
                 break
             time.sleep(heartbeat_interval)
+        for pool in (self.describe_pool, self.launch_pool):
+            if pool:
+                pool.shutdown()
+        self.describe_pool = self.launch_pool = None
+        if self.journal:
+            self.journal.close()
+            self.journal = self.active_workers.journal = None
+        if self.timeline:
+            self.timeline.close()
+            self.timeline = None
 
     def terminate(self):
         """
         Kill all ECS processes by calling Boto3's StopTask API.
         """
-        for arn in self.active_workers.get_all_arns():
-            self.ecs.stop_task(
-                cluster=self.cluster,
+        self.ending = True
+        worker_arns = sorted(self.warm_pool.workers) if self.warm_pool else []
+        for arn in self.active_workers.get_all_arns() + worker_arns:
+            ecs_client, cluster = self.__route_target(self.routes.get(self.active_workers.queue_by_arn(arn)))
+            self.rate_limiter.call(
+                'stop_task', ecs_client.stop_task,
+                cluster=cluster,
                 task=arn,
                 reason='Airflow Executor received a SIGTERM'
             )
@@ -303,71 +1028,135 @@ class AwsEcsFargateExecutor(BaseExecutor):
         raise KeyError(f'No such container found by container name: {self.container_name}')
 
 
+class EcsFargateTaskRecord:
+    """A task tracked by EcsFargateTaskCollection: its Airflow key, ECS ARN & state, failure count, and launch info"""
+    __slots__ = ('key', 'arn', 'task', 'failure_count', 'cmd', 'queue', 'config')
+
+    def __init__(self, key: TaskInstanceKeyType, task: EcsFargateTask, cmd: CommandType, queue: str,
+                 config: ExecutorConfigType):
+        self.key = key
+        self.arn = task.task_arn
+        self.task = task
+        self.failure_count = 0
+        self.cmd = cmd
+        self.queue = queue
+        self.config = config
+
+
 class EcsFargateTaskCollection:
     """
-    A five-way dictionary between Airflow task ids, Airflow cmds, ECS ARNs, and ECS task objects
+    A store of the tasks that the executor is tracking, with one record per Airflow task, indexed by both the
+    Airflow task key and the ECS ARN.
     """
 
-    def __init__(self):
-        self.key_to_arn: Dict[TaskInstanceKeyType, str] = {}
-        self.arn_to_key: Dict[str, TaskInstanceKeyType] = {}
-        self.tasks: Dict[str, EcsFargateTask] = {}
-        self.key_to_failure_counts: Dict[TaskInstanceKeyType, int] = defaultdict(int)
-        self.key_to_task_info: Dict[TaskInstanceKeyType, EcsFargateTaskInfo] = {}
+    def __init__(self, journal: Optional[StateJournal] = None):
+        self.journal = journal
+        self._by_key: Dict[TaskInstanceKeyType, EcsFargateTaskRecord] = {}
+        self._by_arn: Dict[str, EcsFargateTaskRecord] = {}
 
     def add_task(self, task: EcsFargateTask, airflow_task_key: TaskInstanceKeyType, queue: str,
-                 airflow_cmd: CommandType, exec_config: ExecutorConfigType):
-        """Adds a task to the collection"""
-        arn = task.task_arn
-        self.tasks[arn] = task
-        self.key_to_arn[airflow_task_key] = arn
-        self.arn_to_key[arn] = airflow_task_key
-        self.key_to_task_info[airflow_task_key] = EcsFargateTaskInfo(airflow_cmd, queue, exec_config)
+                 airflow_cmd: CommandType, exec_config: ExecutorConfigType, failure_count: int = 0):
+        """
+        Adds a task to the collection. If the Airflow task is being relaunched, its previous ARN is dropped. A task
+        that was relaunched after it stopped being tracked is added with the failure count of its previous launches.
+        """
+        record = self._by_key.get(airflow_task_key)
+        if record is None:
+            record = EcsFargateTaskRecord(airflow_task_key, task, airflow_cmd, queue, exec_config)
+            record.failure_count = failure_count
+            self._by_key[airflow_task_key] = record
+        else:
+            # The failure count is kept across relaunches
+            self._by_arn.pop(record.arn, None)
+            record.arn, record.task = task.task_arn, task
+            record.cmd, record.queue, record.config = airflow_cmd, queue, exec_config
+        self._by_arn[record.arn] = record
+        if self.journal:
+            self.journal.record_add(record.arn, airflow_task_key, EcsFargateTaskInfo(airflow_cmd, queue, exec_config))
+            if record.failure_count:
+                self.journal.record_failure_count(airflow_task_key, record.failure_count)
+
+    def restore(self, task: EcsFargateTask, airflow_task_key: TaskInstanceKeyType, info: EcsFargateTaskInfo,
+                failure_count: int = 0):
+        """Adds a task that was replayed from the state journal, without journaling it again"""
+        journal, self.journal = self.journal, None
+        try:
+            self.add_task(task, airflow_task_key, info.queue, info.cmd, info.config)
+        finally:
+            self.journal = journal
+        self._by_key[airflow_task_key].failure_count = failure_count
 
     def update_task(self, task: EcsFargateTask):
         """Updates the state of the given task based on task ARN"""
-        self.tasks[task.task_arn] = task
+        record = self._by_arn.get(task.task_arn)
+        if record is not None:
+            record.task = task
 
     def task_by_key(self, task_key: TaskInstanceKeyType) -> EcsFargateTask:
         """Get a task by Airflow Instance Key"""
-        arn = self.key_to_arn[task_key]
-        return self.task_by_arn(arn)
+        return self._by_key[task_key].task
 
     def task_by_arn(self, arn) -> EcsFargateTask:
         """Get a task by AWS ARN"""
-        return self.tasks[arn]
+        return self._by_arn[arn].task
+
+    def key_by_arn(self, arn: str) -> TaskInstanceKeyType:
+        """Get the Airflow Task Key of a task by AWS ARN"""
+        return self._by_arn[arn].key
+
+    def has_arn(self, arn: str) -> bool:
+        """Whether a task with the given AWS ARN is being tracked"""
+        return arn in self._by_arn
+
+    def queue_by_arn(self, arn: str) -> Optional[str]:
+        """Get the Airflow queue of a task by AWS ARN, if the task is being tracked"""
+        record = self._by_arn.get(arn)
+        return record.queue if record is not None else None
 
     def pop_by_key(self, task_key: TaskInstanceKeyType) -> EcsFargateTask:
         """Deletes task from collection based off of Airflow Task Instance Key"""
-        arn = self.key_to_arn[task_key]
-        task = self.tasks[arn]
-        del self.key_to_arn[task_key]
-        del self.key_to_task_info[task_key]
-        del self.arn_to_key[arn]
-        del self.tasks[arn]
-        if task_key in self.key_to_failure_counts:
-            del self.key_to_failure_counts[task_key]
-        return task
+        record = self._by_key.pop(task_key)
+        del self._by_arn[record.arn]
+        if self.journal:
+            self.journal.record_pop(task_key)
+        return record.task
+
+    def pop_for_relaunch(self, task_key: TaskInstanceKeyType, failure_count: int) -> EcsFargateTask:
+        """
+        Deletes a task that is waiting to be relaunched from the collection. It stays in the journal, with its new
+        failure count, until it's relaunched, so a restarted scheduler relaunches it.
+        """
+        record = self._by_key.pop(task_key)
+        del self._by_arn[record.arn]
+        if self.journal:
+            self.journal.record_relaunch(task_key, EcsFargateTaskInfo(record.cmd, record.queue, record.config),
+                                         failure_count)
+        return record.task
 
     def get_all_arns(self) -> List[str]:
         """Get all AWS ARNs in collection"""
-        return list(self.key_to_arn.values())
+        return [record.arn for record in self._by_key.values()]
 
     def get_all_task_keys(self) -> List[TaskInstanceKeyType]:
         """Get all Airflow Task Keys in collection"""
-        return list(self.key_to_arn.keys())
+        return list(self._by_key)
 
     def failure_count_by_key(self, task_key: TaskInstanceKeyType) -> int:
         """Get the number of times a task has failed given an Airflow Task Key"""
-        return self.key_to_failure_counts[task_key]
+        record = self._by_key.get(task_key)
+        return record.failure_count if record is not None else 0
 
     def increment_failure_count(self, task_key: TaskInstanceKeyType):
         """Increment the failure counter given an Airflow Task Key"""
-        self.key_to_failure_counts[task_key] += 1
+        record = self._by_key[task_key]
+        record.failure_count += 1
+        if self.journal:
+            self.journal.record_failure_count(task_key, record.failure_count)
 
     def info_by_key(self, task_key: TaskInstanceKeyType) -> EcsFargateTaskInfo:
         """Get the Airflow Command given an airflow task key"""
-        return self.key_to_task_info[task_key]
+        record = self._by_key[task_key]
+        return EcsFargateTaskInfo(record.cmd, record.queue, record.config)
 
     def __getitem__(self, value):
         """Gets a task by AWS ARN"""
@@ -375,7 +1164,7 @@ class EcsFargateTaskCollection:
 
     def __len__(self):
         """Determines the number of tasks in collection"""
-        return len(self.tasks)
+        return len(self._by_key)
 
 
 class BotoContainerSchema(Schema):
@@ -402,6 +1191,7 @@ class BotoTaskSchema(Schema):
     containers = fields.List(fields.Nested(BotoContainerSchema), required=True)
     started_at = fields.Field(data_key='startedAt')
     stopped_reason = fields.String(data_key='stoppedReason')
+    stopped_at = fields.Field(data_key='stoppedAt')
 
     @post_load
     def make_task(self, data, **kwargs):
@@ -445,5 +1235,101 @@ class BotoDescribeTasksSchema(Schema):
         unknown = EXCLUDE
 
 
+def load_task(boto_task: Any, path: str = '') -> EcsFargateTask:
+    """
+    Low-overhead equivalent of BotoTaskSchema().load(). Builds an EcsFargateTask straight from a Botocore 'Task'
+    shape, reading only the members that the executor uses.
+    :raises ValidationError: if the task does not match the expected shape.
+    """
+    boto_task = load_object(boto_task, path + '_schema')
+    containers = []
+    for i, boto_container in enumerate(load_list(boto_task, 'containers', required=True, path=path)):
+        container_path = '{}containers.{}.'.format(path, i)
+        boto_container = load_object(boto_container, container_path + '_schema')
+        # Names & statuses repeat across every tracked task, so they're interned rather than kept per task
+        container = {'name': intern(load_member(boto_container, 'name', str, required=True, path=container_path))}
+        exit_code = load_member(boto_container, 'exitCode', int, path=container_path)
+        if exit_code is not None:
+            container['exit_code'] = exit_code
+        last_status = load_member(boto_container, 'lastStatus', str, path=container_path)
+        if last_status is not None:
+            container['last_status'] = intern(last_status)
+        containers.append(container)
+    return EcsFargateTask(
+        task_arn=load_member(boto_task, 'taskArn', str, required=True, path=path),
+        last_status=intern(load_member(boto_task, 'lastStatus', str, required=True, path=path)),
+        desired_status=intern(load_member(boto_task, 'desiredStatus', str, required=True, path=path)),
+        containers=containers,
+        started_at=boto_task.get('startedAt'),
+        stopped_reason=load_member(boto_task, 'stoppedReason', str, path=path),
+        stopped_at=boto_task.get('stoppedAt')
+    )
+
+
+def load_task_tags(boto_task: Any, path: str = '') -> Dict[str, str]:
+    """Loads the tags of a Botocore 'Task' shape, which DescribeTasks only includes when asked to"""
+    tags = {}
+    for i, boto_tag in enumerate(load_list(boto_task, 'tags', path=path)):
+        tag_path = '{}tags.{}.'.format(path, i)
+        boto_tag = load_object(boto_tag, tag_path + '_schema')
+        tags[load_member(boto_tag, 'key', str, required=True, path=tag_path)] = \
+            load_member(boto_tag, 'value', str, path=tag_path) or ''
+    return tags
+
+
+def load_tagged_tasks_response(boto_response: Any) -> List[Tuple[EcsFargateTask, Dict[str, str]]]:
+    """Loads the tasks of a DescribeTasks response that includes tags, along with their tags"""
+    boto_response = load_object(boto_response)
+    tagged_tasks = []
+    for i, boto_task in enumerate(load_list(boto_response, 'tasks', required=True)):
+        path = 'tasks.{}.'.format(i)
+        task = load_task(boto_task, path)
+        tagged_tasks.append((task, load_task_tags(boto_task, path)))
+    return tagged_tasks
+
+
+def load_failure(boto_failure: Any, path: str = '') -> Dict[str, str]:
+    """Low-overhead equivalent of BotoFailureSchema().load()"""
+    boto_failure = load_object(boto_failure, path + '_schema')
+    failure = {}
+    for key in ('arn', 'reason'):
+        value = load_member(boto_failure, key, str, path=path)
+        if value is not None:
+            failure[key] = value
+    return failure
+
+
+def load_tasks_response(boto_response: Any) -> Dict[str, list]:
+    """
+    Low-overhead equivalent of BotoRunTaskSchema().load() and BotoDescribeTasksSchema().load(); both operations
+    respond with the same 'tasks' and 'failures' members.
+    :raises ValidationError: if the response does not match the expected shape.
+    """
+    boto_response = load_object(boto_response)
+    return {
+        'tasks': [
+            load_task(boto_task, 'tasks.{}.'.format(i))
+            for i, boto_task in enumerate(load_list(boto_response, 'tasks', required=True))
+        ],
+        'failures': [
+            load_failure(boto_failure, 'failures.{}.'.format(i))
+            for i, boto_failure in enumerate(load_list(boto_response, 'failures', required=True))
+        ]
+    }
+
+
+def load_list_tasks_response(boto_response: Any) -> Dict[str, Any]:
+    """
+    Low-overhead decoder for the ListTasks response.
+    :raises ValidationError: if the response does not match the expected shape.
+    """
+    boto_response = load_object(boto_response)
+    task_arns = load_list(boto_response, 'taskArns', required=True)
+    for i, task_arn in enumerate(task_arns):
+        if not isinstance(task_arn, str):
+            raise ValidationError({'taskArns.{}'.format(i): ['Not a valid str.']})
+    return {'task_arns': task_arns, 'next_token': load_member(boto_response, 'nextToken', str)}
+
+
 class EcsFargateError(Exception):
     """Thrown when something unexpected has occurred within the AWS ECS/Fargate ecosystem"""
@@ -0,0 +1,151 @@
+"""Fails launches over to an alternate capacity provider strategy (ex: from Fargate Spot to on-demand Fargate)"""
+
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+PRIMARY = 'primary'
+FAILOVER = 'failover'
+MODES = (PRIMARY, FAILOVER)
+
+# Called with the launch target, the mode that it left, the mode that it entered, and the seconds spent in the former
+SwitchCallbackType = Callable[[Hashable, str, str, float], None]
+
+
+class FailoverTarget:
+    """The capacity mode of one launch target, and the counters that decide when it switches"""
+    __slots__ = ('strategy', 'mode', 'since', 'mode_seconds', 'capacity_failures', 'recover_at', 'recovery_interval',
+                 'probing')
+
+    def __init__(self, strategy: List[Dict[str, Any]], now: float, recovery_interval: float):
+        self.strategy = strategy
+        self.mode = PRIMARY
+        self.since = now
+        # Mode -> seconds spent in the mode, not counting the current one
+        self.mode_seconds = dict.fromkeys(MODES, 0.0)
+        self.capacity_failures = 0
+        self.recover_at = 0.0
+        self.recovery_interval = recovery_interval
+        self.probing = False
+
+
+class CapacityFailover:
+    """
+    Decides whether each launch target (the executor's default kwargs, or a queue route) launches tasks with its own
+    capacity provider strategy, or with its failover strategy. A target fails over after failure_threshold launches
+    in a row that failed for lack of capacity, or once a task that it launched has been provisioning for longer than
+    latency_budget seconds. After recovery_interval seconds, the target goes back to its own strategy on probation:
+    the first capacity failure or slow task fails it over again, for twice as long (up to max_recovery_interval), and
+    the first task that starts running ends the probation.
+    Targets without a failover strategy never fail over. Every switch is reported to on_switch, along with the time
+    that the target spent in the mode that it left.
+    """
+
+    def __init__(self, strategies: Dict[Hashable, Optional[List[Dict[str, Any]]]], failure_threshold: int = 3,
+                 latency_budget: float = 300.0, recovery_interval: float = 600.0,
+                 max_recovery_interval: float = 3600.0, on_switch: Optional[SwitchCallbackType] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.latency_budget = latency_budget
+        self.initial_recovery_interval = recovery_interval
+        self.max_recovery_interval = max_recovery_interval
+        self.on_switch = on_switch
+        self.clock = clock
+        now = clock()
+        self._targets: Dict[Hashable, FailoverTarget] = {
+            target: FailoverTarget(strategy, now, recovery_interval)
+            for target, strategy in strategies.items() if strategy
+        }
+        # Task ARN -> (target, launch time) of the tasks that were launched with their target's own strategy and
+        # haven't been seen running yet, in the order that they were launched
+        self._provisioning: Dict[str, Tuple[Hashable, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any launch target has a failover strategy"""
+        return bool(self._targets)
+
+    @property
+    def provisioning(self) -> List[str]:
+        """The ARNs of the tasks that are waited on to start running, so that their targets fail over if they don't"""
+        return list(self._provisioning)
+
+    def strategy(self, target: Hashable) -> Optional[List[Dict[str, Any]]]:
+        """The failover strategy of the target, if it's failed over; or None, to launch with its own strategy"""
+        state = self._targets.get(target)
+        return state.strategy if state is not None and state.mode == FAILOVER else None
+
+    def tick(self):
+        """
+        Called before every round of launches. Targets whose recovery interval has elapsed go back to their own
+        strategy, and targets with a task that has been provisioning for too long fail over.
+        """
+        now = self.clock()
+        for target, state in self._targets.items():
+            if state.mode == FAILOVER and now >= state.recover_at:
+                state.probing = True
+                state.capacity_failures = 0
+                self.__switch(target, state, PRIMARY, now)
+        if self.latency_budget <= 0:
+            return
+        slow_targets = {}
+        for target, launched_at in self._provisioning.values():
+            if now - launched_at <= self.latency_budget:
+                break
+            slow_targets[target] = self._targets[target]
+        for target, state in slow_targets.items():
+            self.__fail_over(target, state, now)
+
+    def record_launch(self, target: Hashable, arn: Optional[str] = None, capacity_failure: bool = False):
+        """Records a task that launched with the given ARN, or a launch that failed (for lack of capacity, or not)"""
+        state = self._targets.get(target)
+        if state is None or state.mode == FAILOVER:
+            return
+        if arn is not None:
+            state.capacity_failures = 0
+            if self.latency_budget > 0 or state.probing:
+                self._provisioning[arn] = (target, self.clock())
+        elif capacity_failure:
+            state.capacity_failures += 1
+            if state.probing or 0 < self.failure_threshold <= state.capacity_failures:
+                self.__fail_over(target, state, self.clock())
+
+    def task_running(self, arn: str):
+        """A task has been seen running. If it launched on probation, then its target has recovered"""
+        provisioning = self._provisioning.pop(arn, None)
+        if provisioning is None:
+            return
+        state = self._targets[provisioning[0]]
+        if state.mode == PRIMARY and state.probing:
+            state.probing = False
+            state.recovery_interval = self.initial_recovery_interval
+
+    def task_stopped(self, arn: str):
+        """A task has stopped, or is no longer tracked"""
+        self._provisioning.pop(arn, None)
+
+    def mode_seconds(self, target: Hashable) -> Dict[str, float]:
+        """The time that the target has spent in each mode, including the mode that it's in now"""
+        state = self._targets.get(target)
+        if state is None:
+            return dict.fromkeys(MODES, 0.0)
+        mode_seconds = dict(state.mode_seconds)
+        mode_seconds[state.mode] += self.clock() - state.since
+        return mode_seconds
+
+    def __fail_over(self, target: Hashable, state: FailoverTarget, now: float):
+        if state.probing:
+            state.recovery_interval = min(state.recovery_interval * 2, self.max_recovery_interval)
+        state.recover_at = now + state.recovery_interval
+        state.probing = False
+        # The target's tasks that are still provisioning were launched before it failed over
+        for arn in [arn for arn, (arn_target, _) in self._provisioning.items() if arn_target == target]:
+            del self._provisioning[arn]
+        self.__switch(target, state, FAILOVER, now)
+
+    def __switch(self, target: Hashable, state: FailoverTarget, mode: str, now: float):
+        seconds = now - state.since
+        state.mode_seconds[state.mode] += seconds
+        if self.on_switch:
+            self.on_switch(target, state.mode, mode, seconds)
+        state.mode = mode
+        state.since = now
@@ -0,0 +1,130 @@
+"""A durable journal of the tasks & jobs that the AWS Executors are tracking, so that they survive restarts"""
+
+import pickle
+import sqlite3
+import threading
+from collections import namedtuple
+from typing import Any, Dict, List, Optional
+
+# The state of one tracked Airflow task, as replayed from the journal. A task that's waiting to be relaunched has no
+# task_id.
+JournalRecord = namedtuple('JournalRecord', ('task_id', 'key', 'info', 'failure_count'))
+
+ADD = 'add'
+POP = 'pop'
+RELAUNCH = 'relaunch'
+FAILURE_COUNT = 'failure_count'
+
+
+class StateJournal:
+    """
+    An append-only SQLite log of the changes made to an executor's task collection: tasks that are added (or
+    relaunched) with their AWS ID, tasks that wait to be relaunched, tasks that are popped, and changes to their
+    failure counts. Replaying the log rebuilds the collection after a scheduler restart.
+    Entries are committed once per heartbeat, by flush(), so that tracking a task doesn't cost a disk sync. Airflow
+    task keys and task info are pickled, so they're restored with their original types.
+    The log is compacted on flush once it has grown past compact_rows rows, and past twice the rows that it was last
+    compacted to, so that a long-running scheduler's journal stays in proportion to the tasks that it's tracking.
+    """
+
+    def __init__(self, path: str, compact_rows: int = 10000):
+        self.path = path
+        self.compact_rows = compact_rows
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS journal ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, key BLOB NOT NULL, task_id TEXT, '
+            'info BLOB, failure_count INTEGER)'
+        )
+        self._connection.commit()
+        self._rows = self._connection.execute('SELECT COUNT(*) FROM journal').fetchone()[0]
+        self._next_compaction = compact_rows
+
+    def record_add(self, task_id: str, key: Any, info: Any = None):
+        """Records that an Airflow task is tracked under the given AWS ID (ECS task ARN or Batch job ID)"""
+        self.__append(ADD, key, task_id=task_id, info=pickle.dumps(info))
+
+    def record_relaunch(self, key: Any, info: Any, failure_count: int):
+        """Records that an Airflow task is no longer tracked under an AWS ID, and is waiting to be relaunched"""
+        self.__append(RELAUNCH, key, info=pickle.dumps(info), failure_count=failure_count)
+
+    def record_pop(self, key: Any):
+        """Records that an Airflow task is no longer tracked"""
+        self.__append(POP, key)
+
+    def record_failure_count(self, key: Any, failure_count: int):
+        """Records the number of times that an Airflow task has failed to launch or has gone missing"""
+        self.__append(FAILURE_COUNT, key, failure_count=failure_count)
+
+    def load(self) -> List[JournalRecord]:
+        """Replays the journal into the tasks that are still being tracked, in the order that they were added"""
+        records: Dict[bytes, JournalRecord] = {}
+        failure_counts: Dict[bytes, int] = {}
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT op, key, task_id, info, failure_count FROM journal ORDER BY seq'
+            ).fetchall()
+        for op, key_blob, task_id, info_blob, failure_count in rows:
+            if op == ADD:
+                records.pop(key_blob, None)
+                records[key_blob] = JournalRecord(task_id, pickle.loads(key_blob), pickle.loads(info_blob), 0)
+            elif op == RELAUNCH:
+                records.pop(key_blob, None)
+                records[key_blob] = JournalRecord(None, pickle.loads(key_blob), pickle.loads(info_blob), 0)
+                failure_counts[key_blob] = failure_count
+            elif op == POP:
+                records.pop(key_blob, None)
+                failure_counts.pop(key_blob, None)
+            elif op == FAILURE_COUNT:
+                failure_counts[key_blob] = failure_count
+        return [record._replace(failure_count=failure_counts.get(key_blob, 0))
+                for key_blob, record in records.items()]
+
+    def compact(self, records: Optional[List[JournalRecord]] = None):
+        """Rewrites the journal so that it only contains the given records (by default, the replayed ones)"""
+        records = self.load() if records is None else records
+        with self._lock:
+            self._connection.execute('DELETE FROM journal')
+            self._rows = 0
+            for record in records:
+                key_blob = pickle.dumps(record.key)
+                if record.task_id is None:
+                    self._connection.execute('INSERT INTO journal (op, key, info, failure_count) VALUES (?, ?, ?, ?)',
+                                             (RELAUNCH, key_blob, pickle.dumps(record.info), record.failure_count))
+                    self._rows += 1
+                    continue
+                self._connection.execute('INSERT INTO journal (op, key, task_id, info) VALUES (?, ?, ?, ?)',
+                                         (ADD, key_blob, record.task_id, pickle.dumps(record.info)))
+                self._rows += 1
+                if record.failure_count:
+                    self._connection.execute('INSERT INTO journal (op, key, failure_count) VALUES (?, ?, ?)',
+                                             (FAILURE_COUNT, key_blob, record.failure_count))
+                    self._rows += 1
+            self._connection.commit()
+            self._next_compaction = max(self.compact_rows, 2 * self._rows)
+
+    def flush(self):
+        """Commits the entries that have been recorded since the last flush, and compacts the journal if it's grown"""
+        with self._lock:
+            self._connection.commit()
+            grown = self._rows >= self._next_compaction
+        if grown:
+            self.compact()
+
+    def close(self):
+        """Commits outstanding entries and closes the journal"""
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+    def __append(self, op: str, key: Any, task_id: Optional[str] = None, info: Optional[bytes] = None,
+                 failure_count: Optional[int] = None):
+        with self._lock:
+            self._connection.execute(
+                'INSERT INTO journal (op, key, task_id, info, failure_count) VALUES (?, ?, ?, ?, ?)',
+                (op, pickle.dumps(key), task_id, info, failure_count)
+            )
+            self._rows += 1
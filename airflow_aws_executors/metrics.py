@@ -0,0 +1,102 @@
+"""StatsD metrics of the AWS Executors, emitted through Airflow's Stats client"""
+
+import datetime as dt
+import re
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from airflow.stats import Stats
+
+from .packing import GROUP_KEYS
+
+# StatsD names may only contain these characters, so failure reasons (ex: 'RESOURCE:MEMORY') are sanitized to fit
+INVALID_STAT_NAME_CHARACTERS = re.compile(r'[^a-zA-Z0-9_.-]')
+# The timer that's emitted when a task moves from one stage of its lifecycle to the next
+LIFECYCLE_TIMERS = {
+    ('queued', 'launched'): 'launch_latency',
+    ('launched', 'running'): 'start_latency',
+    ('running', 'finished'): 'run_duration',
+}
+
+
+class ExecutorMetrics:
+    """
+    Emits the metrics of an executor, under a common prefix, through Airflow's Stats client. Stats is a no-op unless
+    StatsD metrics are enabled in Airflow.
+    Besides counters, gauges and timers, it follows every task that the executor queues through its lifecycle:
+    queued by execute_async(), launched on AWS, running, and finished. The time between consecutive stages is emitted
+    as launch_latency, start_latency and run_duration. Tasks that skip a stage (ex: they fail before running) only
+    emit the timers of the stages that they went through. The tasks of a pack each go through the stages of the pack.
+    """
+
+    def __init__(self, prefix: str, stats: Any = Stats, clock: Callable[[], float] = time.monotonic):
+        self.prefix = prefix
+        self.stats = stats
+        self.clock = clock
+        # Airflow task key -> (lifecycle stage, time at which the task entered it)
+        self._stages: Dict[Any, Tuple[str, float]] = {}
+        # Metric name -> full StatsD name. There are only so many operations, statuses and failure reasons.
+        self._stat_names: Dict[str, str] = {}
+
+    def stat_name(self, name: str) -> str:
+        """The full StatsD name of a metric of this executor"""
+        stat_name = self._stat_names.get(name)
+        if stat_name is None:
+            stat_name = self._stat_names[name] = INVALID_STAT_NAME_CHARACTERS.sub(
+                '_', '{}.{}'.format(self.prefix, name)
+            )
+        return stat_name
+
+    def incr(self, name: str, count: int = 1):
+        """Increments a counter"""
+        self.stats.incr(self.stat_name(name), count)
+
+    def gauge(self, name: str, value: float):
+        """Sets a gauge"""
+        self.stats.gauge(self.stat_name(name), value)
+
+    def timing(self, name: str, seconds: float):
+        """Records a duration, in seconds"""
+        self.stats.timing(self.stat_name(name), dt.timedelta(seconds=seconds))
+
+    def api_call(self, operation_name: str, seconds: float, error_code: Optional[str] = None):
+        """Records the latency of one call to an AWS API operation, and counts the call's error, if any"""
+        self.timing('api.' + operation_name, seconds)
+        if error_code:
+            self.incr('api.{}.errors.{}'.format(operation_name, error_code))
+
+    def task_queued(self, key: Any):
+        """A task has been queued for launch, or re-queued after a failed launch"""
+        self.__advance(key, 'queued')
+
+    def task_launched(self, key: Any):
+        """A task has been launched on AWS"""
+        self.__advance(key, 'launched')
+
+    def task_running(self, key: Any):
+        """A task has been seen running. Tasks that are seen running again are ignored"""
+        self.__advance(key, 'running')
+
+    def task_finished(self, key: Any):
+        """A task has finished, or is no longer tracked"""
+        self.__advance(key, 'finished')
+
+    def __advance(self, key: Any, stage: str):
+        if isinstance(key, GROUP_KEYS):
+            for task_key in key.keys:
+                self.__advance(task_key, stage)
+            return
+        previous = self._stages.get(key)
+        if previous is None and stage != 'queued':
+            # Tasks that were adopted or restored weren't queued by this executor, so they aren't followed
+            return
+        if previous is not None and previous[0] == stage:
+            return
+        now = self.clock()
+        if stage == 'finished':
+            del self._stages[key]
+        else:
+            self._stages[key] = (stage, now)
+        timer = LIFECYCLE_TIMERS.get((previous[0], stage)) if previous is not None else None
+        if timer:
+            self.timing(timer, now - previous[1])
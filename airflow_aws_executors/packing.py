@@ -0,0 +1,171 @@
+"""
+Task packing: several small Airflow commands that are run by one ECS task or Batch job, so that each command doesn't pay
+for launching its own container. The container of a pack runs this module, which runs the commands and exits with
+PACK_EXIT_CODE_BASE plus a bitmask of the commands that failed, or with 0 if none did:
+
+    python -m airflow_aws_executors.packing --mode concurrent '[["airflow", "tasks", "run", ...], ...]'
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+from collections import namedtuple
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+
+from airflow.utils.state import State
+
+log = logging.getLogger(__name__)
+
+# Bit i of a pack's exit code, less PACK_EXIT_CODE_BASE, is set if its i-th command failed. The base keeps the bitmasks
+# clear of the exit codes of a runner that crashed (ex: 1 for an uncaught exception, 2 for a usage error), and of
+# shells (126 & 127) and containers that were killed by a signal (from 128 up, ex: 137), so a pack holds at most 6
+# commands.
+PACK_EXIT_CODE_BASE = 32
+MAX_PACK_SIZE = 6
+PACK_MODES = ('concurrent', 'sequential')
+PACK_COMMAND = ['python', '-m', 'airflow_aws_executors.packing']
+
+# The key that an executor tracks a pack under, in place of an Airflow task key: the keys of the packed tasks
+TaskPack = namedtuple('TaskPack', ('keys',))
+# The key that a Batch array job is submitted under: the keys of its children, by array index. Each child is tracked
+# under its own key once the array job is submitted.
+TaskArray = namedtuple('TaskArray', ('keys',))
+GROUP_KEYS = (TaskPack, TaskArray)
+
+
+def task_keys(key: Any) -> Tuple[Any, ...]:
+    """The Airflow task keys behind a tracked key: the members of a pack or an array job, or the key itself"""
+    if not isinstance(key, GROUP_KEYS):
+        return (key,)
+    return tuple(task_key for member in key.keys for task_key in task_keys(member))
+
+
+def group_compatible(queued_tasks: Iterable[Any], max_size: int,
+                     can_group: Optional[Callable[[Any], bool]] = None) -> List[List[Any]]:
+    """
+    Groups compatible queued tasks (same queue and same executor config) into groups of at most max_size tasks, in the
+    order of their first task. Tasks for which can_group() is false are put in groups of their own.
+    """
+    groups = []
+    # (queue, executor config) -> the group that compatible tasks are added to, until it's full
+    open_groups = {}
+    for queued_task in queued_tasks:
+        if can_group is not None and not can_group(queued_task):
+            groups.append([queued_task])
+            continue
+        group_key = (queued_task.queue, json.dumps(queued_task.executor_config, sort_keys=True, default=str))
+        group = open_groups.get(group_key)
+        if group is None or len(group) == max_size:
+            group = open_groups[group_key] = []
+            groups.append(group)
+        group.append(queued_task)
+    return groups
+
+
+class TaskPacker:
+    """
+    Groups compatible queued tasks (same queue and same executor config) into packs of at most pack_size tasks. Queued
+    tasks are namedtuples of (key, command, queue, executor_config), such as the ECS executor's pending tasks; a pack is
+    one of them whose key is a TaskPack and whose command runs every packed command. Packs are ordered by their first
+    task, and tasks that are alone in their group, or that are already packs, are left as they are.
+    """
+
+    def __init__(self, pack_size: int, mode: str = 'concurrent'):
+        if not 1 <= pack_size <= MAX_PACK_SIZE:
+            raise ValueError('pack_size must be between 1 and {}. Got {}'.format(MAX_PACK_SIZE, pack_size))
+        if mode not in PACK_MODES:
+            raise ValueError('pack_mode must be one of {}. Got {}'.format(PACK_MODES, mode))
+        self.pack_size = pack_size
+        self.mode = mode
+
+    def pack(self, queued_tasks: Iterable[Any]) -> List[Any]:
+        """Packs the given queued tasks, in order"""
+        groups = group_compatible(queued_tasks, self.pack_size,
+                                  lambda queued_task: not isinstance(queued_task.key, TaskPack))
+        return [group[0] if len(group) == 1 else self.__make_pack(group) for group in groups]
+
+    def __make_pack(self, group: List[Any]) -> Any:
+        return group[0]._replace(
+            key=TaskPack(tuple(queued_task.key for queued_task in group)),
+            command=pack_command([queued_task.command for queued_task in group], self.mode)
+        )
+
+
+def pack_command(commands: List[List[str]], mode: str = 'concurrent') -> List[str]:
+    """The container command that runs a pack of commands"""
+    return PACK_COMMAND + ['--mode', mode, json.dumps([list(command) for command in commands])]
+
+
+def failed_commands(exit_code: Optional[int], num_commands: int) -> Set[int]:
+    """
+    The indices of the commands of a pack that failed, per the pack's exit code. Every command failed if the exit code
+    is unknown or isn't a bitmask of this pack (ex: the runner crashed, or the container ran out of memory).
+    """
+    if exit_code == 0:
+        return set()
+    if exit_code is None or not PACK_EXIT_CODE_BASE < exit_code < PACK_EXIT_CODE_BASE + 2 ** num_commands:
+        return set(range(num_commands))
+    return {i for i in range(num_commands) if (exit_code - PACK_EXIT_CODE_BASE) & (1 << i)}
+
+
+def pack_exit_code(failed_bitmask: int) -> int:
+    """The exit code of a pack, from the bitmask of its failed commands"""
+    return PACK_EXIT_CODE_BASE + failed_bitmask if failed_bitmask else 0
+
+
+def unpack_states(key: Any, state: str, exit_code: Optional[int] = None) -> List[Tuple[Any, str]]:
+    """
+    The final state of every Airflow task behind a finished ECS task or Batch job. A single task gets the state of its
+    launch; the tasks of a pack all succeed with it, or else get their own state from the pack's exit code. A pack that
+    failed even though its runner exited with 0 (ex: an essential sidecar failed) fails all of its tasks. Every child
+    of an array job gets the given state.
+    """
+    if isinstance(key, TaskArray):
+        return [task_state for member in key.keys for task_state in unpack_states(member, state)]
+    if not isinstance(key, TaskPack):
+        return [(key, state)]
+    if state == State.SUCCESS:
+        return [(task_key, State.SUCCESS) for task_key in key.keys]
+    failed = failed_commands(exit_code, len(key.keys)) if exit_code != 0 else set(range(len(key.keys)))
+    return [(task_key, State.FAILED if i in failed else State.SUCCESS) for i, task_key in enumerate(key.keys)]
+
+
+def run_pack(commands: List[List[str]], mode: str = 'concurrent',
+             popen: Callable[[List[str]], Any] = subprocess.Popen) -> int:
+    """Runs the commands of a pack, concurrently or one after another, and returns the bitmask of the failed ones"""
+    exit_codes = []
+    if mode == 'concurrent':
+        processes = []
+        for command in commands:
+            try:
+                processes.append(popen(command))
+            except OSError as err:
+                log.error('Could not run %s: %s', command, err)
+                processes.append(None)
+        exit_codes = [process.wait() if process else None for process in processes]
+    else:
+        for command in commands:
+            try:
+                exit_codes.append(popen(command).wait())
+            except OSError as err:
+                log.error('Could not run %s: %s', command, err)
+                exit_codes.append(None)
+    return sum(1 << i for i, exit_code in enumerate(exit_codes) if exit_code != 0)
+
+
+def main(args: Optional[List[str]] = None):
+    """Runs a pack of Airflow commands, and exits with the exit code of the pack"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--mode', choices=PACK_MODES, default='concurrent')
+    parser.add_argument('commands', help='A JSON list of commands, each a list of arguments')
+    parsed = parser.parse_args(args)
+    commands = json.loads(parsed.commands)
+    if not 1 <= len(commands) <= MAX_PACK_SIZE:
+        parser.error('A pack holds between 1 and {} commands'.format(MAX_PACK_SIZE))
+    raise SystemExit(pack_exit_code(run_pack(commands, parsed.mode)))
+
+
+if __name__ == '__main__':
+    main()
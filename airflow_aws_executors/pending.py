@@ -0,0 +1,179 @@
+"""The queue of tasks waiting to launch: by priority, with weighted fair sharing across DAGs and queues"""
+
+import heapq
+import itertools
+import json
+import time
+from collections import namedtuple
+from typing import (Any, Callable, Dict, Hashable, Iterator, List, Optional,
+                    Tuple)
+
+from .packing import task_keys
+
+# The priority weight, enqueue time and sequence number of a pending task, which it keeps when it's requeued
+PendingTaskInfo = namedtuple('PendingTaskInfo', ('priority', 'enqueued_at', 'seq'))
+ShareKeyType = Tuple[Optional[str], Optional[str]]
+
+
+def task_share(key: Any, queue: Optional[str]) -> ShareKeyType:
+    """
+    The (DAG ID, Airflow queue) share that a task belongs to. Airflow 2's task keys name their DAG; Airflow 1's are
+    plain tuples that start with it. A pack belongs to the share of its first task.
+    """
+    key = task_keys(key)[0]
+    dag_id = getattr(key, 'dag_id', None)
+    if dag_id is None and type(key) is tuple and key:  # pylint: disable=unidiomatic-typecheck
+        dag_id = key[0]
+    return dag_id, queue
+
+
+class PendingShare:
+    """The pending tasks of one (DAG, queue) share, in a heap of (rank, seq, task), and the share's virtual time"""
+    __slots__ = ('weight', 'tasks', 'virtual_time')
+
+    def __init__(self, weight: float, virtual_time: float = 0.0, tasks: Optional[List[Tuple]] = None):
+        self.weight = weight
+        self.virtual_time = virtual_time
+        self.tasks = tasks if tasks is not None else []
+
+
+class PendingTaskQueue:
+    """
+    The tasks that are waiting to be launched. Tasks are grouped into shares by their DAG and their Airflow queue, and
+    shares take turns by weighted fair queuing: every pop advances the popped share's virtual time by 1 / weight, and
+    the share with the earliest virtual time goes next. A share that has been idle catches up to the current virtual
+    time, so it can't claim the turns that it missed.
+    Within a share, tasks are ordered by their Airflow priority weight, plus one point for every aging_seconds that they
+    have waited, so that nothing waits forever; ties go to the task that was queued first. All tasks age at the same
+    rate, so a task's rank is fixed when it's queued, and push() and pop() are O(log n).
+    A requeued task (ex: after a failed launch) keeps its priority and its place in line, until it's forgotten.
+    """
+
+    def __init__(self, aging_seconds: float = 60.0, dag_weights: Optional[Dict[str, float]] = None,
+                 queue_weights: Optional[Dict[str, float]] = None, clock: Callable[[], float] = time.monotonic):
+        self.aging_seconds = aging_seconds
+        self.dag_weights = dag_weights or {}
+        self.queue_weights = queue_weights or {}
+        self.clock = clock
+        # The virtual time of the last pop
+        self.virtual_time = 0.0
+        self._shares: Dict[ShareKeyType, PendingShare] = {}
+        # Heap of (virtual time, seq, share key), with one entry for every share that has pending tasks
+        self._share_heap: List[Tuple[float, int, ShareKeyType]] = []
+        # Task key -> info, for every task that has been queued and hasn't been forgotten
+        self._info: Dict[Hashable, PendingTaskInfo] = {}
+        # Task key -> share key, of the pending tasks that have been pushed since the last regroup()
+        self._ungrouped: Dict[Hashable, ShareKeyType] = {}
+        self._seq = itertools.count()
+        self._len = 0
+
+    @classmethod
+    def from_config(cls, aging_seconds: float, fair_share_weights: Optional[str]) -> 'PendingTaskQueue':
+        """
+        Creates a queue whose shares are weighted by a JSON object of DAG and queue weights, such as
+        '{"dags": {"critical_dag": 5}, "queues": {"backfill": 0.5}}'. Shares that aren't listed weigh 1.
+        """
+        weights = json.loads(fair_share_weights) if fair_share_weights else {}
+        return cls(aging_seconds, weights.get('dags'), weights.get('queues'))
+
+    def push(self, task: Any, priority: int = 1):
+        """Queues a new task (a namedtuple with a key and a queue) with the given Airflow priority weight"""
+        self._info[task.key] = PendingTaskInfo(priority, self.clock(), next(self._seq))
+        self._ungrouped[task.key] = task_share(task.key, task.queue)
+        self.__push(task)
+
+    def requeue(self, task: Any):
+        """Queues a task again, in its original place if it's been queued before"""
+        if task.key not in self._info:
+            self._info[task.key] = self.__group_info(task.key)
+        self.__push(task)
+
+    def pop(self) -> Any:
+        """Dequeues the next task: the top task of the share whose turn it is"""
+        if not self._share_heap:
+            raise IndexError('pop from an empty PendingTaskQueue')
+        virtual_time, _, share_key = heapq.heappop(self._share_heap)
+        share = self._shares[share_key]
+        _, _, task = heapq.heappop(share.tasks)
+        self._ungrouped.pop(task.key, None)
+        self._len -= 1
+        self.virtual_time = virtual_time
+        share.virtual_time = virtual_time + 1.0 / share.weight
+        if share.tasks:
+            heapq.heappush(self._share_heap, (share.virtual_time, next(self._seq), share_key))
+        return task
+
+    def regroup(self, group: Callable[[List[Any]], List[Any]]):
+        """
+        Replaces the tasks that were pushed since the last regroup with group(tasks) (ex: TaskPacker.pack), where the
+        tasks are given in order of rank. A new group takes the highest priority and the earliest place of its tasks.
+        The tasks that were already pending are left as they are, so only the new tasks are sorted, and only the shares
+        that they were pushed to are rebuilt.
+        """
+        ungrouped, self._ungrouped = self._ungrouped, {}
+        entries = []
+        for share_key in set(ungrouped.values()):
+            share = self._shares.get(share_key)
+            if share is None:
+                continue
+            kept = []
+            for entry in share.tasks:
+                (entries if entry[2].key in ungrouped else kept).append(entry)
+            heapq.heapify(kept)
+            share.tasks = kept
+        if not entries:
+            return
+        self._len -= len(entries)
+        # Shares that were left without tasks no longer take turns
+        self._share_heap = [entry for entry in self._share_heap if self._shares[entry[2]].tasks]
+        heapq.heapify(self._share_heap)
+        for task in group([task for _, _, task in sorted(entries)]):
+            self.requeue(task)
+
+    def forget(self, key: Any):
+        """Forgets the place in line of a task (and of the tasks of a pack) that won't be requeued"""
+        self._info.pop(key, None)
+        self._ungrouped.pop(key, None)
+        for task_key in task_keys(key):
+            self._info.pop(task_key, None)
+            self._ungrouped.pop(task_key, None)
+
+    def __push(self, task: Any):
+        info = self._info[task.key]
+        share_key = task_share(task.key, task.queue)
+        share = self._shares.get(share_key)
+        if share is None:
+            weight = self.dag_weights.get(share_key[0], 1.0) * self.queue_weights.get(share_key[1], 1.0)
+            share = self._shares[share_key] = PendingShare(weight)
+        if not share.tasks:
+            share.virtual_time = max(share.virtual_time, self.virtual_time)
+            heapq.heappush(self._share_heap, (share.virtual_time, next(self._seq), share_key))
+        rank = (info.enqueued_at / self.aging_seconds if self.aging_seconds > 0 else 0.0) - info.priority
+        heapq.heappush(share.tasks, (rank, info.seq, task))
+        self._len += 1
+
+    def __group_info(self, key: Any) -> PendingTaskInfo:
+        """The info of a new pack, from the info of its tasks; or the info of a new task of priority 1"""
+        member_infos = [self._info[task_key] for task_key in task_keys(key) if task_key in self._info]
+        if not member_infos:
+            return PendingTaskInfo(1, self.clock(), next(self._seq))
+        return PendingTaskInfo(max(info.priority for info in member_infos),
+                               min(info.enqueued_at for info in member_infos),
+                               min(info.seq for info in member_infos))
+
+    def __iter__(self) -> Iterator[Any]:
+        """The pending tasks, in the order that they would be popped. This pops a copy of the queue"""
+        snapshot = PendingTaskQueue(self.aging_seconds, self.dag_weights, self.queue_weights, self.clock)
+        snapshot.virtual_time = self.virtual_time
+        snapshot._shares = {
+            share_key: PendingShare(share.weight, share.virtual_time, list(share.tasks))
+            for share_key, share in self._shares.items()
+        }
+        snapshot._share_heap = list(self._share_heap)
+        snapshot._seq = self._seq
+        snapshot._len = self._len
+        while snapshot:
+            yield snapshot.pop()
+
+    def __len__(self):
+        return self._len
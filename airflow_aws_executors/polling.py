@@ -0,0 +1,88 @@
+"""Age-aware scheduling of status checks for the tasks & jobs that the AWS Executors are tracking"""
+
+import json
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# A tier is (minimum age in seconds, seconds between status checks)
+PollingTierType = Tuple[float, float]
+
+
+class StatusPollingScheduler:
+    """
+    Gives every tracked task a next-check time based on its last known Airflow state and its age, so that each
+    heartbeat only describes the tasks that are due.
+    Tiers are configured per state. For example, {'running': [(0, 0), (600, 60), (3600, 300)]} checks running tasks
+    on every heartbeat for their first 10 minutes, then every minute, and every 5 minutes once they're an hour old.
+    States without tiers are checked on every heartbeat. The age of a task is measured from the first time that
+    it's seen by the scheduler.
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, Sequence[PollingTierType]]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tiers = {
+            state.lower(): sorted((float(min_age), float(interval)) for min_age, interval in state_tiers)
+            for state, state_tiers in (tiers or {}).items()
+        }
+        self.clock = clock
+        # When set, every task is due. The executors set this when ending or terminating.
+        self.full_sweep = False
+        self._first_seen: Dict[str, float] = {}
+        self._next_check: Dict[str, float] = {}
+
+    @classmethod
+    def from_config(cls, config_value: Optional[str]) -> 'StatusPollingScheduler':
+        """
+        Creates a scheduler from a JSON config value. For example: '{"running": [[0, 0], [600, 60]]}'.
+        An empty value disables tiered polling.
+        """
+        if not config_value:
+            return cls()
+        tiers = json.loads(config_value)
+        if not isinstance(tiers, dict):
+            raise ValueError('Polling tiers must be a JSON object of state to [[min_age, interval], ...]. '
+                             'Got {}'.format(config_value))
+        return cls(tiers)
+
+    def due(self, task_ids: Iterable[str]) -> List[str]:
+        """Filters the given tracked task IDs down to those that are due for a status check"""
+        task_ids = list(task_ids)
+        if not self.tiers or self.full_sweep:
+            return task_ids
+        now = self.clock()
+        due_ids = []
+        for task_id in task_ids:
+            if task_id not in self._first_seen:
+                self._first_seen[task_id] = now
+            if self._next_check.get(task_id, now) <= now:
+                due_ids.append(task_id)
+        if len(self._first_seen) > len(task_ids):
+            self.__prune(task_ids)
+        return due_ids
+
+    def observe(self, task_id: str, state: str):
+        """Records the state of a task after it has been checked, and schedules its next check"""
+        if not self.tiers:
+            return
+        now = self.clock()
+        age = now - self._first_seen.setdefault(task_id, now)
+        self._next_check[task_id] = now + self.interval(state, age)
+
+    def forget(self, task_id: str):
+        """Stops scheduling a task"""
+        self._first_seen.pop(task_id, None)
+        self._next_check.pop(task_id, None)
+
+    def interval(self, state: str, age: float) -> float:
+        """Seconds until the next check of a task in the given state and of the given age"""
+        interval = 0.0
+        for min_age, tier_interval in self.tiers.get(str(state).lower(), ()):
+            if age < min_age:
+                break
+            interval = tier_interval
+        return interval
+
+    def __prune(self, task_ids: List[str]):
+        tracked = set(task_ids)
+        self._first_seen = {k: v for k, v in self._first_seen.items() if k in tracked}
+        self._next_check = {k: v for k, v in self._next_check.items() if k in tracked}
@@ -0,0 +1,58 @@
+"""Delays the relaunch of tasks that went missing or stopped before running, with exponential backoff and jitter"""
+
+import heapq
+import itertools
+import random
+import time
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+
+class RelaunchScheduler:
+    """
+    The tasks that are waiting to be relaunched, in a heap ordered by the time at which each may be relaunched. A
+    task's n-th failure delays its relaunch by initial_delay * 2 ** (n - 1) seconds, up to max_delay, less a random
+    fraction (up to jitter) of that delay, so that tasks that failed together aren't relaunched together.
+    A task is only waiting once: scheduling it again replaces its previous relaunch, whose heap entry is skipped.
+    """
+
+    def __init__(self, initial_delay: float = 10.0, max_delay: float = 300.0, jitter: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic, rand: Callable[[], float] = random.random):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self.rand = rand
+        # Heap of (relaunch time, seq, task)
+        self._heap: List[Tuple[float, int, Any]] = []
+        # Task key -> seq of the task's live heap entry
+        self._waiting: Dict[Hashable, int] = {}
+        self._seq = itertools.count()
+
+    def delay(self, failures: int) -> float:
+        """Seconds to wait before relaunching a task that has failed the given number of times"""
+        delay = min(self.initial_delay * 2 ** (failures - 1), self.max_delay)
+        return delay * (1 - self.jitter * self.rand())
+
+    def schedule(self, task: Any, failures: int) -> float:
+        """Schedules the relaunch of a task (a namedtuple with a key), and returns the delay in seconds"""
+        delay = self.delay(failures)
+        seq = self._waiting[task.key] = next(self._seq)
+        heapq.heappush(self._heap, (self.clock() + delay, seq, task))
+        return delay
+
+    def pop_due(self) -> List[Any]:
+        """Dequeues the tasks whose backoff has elapsed, in the order that they became due"""
+        now = self.clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, task = heapq.heappop(self._heap)
+            if self._waiting.get(task.key) == seq:
+                del self._waiting[task.key]
+                due.append(task)
+        return due
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._waiting
+
+    def __len__(self):
+        return len(self._waiting)
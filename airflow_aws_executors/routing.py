@@ -0,0 +1,69 @@
+"""Routes Airflow queues to their own launch templates and Boto3 clients, instead of the executor's defaults"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from airflow.utils.module_loading import import_string
+
+from .templating import RequestTemplate
+
+# A route's 'region' member is the region of its client, rather than a launch kwarg
+REGION_KEY = 'region'
+# A route's 'failover_strategy' member is the capacity provider strategy that it fails over to (see failover.py)
+FAILOVER_KEY = 'failover_strategy'
+
+
+class QueueRoute:
+    """
+    Where the tasks of one Airflow queue are launched. The route's kwargs are the executor's default launch kwargs,
+    updated with the route's own members; members that are set to None are removed (ex: 'launchType', when a route sets
+    'capacityProviderStrategy'). The kwargs are compiled into a template once, and the route has its own Boto3 client
+    for its region.
+    """
+
+    def __init__(self, queue: str, kwargs: Dict[str, Any], region: Optional[str], client: Any,
+                 template: RequestTemplate, failover_strategy: Optional[List[Dict[str, Any]]] = None):
+        self.queue = queue
+        self.kwargs = kwargs
+        self.region = region
+        self.client = client
+        self.template = template
+        self.failover_strategy = failover_strategy
+
+    def __repr__(self):
+        return '(queue {} -> {})'.format(self.queue, self.region)
+
+
+def load_queue_routes(routing_table_path: Optional[str], default_kwargs: Dict[str, Any], default_region: Optional[str],
+                      create_client: Callable[[Optional[str]], Any],
+                      compile_template: Callable[[Dict[str, Any]], RequestTemplate],
+                      default_failover_strategy: Optional[List[Dict[str, Any]]] = None) -> Dict[str, QueueRoute]:
+    """
+    Loads the routing table at the given import path: a dictionary of Airflow queue -> route members, such as
+    {'heavy': {'cluster': 'heavy-cluster'}}. Queues that aren't in the table use the executor's defaults.
+    """
+    if not routing_table_path:
+        return {}
+    routing_table = import_string(routing_table_path)
+    if not isinstance(routing_table, dict):
+        raise ValueError('Queue routes must be a dictionary of queue -> kwargs. Got {}'.format(type(routing_table)))
+    routes = {}
+    for queue, members in routing_table.items():
+        members = dict(members)
+        region = members.pop(REGION_KEY, None) or default_region
+        failover_strategy = members.pop(FAILOVER_KEY, default_failover_strategy)
+        kwargs = {key: value for key, value in dict(default_kwargs, **members).items() if value is not None}
+        routes[queue] = QueueRoute(queue, kwargs, region, create_client(region), compile_template(kwargs),
+                                   failover_strategy)
+    return routes
+
+
+def distinct_routes(routes: Dict[str, QueueRoute], target_key: str, default_region: Optional[str],
+                    default_target: Optional[str]) -> List[QueueRoute]:
+    """
+    One route per distinct region and kwargs[target_key] (ex: a cluster or a job queue) other than the executor's
+    default, so that a resource that several queues are routed to is only listed once
+    """
+    distinct: Dict[Tuple[Optional[str], Any], Optional[QueueRoute]] = {(default_region, default_target): None}
+    for route in routes.values():
+        distinct.setdefault((route.region, route.kwargs.get(target_key)), route)
+    return [route for route in distinct.values() if route is not None]
@@ -0,0 +1,91 @@
+"""Tags that identify the Airflow task instance that an ECS task or Batch job was launched for"""
+
+import hashlib
+import json
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .packing import TaskPack
+
+TASK_KEY_TAG_PREFIX = 'airflow.'
+# The tasks of a pack are tagged by their position in the pack (ex: 'airflow.pack.0')
+PACK_TAG_PREFIX = TASK_KEY_TAG_PREFIX + 'pack.'
+# AWS limits tag values to 256 characters
+MAX_TAG_VALUE_LENGTH = 256
+
+TaskKeyTagsType = FrozenSet[Tuple[str, str]]
+
+
+def task_key_tags(key: Any) -> Dict[str, str]:
+    """
+    Serializes an Airflow task key into one tag per member. Members of Airflow 2's TaskInstanceKey are tagged by name
+    (ex: 'airflow.dag_id'); members of plain tuples are tagged by position (ex: 'airflow.key0'). A pack is serialized
+    into one tag per packed task key instead.
+    """
+    if isinstance(key, TaskPack):
+        return {PACK_TAG_PREFIX + str(i): packed_task_key_tag(task_key) for i, task_key in enumerate(key.keys)}
+    fields = getattr(key, '_fields', None) or ['key{}'.format(i) for i in range(len(key))]
+    return {TASK_KEY_TAG_PREFIX + field: str(value)[:MAX_TAG_VALUE_LENGTH] for field, value in zip(fields, key)}
+
+
+def packed_task_key_tag(key: Any) -> str:
+    """The tag value of a packed task key: its members as JSON, or their SHA-256 digest if that's too long for a tag"""
+    value = json.dumps([str(member) for member in key], separators=(',', ':'))
+    if len(value) > MAX_TAG_VALUE_LENGTH:
+        value = hashlib.sha256(value.encode('utf-8')).hexdigest()
+    return value
+
+
+def task_key_identity(key: Any) -> TaskKeyTagsType:
+    """The identity of an Airflow task key, as it's matched against the tags of a launched task or job"""
+    return frozenset(task_key_tags(key).items())
+
+
+def tagged_task_key_identity(tags: Dict[str, str]) -> Optional[TaskKeyTagsType]:
+    """The identity of the Airflow task key that a task or job was tagged with, if any"""
+    identity = frozenset((key, value) for key, value in tags.items()
+                         if key.startswith(TASK_KEY_TAG_PREFIX) and not key.startswith(PACK_TAG_PREFIX))
+    return identity or None
+
+
+def tagged_packed_task_key_tags(tags: Dict[str, str]) -> List[str]:
+    """The tag values of the packed task keys that a pack was tagged with, in order; empty if it isn't a pack"""
+    packed_tags = []
+    while PACK_TAG_PREFIX + str(len(packed_tags)) in tags:
+        packed_tags.append(tags[PACK_TAG_PREFIX + str(len(packed_tags))])
+    return packed_tags
+
+
+class TaggedTaskMatcher:
+    """
+    Matches the tags of launched tasks or jobs with the orphaned task instances that they were launched for. A pack is
+    only matched once every one of its tasks is orphaned, since its exit code is unpacked by position.
+    """
+
+    def __init__(self, tis: List[Any]):
+        self._tis_by_identity = {task_key_identity(ti.key): ti for ti in tis}
+        self._tis_by_packed_tag = {packed_task_key_tag(ti.key): ti for ti in tis}
+
+    def match(self, tags: Dict[str, str]) -> Optional[Tuple[Any, List[Any]]]:
+        """
+        The key that a tagged task or job is tracked under, along with its task instances, which won't be matched
+        again; or None if the tags don't match any orphaned task instances
+        """
+        packed_tags = tagged_packed_task_key_tags(tags)
+        if packed_tags:
+            tis = [self._tis_by_packed_tag.get(packed_tag) for packed_tag in packed_tags]
+            if None in tis:
+                return None
+            key = TaskPack(tuple(ti.key for ti in tis))
+        else:
+            identity = tagged_task_key_identity(tags)
+            ti = self._tis_by_identity.get(identity) if identity else None
+            if ti is None:
+                return None
+            key, tis = ti.key, [ti]
+        for ti in tis:
+            self._tis_by_identity.pop(task_key_identity(ti.key), None)
+            self._tis_by_packed_tag.pop(packed_task_key_tag(ti.key), None)
+        return key, tis
+
+    def __bool__(self):
+        return bool(self._tis_by_identity)
@@ -0,0 +1,65 @@
+"""Copy-on-write templating for the Boto3 kwargs that the AWS Executors send on every launch"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+PathType = Sequence[Union[str, int]]
+
+
+class RequestTemplate:
+    """
+    Renders Boto3 request kwargs for a single Airflow task without deep-copying the whole template.
+    Only the dictionaries and lists along the path to the container override are copied; every other member
+    is shared with the template. The container override merged with an executor config is memoized per distinct
+    executor config, so each launch only copies the override and sets its command.
+    The rendered kwargs are equal to deep-copying the template, merging the executor config into the container
+    override, and setting its command. Shared members must be treated as read-only: replace them on the rendered
+    kwargs rather than mutating them in place.
+    """
+
+    def __init__(self, kwargs: Dict[str, Any], override_path: PathType, max_cache_size: int = 1024):
+        self.kwargs = kwargs
+        self.override_path = tuple(override_path)
+        self.max_cache_size = max_cache_size
+        self._override = self.__get_path(kwargs, self.override_path)
+        self._merged_overrides: Dict[str, Dict[str, Any]] = {}
+
+    def render(self, command: List[str], exec_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Builds the kwargs for one task with the given command and executor config"""
+        override = dict(self.__merged_override(exec_config or {}))
+        override['command'] = command
+        return self.__copy_on_write(self.kwargs, self.override_path, override)
+
+    def __merged_override(self, exec_config: Dict[str, Any]) -> Dict[str, Any]:
+        if not exec_config:
+            return self._override
+        try:
+            cache_key = json.dumps(exec_config)
+        except (TypeError, ValueError):
+            # Not JSON serializable, so it can't be memoized
+            cache_key = None
+        merged = self._merged_overrides.get(cache_key) if cache_key is not None else None
+        if merged is None:
+            merged = dict(self._override)
+            merged.update(exec_config)
+            if cache_key is not None:
+                if len(self._merged_overrides) >= self.max_cache_size:
+                    self._merged_overrides.clear()
+                self._merged_overrides[cache_key] = merged
+        return merged
+
+    @classmethod
+    def __copy_on_write(cls, node: Any, path: PathType, value: Any) -> Any:
+        """Returns a copy of node where the member at path is replaced with value, sharing everything else"""
+        if not path:
+            return value
+        head = path[0]
+        node_copy = list(node) if isinstance(node, list) else dict(node)
+        node_copy[head] = cls.__copy_on_write(node[head], path[1:], value)
+        return node_copy
+
+    @staticmethod
+    def __get_path(node: Any, path: PathType) -> Any:
+        for head in path:
+            node = node[head]
+        return node
@@ -0,0 +1,214 @@
+"""Client-side rate limiting, and retries of throttled calls, for the AWS APIs that the executors call"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+# Error codes that AWS APIs return when a caller exceeds the request rate of their account
+THROTTLING_ERROR_CODES = frozenset((
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'RequestLimitExceeded', 'RequestThrottled',
+))
+
+
+def error_code(err: Exception) -> str:
+    """The error code of a Boto3 error (ex: 'ThrottlingException'), or the type of any other error"""
+    response = getattr(err, 'response', None) or {}
+    return response.get('Error', {}).get('Code') or type(err).__name__
+
+
+def is_throttling_error(err: Exception) -> bool:
+    """Whether a Boto3 error means that the call was throttled"""
+    if not isinstance(err, ClientError):
+        return False
+    response = getattr(err, 'response', None) or {}
+    return (response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES or
+            response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 429)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills at `rate` tokens per second, up to `burst` tokens.
+    Callers reserve a token and then wait for it, so concurrent callers are spaced out rather than all retrying at once.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, and returns the number of seconds to wait before using it"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class OperationLimit:
+    """The limiter's state for one API operation"""
+
+    def __init__(self, budget: Optional[float]):
+        # The configured calls per second, or None if the operation is only limited after it has been throttled
+        self.budget = budget
+        self.bucket: Optional[TokenBucket] = None
+        # The rate that the limit recovers to after throttling
+        self.ceiling: Optional[float] = budget
+        self.calls = 0
+        self.throttled = 0
+        self.recent_calls: Deque[float] = deque()
+
+
+class AdaptiveRateLimiter:
+    """
+    Limits the calls to each operation of an AWS API with a token bucket, shared by every thread and Boto3 client of
+    an executor. Operations are limited to their configured budget, in calls per second; operations without a budget
+    are unlimited until they're throttled.
+    When a call is throttled, the limit of its operation is cut (to a fraction of the rate observed when it was
+    throttled, if it had no budget) and the call is retried after a jittered exponential backoff. Every successful
+    call then raises the limit back towards its budget. Once an operation without a budget has recovered to the rate
+    at which it was throttled, it's unlimited again.
+    If on_call is set, it's called after every attempt with the operation name, the call's latency in seconds, and
+    the error code of the call if it raised (ex: for metrics).
+    """
+    MIN_RATE = 0.5
+    # How much a throttled operation's limit is multiplied by
+    DECREASE_FACTOR = 0.5
+    # The fraction of the ceiling that each successful call adds back to a throttled operation's limit
+    RECOVERY_FRACTION = 0.01
+
+    def __init__(self, limits: Optional[Dict[str, float]] = None, max_retries: int = 3, base_delay: float = 0.1,
+                 max_delay: float = 5.0, window: float = 60.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Any] = time.sleep, jitter: Callable[[], float] = random.random):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.on_call: Optional[Callable[[str, float, Optional[str]], Any]] = None
+        self._limits: Dict[str, OperationLimit] = {}
+        self._lock = threading.Lock()
+        for operation_name, budget in (limits or {}).items():
+            limit = self.__get_limit(operation_name)
+            limit.budget = limit.ceiling = float(budget)
+            limit.bucket = TokenBucket(limit.budget, clock=clock)
+
+    @classmethod
+    def from_config(cls, config_value: Optional[str], max_retries: int = 3) -> 'AdaptiveRateLimiter':
+        """
+        Creates a limiter from a JSON config value of operation name to calls per second.
+        For example: '{"describe_tasks": 20, "run_task": 10}'. An empty value only retries throttled calls.
+        """
+        limits = json.loads(config_value) if config_value else {}
+        if not isinstance(limits, dict):
+            raise ValueError('API rate limits must be a JSON object of operation name to calls per second. '
+                             'Got {}'.format(config_value))
+        return cls(limits, max_retries=max_retries)
+
+    def call(self, operation_name: str, func: Callable, *args, **kwargs) -> Any:
+        """Calls func within the limits of the given operation, retrying it if it's throttled"""
+        limit = self.__get_limit(operation_name)
+        attempt = 0
+        while True:
+            bucket = limit.bucket
+            if bucket is not None:
+                wait = bucket.reserve()
+                if wait > 0:
+                    self.sleep(wait)
+            self.__record_call(limit)
+            started_at = self.clock()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:
+                self.__observe_call(operation_name, started_at, err)
+                if not is_throttling_error(err):
+                    raise
+                self.__throttled(limit)
+                if attempt >= self.max_retries:
+                    raise
+                self.sleep(self.jitter() * min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                continue
+            self.__observe_call(operation_name, started_at)
+            if limit.bucket is not None:
+                self.__recover(limit)
+            return result
+
+    def limit(self, operation_name: str) -> Optional[float]:
+        """The calls per second that an operation is currently limited to, or None if it's unlimited"""
+        bucket = self.__get_limit(operation_name).bucket
+        return bucket.rate if bucket is not None else None
+
+    def observed_rate(self, operation_name: str) -> float:
+        """The calls per second made to an operation, averaged over the last window seconds"""
+        limit = self.__get_limit(operation_name)
+        with self._lock:
+            self.__trim(limit, self.clock())
+            return len(limit.recent_calls) / self.window
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """The observed rate, current limit, budget, and call counts of every operation that has been called"""
+        return {
+            operation_name: {
+                'observed_rate': self.observed_rate(operation_name),
+                'limit': self.limit(operation_name),
+                'budget': limit.budget,
+                'calls': limit.calls,
+                'throttled': limit.throttled,
+            }
+            for operation_name, limit in list(self._limits.items())
+        }
+
+    def __get_limit(self, operation_name: str) -> OperationLimit:
+        limit = self._limits.get(operation_name)
+        if limit is None:
+            with self._lock:
+                limit = self._limits.setdefault(operation_name, OperationLimit(None))
+        return limit
+
+    def __observe_call(self, operation_name: str, started_at: float, err: Optional[Exception] = None):
+        if self.on_call is not None:
+            self.on_call(operation_name, self.clock() - started_at, error_code(err) if err is not None else None)
+
+    def __record_call(self, limit: OperationLimit):
+        with self._lock:
+            now = self.clock()
+            limit.calls += 1
+            limit.recent_calls.append(now)
+            self.__trim(limit, now)
+
+    def __trim(self, limit: OperationLimit, now: float):
+        while limit.recent_calls and limit.recent_calls[0] <= now - self.window:
+            limit.recent_calls.popleft()
+
+    def __throttled(self, limit: OperationLimit):
+        with self._lock:
+            limit.throttled += 1
+            if limit.bucket is None:
+                # Learn a limit from the rate that was throttled
+                self.__trim(limit, self.clock())
+                observed = len(limit.recent_calls) / self.window
+                limit.ceiling = max(observed, self.MIN_RATE)
+                limit.bucket = TokenBucket(limit.ceiling, clock=self.clock)
+            limit.bucket.rate = max(limit.bucket.rate * self.DECREASE_FACTOR, self.MIN_RATE)
+
+    def __recover(self, limit: OperationLimit):
+        with self._lock:
+            bucket = limit.bucket
+            if bucket is None or bucket.rate >= limit.ceiling:
+                return
+            bucket.rate = min(bucket.rate + limit.ceiling * self.RECOVERY_FRACTION, limit.ceiling)
+            if bucket.rate >= limit.ceiling and limit.budget is None:
+                limit.bucket = None
@@ -0,0 +1,232 @@
+"""
+A per-task timeline of the AWS Executors' lifecycle events, for latency forensics.
+Timelines that were written to JSONL files are broken down by running this module:
+
+    python -m airflow_aws_executors.timeline task_timeline.jsonl*
+"""
+
+import argparse
+import datetime as dt
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .packing import GROUP_KEYS
+
+TimelineEventType = Dict[str, Any]
+
+QUEUED = 'queued'
+LAUNCH_FAILED = 'launch_failed'
+LAUNCHED = 'launched'
+RUNNING = 'running'
+STOPPED = 'stopped'
+FINISHED = 'finished'
+
+# The segments that a task's time is broken down into, in the order that they happen
+SEGMENTS = ('pending', 'launch_retries', 'provisioning', 'runtime', 'detection', 'reporting')
+
+
+class JsonlTimelineSink:
+    """
+    Appends timeline events to a file, one JSON object per line. The file is rotated once it reaches max_bytes, and
+    backup_count rotated files are kept (ex: task_timeline.jsonl.1).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 2 ** 20, backup_count: int = 5):
+        self.path = path
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self._handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def __call__(self, event: TimelineEventType):
+        self._handler.handle(logging.makeLogRecord({'msg': json.dumps(event, default=str), 'levelno': logging.INFO}))
+
+    def close(self):
+        """Closes the file"""
+        self._handler.close()
+
+
+class TaskTimeline:
+    """
+    Records the lifecycle of every task that an executor handles, as events sent to a sink: a callable that takes
+    one event at a time. Every event has the wall-clock time, the executor, the event name, and the Airflow task key.
+    Events:
+    queued - the task was queued by execute_async(), or re-queued after its task or job was lost.
+    launch_failed - a launch attempt failed, with its reason.
+    launched - the task was launched, with its ECS task ARN or Batch job ID.
+    running - the task was first seen running.
+    stopped - the task was seen stopped, with AWS' stop time and reason when they are known.
+    finished - the final state that was reported to Airflow.
+    The events of a pack are recorded for each of its tasks.
+    """
+
+    def __init__(self, sink: Callable[[TimelineEventType], Any], executor: str,
+                 clock: Callable[[], float] = time.time):
+        self.sink = sink
+        self.executor = executor
+        self.clock = clock
+        # Tasks that have been seen running since their last launch, so that only the first observation is recorded
+        self._running: Set[Any] = set()
+
+    @classmethod
+    def from_config(cls, executor: str, path: Optional[str], sink: Optional[Callable[[TimelineEventType], Any]],
+                    max_bytes: int = 64 * 2 ** 20) -> Optional['TaskTimeline']:
+        """Creates a timeline that's written to a rotating JSONL file, or to a custom sink. None if neither is set"""
+        if sink is None and path:
+            sink = JsonlTimelineSink(path, max_bytes=max_bytes)
+        return cls(sink, executor) if sink is not None else None
+
+    def record(self, key: Any, event: str, **details):
+        """Records an event of a task, with any details (ex: arn='...', reason='...')"""
+        if isinstance(key, GROUP_KEYS):
+            for task_key in key.keys:
+                self.record(task_key, event, **details)
+            return
+        if event == RUNNING:
+            if key in self._running:
+                return
+            self._running.add(key)
+        else:
+            self._running.discard(key)
+        timeline_event = {'time': self.clock(), 'executor': self.executor, 'event': event, 'key': list(key)}
+        timeline_event.update(details)
+        self.sink(timeline_event)
+
+    def close(self):
+        """Closes the sink, if it can be closed"""
+        close = getattr(self.sink, 'close', None)
+        if close:
+            close()
+
+
+def epoch_seconds(timestamp: Any) -> Optional[float]:
+    """Seconds since the epoch of an AWS timestamp: a datetime (ECS), or milliseconds since the epoch (Batch)"""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, dt.datetime):
+        return timestamp.timestamp()
+    return timestamp / 1000.0
+
+
+def load_timelines(lines: Iterable[str]) -> Dict[Tuple[str, Tuple[Any, ...]], List[TimelineEventType]]:
+    """Groups the events of JSONL timeline files by executor and task key, in the order that they happened"""
+    timelines = defaultdict(list)
+    for line in lines:
+        line = line.strip()
+        if line:
+            event = json.loads(line)
+            timelines[(event['executor'], tuple(event['key']))].append(event)
+    for events in timelines.values():
+        events.sort(key=lambda event: event['time'])
+    return timelines
+
+
+def breakdown(events: List[TimelineEventType]) -> Dict[str, float]:
+    """
+    Breaks a finished task's timeline down into seconds spent in each segment:
+    pending - from being queued to the first launch attempt, in the executor's pending queue.
+    launch_retries - from the first launch attempt to the last launch (ex: RunTask capacity failures or lost tasks).
+    provisioning - from the last launch to the first time that the task was seen running.
+    runtime - from then until the task stopped, per AWS (or until it was seen stopped, if AWS' stop time is unknown).
+    detection - from the task stopping, per AWS, to the executor seeing it stopped.
+    reporting - from the executor seeing the task stopped to reporting its final state to Airflow.
+    Segments without both of their events are left out. 'total' is from the first queued event to the finished one.
+    """
+    first = {}
+    last = {}
+    for event in events:
+        first.setdefault(event['event'], event)
+        last[event['event']] = event
+    attempts = [event['time'] for event in events if event['event'] in (LAUNCHED, LAUNCH_FAILED)]
+    times = {
+        'queued': first[QUEUED]['time'] if QUEUED in first else None,
+        'first_attempt': attempts[0] if attempts else None,
+        'launched': last[LAUNCHED]['time'] if LAUNCHED in last else None,
+        'running': last[RUNNING]['time'] if RUNNING in last else None,
+        'stopped_at': last[STOPPED].get('stopped_at') if STOPPED in last else None,
+        'stopped': last[STOPPED]['time'] if STOPPED in last else None,
+        'finished': last[FINISHED]['time'] if FINISHED in last else None,
+    }
+    segment_bounds = {
+        'pending': ('queued', 'first_attempt'),
+        'launch_retries': ('first_attempt', 'launched'),
+        'provisioning': ('launched', 'running'),
+        'runtime': ('running', 'stopped_at' if times['stopped_at'] is not None else 'stopped'),
+        'detection': ('stopped_at', 'stopped'),
+        'reporting': ('stopped', 'finished'),
+        'total': ('queued', 'finished'),
+    }
+    return {
+        segment: max(times[end] - times[start], 0.0)
+        for segment, (start, end) in segment_bounds.items()
+        if times[start] is not None and times[end] is not None
+    }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """The nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def report(timelines: Dict[Tuple[str, Tuple[Any, ...]], List[TimelineEventType]], slowest: int = 10) -> str:
+    """A report of the percentiles of every segment, the segment that dominated each task, and the slowest tasks"""
+    breakdowns = {task: breakdown(events) for task, events in timelines.items()}
+    finished = {task: segments for task, segments in breakdowns.items() if 'total' in segments}
+    lines = ['{} tasks, {} finished'.format(len(timelines), len(finished))]
+    if not finished:
+        return '\n'.join(lines)
+
+    total_seconds = sum(segments['total'] for segments in finished.values()) or 1.0
+    lines.append('{:<16} {:>8} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+        'segment', 'tasks', 'p50 (s)', 'p90 (s)', 'p99 (s)', 'max (s)', 'share'))
+    for segment in SEGMENTS + ('total',):
+        values = [segments[segment] for segments in finished.values() if segment in segments]
+        if not values:
+            continue
+        lines.append('{:<16} {:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>7.1f}%'.format(
+            segment, len(values), percentile(values, 0.5), percentile(values, 0.9), percentile(values, 0.99),
+            max(values), 100.0 * sum(values) / total_seconds))
+
+    critical_segments = Counter(
+        max(SEGMENTS, key=lambda segment, segments=segments: segments.get(segment, -1.0))
+        for segments in finished.values()
+    )
+    lines.append('')
+    lines.append('Segment that took the longest, by number of tasks: {}'.format(
+        ', '.join('{} {}'.format(segment, count) for segment, count in critical_segments.most_common())))
+
+    launch_failures = Counter(
+        event.get('reason') for events in timelines.values() for event in events if event['event'] == LAUNCH_FAILED
+    )
+    if launch_failures:
+        lines.append('Launch failures by reason: {}'.format(
+            ', '.join('{} {}'.format(reason, count) for reason, count in launch_failures.most_common())))
+
+    if slowest:
+        lines.append('')
+        lines.append('Slowest tasks:')
+        for (executor, key), segments in sorted(finished.items(), key=lambda item: -item[1]['total'])[:slowest]:
+            lines.append('  {} {} total={:.2f}s {}'.format(executor, list(key), segments['total'], ' '.join(
+                '{}={:.2f}s'.format(segment, segments[segment]) for segment in SEGMENTS if segment in segments
+            )))
+    return '\n'.join(lines)
+
+
+def main(args: Optional[List[str]] = None):
+    """Prints the critical-path breakdown of the task timelines in the given JSONL files"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('files', nargs='+', help='JSONL timeline files, including rotated ones')
+    parser.add_argument('--slowest', type=int, default=10, help='Number of slowest tasks to list')
+    parsed = parser.parse_args(args)
+    lines = []
+    for file_name in parsed.files:
+        with open(file_name, encoding='utf-8') as timeline_file:
+            lines.extend(timeline_file)
+    print(report(load_timelines(lines), slowest=parsed.slowest))
+
+
+if __name__ == '__main__':
+    main()
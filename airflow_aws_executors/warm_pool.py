@@ -0,0 +1,108 @@
+"""A pool of warm ECS workers that pull Airflow commands from a work queue, instead of launching a task per command"""
+
+import uuid
+from typing import Any, Dict, List, Set, Tuple
+
+from .work_queue import WorkQueue
+
+# How many stopped workers are remembered, for reports of started commands that arrive after their worker stopped
+MAX_STOPPED_WORKERS = 1000
+
+
+class WarmWorkerPool:
+    """
+    Tracks the Airflow tasks that the ECS Executor has handed to its warm workers, and the workers themselves.
+    Commands are buffered by submit() and sent to the work queue by flush(), once per heartbeat. The pool wants one
+    worker per outstanding command, between min_workers and max_workers; workers stop themselves once they've been
+    idle for a while, so the pool shrinks as the backlog drains.
+    A command that a worker has started is lost with that worker. Once a worker is seen stopped, the commands that it
+    had started, and hasn't reported the exit codes of by the next collect(), are returned by pop_lost().
+    """
+
+    def __init__(self, work_queue: WorkQueue, max_workers: int, min_workers: int = 0):
+        self.work_queue = work_queue
+        self.max_workers = max_workers
+        self.min_workers = min(min_workers, max_workers)
+        # ARNs of the workers that have been launched and haven't been seen stopped
+        self.workers: Set[str] = set()
+        # Item ID -> Airflow task key, for every command that hasn't finished
+        self._keys: Dict[str, Any] = {}
+        # (item ID, command) pairs that haven't been sent to the work queue yet
+        self._unsent: List[Tuple[str, List[str]]] = []
+        # Item ID -> ID of the worker that started it
+        self._item_workers: Dict[str, str] = {}
+        # Items whose worker was seen stopped before they finished
+        self._orphaned: Set[str] = set()
+        # IDs of the most recently stopped workers, in the order that they stopped
+        self._stopped_workers: Dict[str, None] = {}
+
+    def submit(self, key: Any, command: List[str]) -> str:
+        """Buffers a command for the workers, and returns its item ID"""
+        item_id = uuid.uuid4().hex
+        self._keys[item_id] = key
+        self._unsent.append((item_id, command))
+        return item_id
+
+    def flush(self) -> List[Any]:
+        """Sends the buffered commands to the work queue, and returns the keys of the ones that were sent"""
+        if not self._unsent:
+            return []
+        failed_ids = set(self.work_queue.put_many(self._unsent))
+        sent_keys = [self._keys[item_id] for item_id, _ in self._unsent if item_id not in failed_ids]
+        self._unsent = [item for item in self._unsent if item[0] in failed_ids]
+        return sent_keys
+
+    def collect(self) -> List[Tuple[Any, str, Any]]:
+        """
+        Collects the workers' results as (Airflow task key, worker ID, exit code) for every command that started
+        (exit code is None) or finished. Finished commands are no longer tracked.
+        """
+        updates = []
+        for item_id, worker_id, exit_code in self.work_queue.results():
+            key = self._keys.get(item_id)
+            if key is None:
+                # A late report that a finished item had started, or an item that was already lost
+                continue
+            if exit_code is None:
+                self._item_workers[item_id] = worker_id
+                if worker_id in self._stopped_workers:
+                    self._orphaned.add(item_id)
+            else:
+                self.__forget(item_id)
+            updates.append((key, worker_id, exit_code))
+        return updates
+
+    def worker_launched(self, worker_id: str):
+        """Tracks a launched worker"""
+        self.workers.add(worker_id)
+
+    def worker_stopped(self, worker_id: str):
+        """Stops tracking a worker, and orphans the commands that it had started"""
+        self.workers.discard(worker_id)
+        self._stopped_workers[worker_id] = None
+        if len(self._stopped_workers) > MAX_STOPPED_WORKERS:
+            del self._stopped_workers[next(iter(self._stopped_workers))]
+        self._orphaned.update(item_id for item_id, item_worker_id in self._item_workers.items()
+                              if item_worker_id == worker_id)
+
+    def pop_lost(self) -> List[Tuple[Any, str]]:
+        """Stops tracking the orphaned commands, and returns them as (Airflow task key, worker ID)"""
+        lost = [(self._keys[item_id], self._item_workers[item_id]) for item_id in self._orphaned]
+        for item_id in list(self._orphaned):
+            self.__forget(item_id)
+        return lost
+
+    def workers_wanted(self, keep_warm: bool = True) -> int:
+        """The number of workers to launch for the outstanding commands, and for min_workers if keep_warm is True"""
+        desired = min(self.max_workers, max(self.min_workers if keep_warm else 0, self.outstanding))
+        return max(desired - len(self.workers), 0)
+
+    @property
+    def outstanding(self) -> int:
+        """The number of commands that haven't finished"""
+        return len(self._keys)
+
+    def __forget(self, item_id: str):
+        del self._keys[item_id]
+        self._item_workers.pop(item_id, None)
+        self._orphaned.discard(item_id)
@@ -0,0 +1,173 @@
+"""Work queues that carry Airflow commands to the warm workers of the ECS Executor, and their outcomes back"""
+
+import json
+import queue
+from abc import ABC, abstractmethod
+from collections import deque, namedtuple
+from typing import Any, List, Optional, Tuple
+
+import boto3
+from airflow.configuration import conf
+
+# The work queue that the executor and its warm workers use, unless [ecs_fargate] work_queue is set
+DEFAULT_WORK_QUEUE = 'airflow_aws_executors.work_queue.sqs_work_queue'
+
+# An Airflow command for a worker to run. The receipt is whatever the queue needs to acknowledge the item, if anything.
+WorkItem = namedtuple('WorkItem', ('item_id', 'command', 'receipt'))
+# An update from a worker: it started an item (exit_code is None), or it finished it with the command's exit code
+WorkResult = namedtuple('WorkResult', ('item_id', 'worker_id', 'exit_code'))
+
+
+class WorkQueue(ABC):
+    """
+    The interface between the ECS Executor and its warm workers. The executor puts Airflow commands into the queue and
+    collects results. Each worker gets one item at a time, reports that it has started it, runs it, and reports its
+    exit code. An item that a worker has started is never delivered again; if that worker is lost, then the executor
+    fails the item.
+    Results may arrive out of order (ex: an item's exit code before the report that it started).
+    """
+
+    @abstractmethod
+    def put(self, item_id: str, command: List[str]):
+        """Queues a command for the workers (executor)"""
+
+    def put_many(self, items: List[Tuple[str, List[str]]]) -> List[str]:
+        """Queues (item ID, command) pairs, and returns the IDs of the items that couldn't be queued (executor)"""
+        for item_id, command in items:
+            self.put(item_id, command)
+        return []
+
+    @abstractmethod
+    def get(self, wait_seconds: float) -> Optional[WorkItem]:
+        """The next item, waiting up to wait_seconds for one to arrive. None if nothing arrived (worker)"""
+
+    @abstractmethod
+    def started(self, item: WorkItem, worker_id: str):
+        """Reports that a worker has started an item, so that it isn't delivered again (worker)"""
+
+    @abstractmethod
+    def finished(self, item: WorkItem, worker_id: str, exit_code: int):
+        """Reports the exit code of an item's command (worker)"""
+
+    @abstractmethod
+    def results(self) -> List[WorkResult]:
+        """Every result that has been reported since the last call (executor)"""
+
+
+class LocalWorkQueue(WorkQueue):
+    """
+    An in-process work queue. It stands in for a real queue in tests, and works for workers that are threads of the
+    scheduler's process.
+    """
+
+    def __init__(self):
+        self._items = queue.Queue()
+        self._results = deque()
+
+    def put(self, item_id: str, command: List[str]):
+        self._items.put(WorkItem(item_id, list(command), None))
+
+    def get(self, wait_seconds: float) -> Optional[WorkItem]:
+        try:
+            if wait_seconds > 0:
+                return self._items.get(timeout=wait_seconds)
+            return self._items.get_nowait()
+        except queue.Empty:
+            return None
+
+    def started(self, item: WorkItem, worker_id: str):
+        self._results.append(WorkResult(item.item_id, worker_id, None))
+
+    def finished(self, item: WorkItem, worker_id: str, exit_code: int):
+        self._results.append(WorkResult(item.item_id, worker_id, exit_code))
+
+    def results(self) -> List[WorkResult]:
+        results = []
+        while self._results:
+            results.append(self._results.popleft())
+        return results
+
+    def __len__(self):
+        return self._items.qsize()
+
+
+class SqsWorkQueue(WorkQueue):
+    """
+    A work queue on two SQS queues: one that carries commands to the workers, and one that carries their results back
+    to the executor. A worker deletes a command's message once it has started it. Until then, a message that a worker
+    received but didn't start (ex: the worker was stopped) is delivered again after the queue's visibility timeout.
+    Commands are sent, and results are received and deleted, 10 messages per call.
+    """
+
+    # SendMessageBatch, ReceiveMessage and DeleteMessageBatch handle at most 10 messages per call
+    MAX_BATCH_SIZE = 10
+    # The longest that ReceiveMessage can wait for a message to arrive
+    MAX_WAIT_SECONDS = 20
+
+    def __init__(self, queue_url: str, results_queue_url: str, sqs_client: Any = None, region: Optional[str] = None):
+        self.queue_url = queue_url
+        self.results_queue_url = results_queue_url
+        self.sqs = sqs_client or boto3.client('sqs', region_name=region)  # noqa
+
+    def put(self, item_id: str, command: List[str]):
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=self.__item_body(item_id, command))
+
+    def put_many(self, items: List[Tuple[str, List[str]]]) -> List[str]:
+        failed_ids = []
+        for i in range(0, len(items), self.MAX_BATCH_SIZE):
+            batch = items[i: i + self.MAX_BATCH_SIZE]
+            response = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=[
+                {'Id': str(j), 'MessageBody': self.__item_body(item_id, command)}
+                for j, (item_id, command) in enumerate(batch)
+            ])
+            failed_ids.extend(batch[int(failure['Id'])][0] for failure in response.get('Failed', []))
+        return failed_ids
+
+    def get(self, wait_seconds: float) -> Optional[WorkItem]:
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=1,
+            WaitTimeSeconds=int(min(max(wait_seconds, 0), self.MAX_WAIT_SECONDS))
+        )
+        messages = response.get('Messages')
+        if not messages:
+            return None
+        body = json.loads(messages[0]['Body'])
+        return WorkItem(body['item_id'], body['command'], messages[0]['ReceiptHandle'])
+
+    def started(self, item: WorkItem, worker_id: str):
+        self.__send_result(WorkResult(item.item_id, worker_id, None))
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=item.receipt)
+
+    def finished(self, item: WorkItem, worker_id: str, exit_code: int):
+        self.__send_result(WorkResult(item.item_id, worker_id, exit_code))
+
+    def results(self) -> List[WorkResult]:
+        results = []
+        while True:
+            response = self.sqs.receive_message(QueueUrl=self.results_queue_url,
+                                                MaxNumberOfMessages=self.MAX_BATCH_SIZE, WaitTimeSeconds=0)
+            messages = response.get('Messages')
+            if not messages:
+                return results
+            for message in messages:
+                body = json.loads(message['Body'])
+                results.append(WorkResult(body['item_id'], body['worker_id'], body['exit_code']))
+            self.sqs.delete_message_batch(QueueUrl=self.results_queue_url, Entries=[
+                {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']} for i, message in enumerate(messages)
+            ])
+
+    def __send_result(self, result: WorkResult):
+        self.sqs.send_message(QueueUrl=self.results_queue_url, MessageBody=json.dumps(result._asdict()))
+
+    @staticmethod
+    def __item_body(item_id: str, command: List[str]) -> str:
+        return json.dumps({'item_id': item_id, 'command': list(command)})
+
+
+def sqs_work_queue() -> SqsWorkQueue:
+    """The SQS work queue that's configured by [ecs_fargate] work_queue_url and work_results_queue_url"""
+    return SqsWorkQueue(
+        conf.get('ecs_fargate', 'work_queue_url'),
+        conf.get('ecs_fargate', 'work_results_queue_url'),
+        region=conf.get('ecs_fargate', 'region')
+    )
@@ -0,0 +1,81 @@
+"""
+The warm worker of the ECS Executor: a long-lived ECS task that runs Airflow commands from a work queue, one at a time,
+until it has been idle for a while. The executor launches its warm workers with:
+
+    python -m airflow_aws_executors.worker
+"""
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import time
+import urllib.request
+from typing import Callable, List
+
+from airflow.configuration import conf
+from airflow.utils.module_loading import import_string
+
+from .work_queue import DEFAULT_WORK_QUEUE, WorkQueue
+
+log = logging.getLogger(__name__)
+
+# The exit code of a command that couldn't be started (ex: its executable wasn't found)
+COMMAND_NOT_RUN_EXIT_CODE = 127
+
+
+def ecs_worker_id() -> str:
+    """The ARN of the ECS task that this worker runs in, per the ECS task metadata endpoint; or else the host name"""
+    metadata_uri = os.environ.get('ECS_CONTAINER_METADATA_URI_V4')
+    if metadata_uri:
+        try:
+            with urllib.request.urlopen(metadata_uri + '/task', timeout=5) as response:
+                return json.load(response)['TaskARN']
+        except (OSError, ValueError, KeyError) as err:
+            log.warning('Could not read the task ARN from the ECS task metadata endpoint: %s', err)
+    return socket.gethostname()
+
+
+def run_worker(work_queue: WorkQueue, worker_id: str, idle_timeout: float = 300.0, poll_seconds: float = 20.0,
+               run: Callable[[List[str]], int] = subprocess.call, clock: Callable[[], float] = time.monotonic) -> int:
+    """
+    Runs commands from the work queue until none has arrived for idle_timeout seconds, and returns the number of
+    commands that were run. Every command's start and exit code is reported back through the work queue.
+    """
+    commands_run = 0
+    idle_since = clock()
+    while True:
+        idle_seconds = clock() - idle_since
+        item = work_queue.get(min(poll_seconds, max(idle_timeout - idle_seconds, 0)))
+        if item is None:
+            if clock() - idle_since >= idle_timeout:
+                return commands_run
+            continue
+        work_queue.started(item, worker_id)
+        log.info('Running %s', item.command)
+        try:
+            exit_code = run(item.command)
+        except OSError as err:
+            log.error('Could not run %s: %s', item.command, err)
+            exit_code = COMMAND_NOT_RUN_EXIT_CODE
+        work_queue.finished(item, worker_id, exit_code)
+        commands_run += 1
+        idle_since = clock()
+
+
+def main():
+    """Runs a warm worker on the work queue that's configured in the [ecs_fargate] section"""
+    logging.basicConfig(level=logging.INFO)
+    work_queue = import_string(conf.get('ecs_fargate', 'work_queue', fallback=DEFAULT_WORK_QUEUE))()
+    worker_id = ecs_worker_id()
+    log.info('Warm worker %s is pulling commands', worker_id)
+    commands_run = run_worker(
+        work_queue, worker_id,
+        idle_timeout=conf.getfloat('ecs_fargate', 'warm_worker_idle_timeout', fallback=300.0)
+    )
+    log.info('Warm worker %s ran %s commands and is stopping after being idle', worker_id, commands_run)
+
+
+if __name__ == '__main__':
+    main()
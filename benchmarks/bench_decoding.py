@@ -0,0 +1,113 @@
+"""
+Micro-benchmark comparing the low-overhead response decoders with the marshmallow schemas that they replace.
+Each iteration decodes one DescribeTasks/DescribeJobs page of realistic Botocore responses.
+
+    python benchmarks/bench_decoding.py --tasks 100 --number 200
+"""
+import argparse
+import datetime as dt
+import os
+import sys
+import timeit
+
+for _name, _value in {
+    'AIRFLOW__BATCH__REGION': 'us-west-1',
+    'AIRFLOW__ECS_FARGATE__REGION': 'us-west-1',
+}.items():
+    os.environ.setdefault(_name, _value)
+
+# Import the package from this checkout, even if it isn't installed
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from airflow_aws_executors.batch_executor import (  # noqa: E402
+    BatchDescribeJobsResponseSchema, load_describe_jobs_response
+)
+from airflow_aws_executors.ecs_fargate_executor import (  # noqa: E402
+    BotoDescribeTasksSchema, load_tasks_response
+)
+
+
+def ecs_describe_tasks_response(num_tasks: int) -> dict:
+    """A DescribeTasks response with most of the members that ECS returns for a Fargate task"""
+    now = dt.datetime.now()
+    return {
+        'tasks': [{
+            'taskArn': 'arn:aws:ecs:us-west-1:000000000000:task/some-cluster/{:032x}'.format(i),
+            'clusterArn': 'arn:aws:ecs:us-west-1:000000000000:cluster/some-cluster',
+            'taskDefinitionArn': 'arn:aws:ecs:us-west-1:000000000000:task-definition/some-task-def:1',
+            'lastStatus': 'RUNNING',
+            'desiredStatus': 'RUNNING',
+            'launchType': 'FARGATE',
+            'cpu': '256',
+            'memory': '512',
+            'createdAt': now,
+            'startedAt': now,
+            'attachments': [{'id': str(i), 'type': 'ElasticNetworkInterface', 'status': 'ATTACHED', 'details': [
+                {'name': 'subnetId', 'value': 'subnet-XXXXXXXX'},
+                {'name': 'privateIPv4Address', 'value': '10.0.0.1'},
+            ]}],
+            'overrides': {'containerOverrides': [{'name': 'some-container-name', 'command': ['airflow', 'run']}]},
+            'containers': [{
+                'containerArn': 'arn:aws:ecs:us-west-1:000000000000:container/{:032x}'.format(i),
+                'name': 'some-container-name',
+                'image': 'some-image:latest',
+                'lastStatus': 'RUNNING',
+                'networkInterfaces': [{'attachmentId': str(i), 'privateIpv4Address': '10.0.0.1'}],
+            }],
+            'tags': [{'key': 'airflow', 'value': 'true'}],
+        } for i in range(num_tasks)],
+        'failures': []
+    }
+
+
+def batch_describe_jobs_response(num_jobs: int) -> dict:
+    """A DescribeJobs response with most of the members that Batch returns for a container job"""
+    return {
+        'jobs': [{
+            'jobId': '{:032x}'.format(i),
+            'jobName': 'some-job-name',
+            'jobQueue': 'arn:aws:batch:us-west-1:000000000000:job-queue/some-job-queue',
+            'jobDefinition': 'arn:aws:batch:us-west-1:000000000000:job-definition/some-job-def:1',
+            'status': 'RUNNING',
+            'createdAt': 1600000000000,
+            'startedAt': 1600000000000,
+            'dependsOn': [],
+            'parameters': {},
+            'container': {
+                'image': 'some-image:latest',
+                'vcpus': 1,
+                'memory': 512,
+                'command': ['airflow', 'run'],
+                'environment': [{'name': 'ENV_{}'.format(j), 'value': str(j)} for j in range(10)],
+            },
+        } for i in range(num_jobs)]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=100, help='Number of tasks/jobs per response page')
+    parser.add_argument('--number', type=int, default=200, help='Number of pages to decode per measurement')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    ecs_response = ecs_describe_tasks_response(args.tasks)
+    batch_response = batch_describe_jobs_response(args.tasks)
+    cases = [
+        ('ECS DescribeTasks', lambda: BotoDescribeTasksSchema().load(ecs_response),
+         lambda: load_tasks_response(ecs_response)),
+        ('Batch DescribeJobs', lambda: BatchDescribeJobsResponseSchema().load(batch_response),
+         lambda: load_describe_jobs_response(batch_response)),
+    ]
+
+    print('{:<20} {:>18} {:>18} {:>8}'.format('operation', 'marshmallow (us)', 'decoder (us)', 'speedup'))
+    for name, marshmallow_load, fast_load in cases:
+        slow = min(timeit.repeat(marshmallow_load, number=args.number, repeat=args.repeat)) / args.number
+        fast = min(timeit.repeat(fast_load, number=args.number, repeat=args.repeat)) / args.number
+        print('{:<20} {:>18.1f} {:>18.1f} {:>7.1f}x'.format(name, slow * 1e6, fast * 1e6, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures the memory that EcsFargateTaskCollection holds for the tasks that the ECS executor is tracking.
+Every task is decoded from a realistic DescribeTasks response and tracked with an Airflow command and executor
+config, just like the executor does. Memory is traced with tracemalloc, so only the collection is counted.
+
+    python benchmarks/bench_ecs_collection_memory.py --tasks 10000,50000,100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+for _name, _value in {
+    'AIRFLOW__ECS_FARGATE__REGION': 'us-west-1',
+}.items():
+    os.environ.setdefault(_name, _value)
+
+# Import the package from this checkout, even if it isn't installed
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from airflow_aws_executors.ecs_fargate_executor import EcsFargateTaskCollection, load_tasks_response  # noqa: E402
+
+
+def describe_tasks_page(start: int, num_tasks: int) -> dict:
+    """A DescribeTasks response page of running tasks, each with an Airflow container and a sidecar"""
+    return {
+        'tasks': [{
+            'taskArn': 'arn:aws:ecs:us-west-1:000000000000:task/some-cluster/{:032x}'.format(i),
+            'lastStatus': 'RUNNING',
+            'desiredStatus': 'RUNNING',
+            'startedAt': 1600000000.0,
+            'containers': [
+                {'name': 'some-container-name', 'lastStatus': 'RUNNING'},
+                {'name': 'some-sidecar', 'lastStatus': 'RUNNING'},
+            ],
+        } for i in range(start, start + num_tasks)],
+        'failures': []
+    }
+
+
+def tracked_bytes(num_tasks: int) -> int:
+    """Bytes allocated by a collection that tracks num_tasks tasks"""
+    gc.collect()
+    tracemalloc.start()
+    collection = EcsFargateTaskCollection()
+    for start in range(0, num_tasks, 100):
+        # Each page is decoded and dropped, like a DescribeTasks response in sync_running_tasks()
+        for task in load_tasks_response(describe_tasks_page(start, min(100, num_tasks - start)))['tasks']:
+            i = int(task.task_arn.rsplit('/', 1)[-1], 16)
+            key = ('some_dag', 'some_task_{}'.format(i), 'scheduled__2021-01-01T00:00:00+00:00', 1)
+            command = ['airflow', 'tasks', 'run', key[0], key[1], key[2], '--local']
+            collection.add_task(task, key, 'default', command, {})
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(collection) == num_tasks
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', default='10000,50000,100000', help='Comma separated numbers of tracked tasks')
+    args = parser.parse_args()
+
+    print('{:>10} {:>12} {:>14}'.format('tasks', 'total (MB)', 'per task (B)'))
+    for num_tasks in [int(size) for size in args.tasks.split(',')]:
+        total = tracked_bytes(num_tasks)
+        print('{:>10} {:>12.1f} {:>14.0f}'.format(num_tasks, total / 2 ** 20, total / num_tasks))
+
+
+if __name__ == '__main__':
+    main()
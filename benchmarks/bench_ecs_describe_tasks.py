@@ -0,0 +1,94 @@
+"""
+Benchmarks AwsEcsFargateExecutor.sync_running_tasks() latency against the number of active tasks, with and
+without the concurrent DescribeTasks fan-out.
+The ECS client is replaced with a stub that sleeps for a fixed API latency, so no AWS account is needed.
+
+    python benchmarks/bench_ecs_describe_tasks.py --latency 0.05 --concurrency 8
+"""
+import argparse
+import os
+import sys
+import time
+
+for _name, _value in {
+    'AIRFLOW__ECS_FARGATE__REGION': 'us-west-1',
+    'AIRFLOW__ECS_FARGATE__CLUSTER': 'some-cluster',
+    'AIRFLOW__ECS_FARGATE__CONTAINER_NAME': 'some-container-name',
+    'AIRFLOW__ECS_FARGATE__TASK_DEFINITION': 'some-task-def',
+}.items():
+    os.environ.setdefault(_name, _value)
+
+# Import the package from this checkout, even if it isn't installed
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from airflow_aws_executors.concurrency import BotoClientPool  # noqa: E402
+from airflow_aws_executors.ecs_fargate_executor import AwsEcsFargateExecutor, EcsFargateTask  # noqa: E402
+
+
+class SlowEcsClient:
+    """Answers DescribeTasks with RUNNING tasks after sleeping for a fixed API latency"""
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def describe_tasks(self, tasks, cluster):
+        """Mimics ECS.Client.describe_tasks"""
+        time.sleep(self.latency)
+        return {
+            'tasks': [{
+                'taskArn': arn,
+                'lastStatus': 'RUNNING',
+                'desiredStatus': 'RUNNING',
+                'containers': [{'name': 'some-container-name', 'lastStatus': 'RUNNING'}]
+            } for arn in tasks],
+            'failures': []
+        }
+
+
+def build_executor(num_tasks: int, latency: float, concurrency: int) -> AwsEcsFargateExecutor:
+    """Creates an executor tracking num_tasks running tasks"""
+    executor = AwsEcsFargateExecutor()
+    executor.start()
+    executor.ecs = SlowEcsClient(latency)
+    if concurrency > 1:
+        executor.describe_pool = BotoClientPool(lambda: SlowEcsClient(latency), concurrency)
+    for i in range(num_tasks):
+        arn = 'arn:aws:ecs:us-west-1:000000000000:task/some-cluster/{:032x}'.format(i)
+        task = EcsFargateTask(arn, 'RUNNING', 'RUNNING', [])
+        executor.active_workers.add_task(task, ('dag', 'task', i), None, ['airflow', 'tasks', 'run'], {})
+    return executor
+
+
+def time_sync(executor: AwsEcsFargateExecutor, repeat: int) -> float:
+    """Best wall-clock seconds of one sync_running_tasks() call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        executor.sync_running_tasks()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, nargs='+', default=[100, 500, 1000, 2500, 5000])
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated DescribeTasks latency in seconds')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print('{:>8} {:>8} {:>14} {:>14} {:>8}'.format(
+        'tasks', 'calls', 'serial (s)', 'concurrent (s)', 'speedup'))
+    for num_tasks in args.tasks:
+        serial = time_sync(build_executor(num_tasks, args.latency, 1), args.repeat)
+        concurrent_executor = build_executor(num_tasks, args.latency, args.concurrency)
+        concurrent = time_sync(concurrent_executor, args.repeat)
+        concurrent_executor.describe_pool.shutdown()
+        calls = -(-num_tasks // AwsEcsFargateExecutor.DESCRIBE_TASKS_BATCH_SIZE)
+        print('{:>8} {:>8} {:>14.3f} {:>14.3f} {:>7.1f}x'.format(
+            num_tasks, calls, serial, concurrent, serial / concurrent))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+End-to-end benchmark suite for both executors.
+Each workload queues N tasks, then heartbeats the executor against the in-process fake ECS/Batch services from
+tests/fake_aws.py until every task has finished. Time on the fake services is simulated, so a workload of
+100,000 tasks only takes as long as the executor's own overhead. For every executor and workload size it reports:
+* p50/p99 heartbeat (sync) duration
+* tasks launched per second, over the time spent launching them
+* time spent decoding Botocore responses
+* peak memory allocated while running the workload (traced in a separate pass, because tracing is slow)
+* per-operation timings of request rendering and of the task/job collections
+
+Results are written as JSON, so that a run can be compared with the results of another commit:
+
+    python benchmarks/bench_executors.py --sizes 100,1000,10000 --output before.json
+    python benchmarks/bench_executors.py --sizes 100,1000,10000 --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from unittest import mock
+
+for _name, _value in {
+    'AIRFLOW__BATCH__REGION': 'us-west-1',
+    'AIRFLOW__BATCH__JOB_NAME': 'some-job-name',
+    'AIRFLOW__BATCH__JOB_QUEUE': 'some-job-queue',
+    'AIRFLOW__BATCH__JOB_DEFINITION': 'some-job-def',
+    'AIRFLOW__ECS_FARGATE__REGION': 'us-west-1',
+    'AIRFLOW__ECS_FARGATE__CLUSTER': 'some-cluster',
+    'AIRFLOW__ECS_FARGATE__CONTAINER_NAME': 'some-container-name',
+    'AIRFLOW__ECS_FARGATE__TASK_DEFINITION': 'some-task-def',
+}.items():
+    os.environ.setdefault(_name, _value)
+
+# Import the package, and the fake AWS services that live with the tests, from this checkout
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable=wrong-import-position
+from airflow_aws_executors import batch_executor, ecs_fargate_executor  # noqa: E402
+from airflow_aws_executors.batch_executor import AwsBatchExecutor, BatchJobCollection  # noqa: E402
+from airflow_aws_executors.ecs_fargate_executor import (  # noqa: E402
+    AwsEcsFargateExecutor, EcsFargateTask, EcsFargateTaskCollection
+)
+from tests.fake_aws import FakeBatchClient, FakeClock, FakeEcsClient  # noqa: E402
+
+EXECUTORS = ('ecs', 'batch')
+# Module-level decoders, per executor, that are timed while a workload runs
+DECODERS = {
+    'ecs': (ecs_fargate_executor, ('load_tasks_response', 'load_list_tasks_response')),
+    'batch': (batch_executor, ('load_submit_job_response', 'load_describe_jobs_response', 'load_list_jobs_response')),
+}
+# Metrics where a larger value is better. For every other metric, smaller is better.
+HIGHER_IS_BETTER = {'launches_per_second'}
+
+
+class DecodeTimer:
+    """Accumulates the time spent in the executors' response decoders"""
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+
+    def wrap(self, func: Callable) -> Callable:
+        """Times every call of func"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.calls += 1
+        return timed
+
+    @contextlib.contextmanager
+    def patch(self, executor_name: str):
+        """Times the decoders of the given executor while in context"""
+        module, names = DECODERS[executor_name]
+        with contextlib.ExitStack() as stack:
+            for name in names:
+                stack.enter_context(mock.patch.object(module, name, self.wrap(getattr(module, name))))
+            yield self
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def build_executor(executor_name: str, clock: FakeClock, args):
+    """Starts an executor that's wired to a fake AWS service"""
+    fake_kwargs = dict(clock=clock, run_seconds=args.run_seconds, failure_rate=args.failure_rate,
+                       latency=args.latency, seed=args.seed, validate=False)
+    if executor_name == 'ecs':
+        executor = AwsEcsFargateExecutor()
+        executor.start()
+        executor.ecs = FakeEcsClient(provisioning_seconds=args.queue_seconds, **fake_kwargs)
+    else:
+        executor = AwsBatchExecutor()
+        executor.start()
+        executor.batch = FakeBatchClient(queue_seconds=args.queue_seconds, **fake_kwargs)
+    return executor
+
+
+def num_unlaunched(executor) -> int:
+    """Tasks that have been queued with the executor, but haven't been launched on AWS yet"""
+    if isinstance(executor, AwsEcsFargateExecutor):
+        return len(executor.pending_tasks)
+    return len(executor.pending_submissions)
+
+
+def run_workload(executor_name: str, num_tasks: int, args, trace_memory: bool = False) -> Dict[str, Any]:
+    """Drives num_tasks through an executor, heartbeating until every task has finished"""
+    clock = FakeClock()
+    executor = build_executor(executor_name, clock, args)
+    decode_timer = DecodeTimer()
+    heartbeats = []
+    max_heartbeats = int((args.queue_seconds + args.run_seconds) / args.heartbeat_seconds) * 10 + 100
+    with decode_timer.patch(executor_name):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(num_tasks):
+            executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+        launch_seconds = time.perf_counter() - start
+        launched = num_unlaunched(executor) == 0
+        while executor.active_workers or num_unlaunched(executor):
+            if len(heartbeats) >= max_heartbeats:
+                raise RuntimeError('{} tasks were still running after {} heartbeats'.format(
+                    len(executor.active_workers) + num_unlaunched(executor), len(heartbeats)))
+            start = time.perf_counter()
+            executor.sync()
+            heartbeats.append(time.perf_counter() - start)
+            if not launched:
+                launch_seconds += heartbeats[-1]
+                launched = num_unlaunched(executor) == 0
+            # Like the scheduler, which drains the event buffer after every heartbeat
+            executor.get_event_buffer()
+            clock.advance(args.heartbeat_seconds)
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    client = executor.ecs if executor_name == 'ecs' else executor.batch
+    executor.end()
+    return {
+        'heartbeats': len(heartbeats),
+        'heartbeat_p50_ms': percentile(heartbeats, 50) * 1e3,
+        'heartbeat_p99_ms': percentile(heartbeats, 99) * 1e3,
+        'heartbeat_total_ms': sum(heartbeats) * 1e3,
+        'launches_per_second': num_tasks / launch_seconds if launch_seconds else None,
+        'decode_ms': decode_timer.seconds * 1e3,
+        'decode_calls': decode_timer.calls,
+        'api_calls': dict(client.calls),
+        'peak_memory_mb': peak_memory / 2 ** 20 if peak_memory is not None else None,
+    }
+
+
+def time_per_op(func: Callable[[], Any], num_ops: int, repeat: int = 3) -> float:
+    """Best microseconds per operation, where one call of func performs num_ops operations"""
+    best = min(_time_once(func) for _ in range(repeat))
+    return best / num_ops * 1e6
+
+
+def _time_once(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def ecs_operations(num_tasks: int) -> Dict[str, float]:
+    """Microseconds per call of AwsEcsFargateExecutor's per-task hot paths"""
+    executor = AwsEcsFargateExecutor()
+    executor.start()
+    keys = [('dag', 'task', i) for i in range(num_tasks)]
+    cmd = ['airflow', 'tasks', 'run']
+    tasks = [EcsFargateTask('arn:aws:ecs:us-west-1:000000000000:task/some-cluster/{:032x}'.format(i),
+                            'RUNNING', 'RUNNING', []) for i in range(num_tasks)]
+    collection = EcsFargateTaskCollection()
+
+    def add():
+        for key, task in zip(keys, tasks):
+            collection.add_task(task, key, None, cmd, {})
+
+    def update():
+        for task in tasks:
+            collection.update_task(task)
+
+    def pop():
+        for key in keys:
+            collection.pop_by_key(key)
+
+    def add_then_pop():
+        add()
+        pop()
+
+    results = {
+        'run_task_kwargs_us': time_per_op(lambda: [executor._run_task_kwargs(key, cmd, None, {})  # pylint: disable=protected-access
+                                                   for key in keys], num_tasks),
+        'collection_add_pop_us': time_per_op(add_then_pop, num_tasks),
+    }
+    add()
+    results['collection_update_us'] = time_per_op(update, num_tasks)
+    results['collection_get_all_arns_us'] = time_per_op(collection.get_all_arns, 1)
+    executor.end()
+    return results
+
+
+def batch_operations(num_tasks: int) -> Dict[str, float]:
+    """Microseconds per call of AwsBatchExecutor's per-job hot paths"""
+    executor = AwsBatchExecutor()
+    executor.start()
+    keys = [('dag', 'task', i) for i in range(num_tasks)]
+    job_ids = ['{:032x}'.format(i) for i in range(num_tasks)]
+    cmd = ['airflow', 'tasks', 'run']
+    collection = BatchJobCollection()
+
+    def add():
+        for job_id, key in zip(job_ids, keys):
+            collection.add_job(job_id, key)
+
+    def add_then_pop():
+        add()
+        for job_id in job_ids:
+            collection.pop_by_id(job_id)
+
+    results = {
+        'submit_job_kwargs_us': time_per_op(lambda: [executor._submit_job_kwargs(key, cmd, None, {})  # pylint: disable=protected-access
+                                                     for key in keys], num_tasks),
+        'collection_add_pop_us': time_per_op(add_then_pop, num_tasks),
+    }
+    add()
+    results['collection_get_all_jobs_us'] = time_per_op(collection.get_all_jobs, 1)
+    executor.end()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    """The commit that is being benchmarked, if this is a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any]):
+    """Prints the relative change of every metric against a baseline run"""
+    baseline_results = {(result['executor'], result['tasks']): result for result in baseline['results']}
+    print('\nCompared with {}:'.format(baseline.get('commit') or 'baseline'))
+    print('{:<8} {:>8} {:<28} {:>14} {:>14} {:>9}'.format('executor', 'tasks', 'metric', 'before', 'after',
+                                                          'change'))
+    for result in results:
+        before = baseline_results.get((result['executor'], result['tasks']))
+        if before is None:
+            continue
+        for metric, value in sorted(result['metrics'].items()):
+            old_value = before['metrics'].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old_value, (int, float)) or not old_value:
+                continue
+            change = (value - old_value) / old_value * 100
+            worse = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+            print('{:<8} {:>8} {:<28} {:>14.3f} {:>14.3f} {:>+8.1f}%{}'.format(
+                result['executor'], result['tasks'], metric, old_value, value, change, ' *' if worse else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--executors', default=','.join(EXECUTORS), help='Comma separated: ecs,batch')
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='Comma separated numbers of tasks per workload. Up to 100000 is supported.')
+    parser.add_argument('--heartbeat-seconds', type=float, default=5, help='Simulated seconds between heartbeats')
+    parser.add_argument('--queue-seconds', type=float, default=20,
+                        help='Simulated seconds that a task spends provisioning/queued')
+    parser.add_argument('--run-seconds', type=float, default=60, help='Simulated seconds that a task runs for')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Probability that a task fails')
+    parser.add_argument('--latency', type=float, default=0.0, help='Real seconds that every API call sleeps for')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the (slow) peak memory pass')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='A JSON file from a previous run to compare the results with')
+    args = parser.parse_args()
+
+    results = []
+    print('{:<8} {:>8} {:>10} {:>10} {:>10} {:>12} {:>10} {:>10}'.format(
+        'executor', 'tasks', 'beats', 'p50 (ms)', 'p99 (ms)', 'launches/s', 'decode(ms)', 'peak (MB)'))
+    for executor_name in args.executors.split(','):
+        for num_tasks in [int(size) for size in args.sizes.split(',')]:
+            metrics = run_workload(executor_name, num_tasks, args)
+            if not args.no_memory:
+                metrics['peak_memory_mb'] = run_workload(executor_name, num_tasks, args,
+                                                         trace_memory=True)['peak_memory_mb']
+            metrics.update(ecs_operations(num_tasks) if executor_name == 'ecs' else batch_operations(num_tasks))
+            results.append({'executor': executor_name, 'tasks': num_tasks, 'metrics': metrics})
+            print('{:<8} {:>8} {:>10} {:>10.3f} {:>10.3f} {:>12.0f} {:>10.1f} {:>10}'.format(
+                executor_name, num_tasks, metrics['heartbeats'], metrics['heartbeat_p50_ms'],
+                metrics['heartbeat_p99_ms'], metrics['launches_per_second'] or 0, metrics['decode_ms'],
+                '-' if metrics['peak_memory_mb'] is None else '{:.1f}'.format(metrics['peak_memory_mb'])))
+
+    report = {
+        'commit': git_commit(),
+        'created_at': dt.datetime.now(dt.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(results, json.load(baseline_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -66,11 +66,14 @@ def __assert_botocore_shape(model, input_shape_name, input_shape, input_value):
     if 'enum' in input_shape:
         assert input_value in input_shape['enum'], \
                 f'Error in {input_shape_name}. Expected one of: {input_shape["enum"]}, Got: {input_value}'
+    if 'min' in input_shape or 'max' in input_shape:
+        # For strings, lists, and maps the min & max constraints apply to the length
+        sized_value = len(input_value) if isinstance(input_value, (str, list, dict)) else input_value
     if 'min' in input_shape:
-        assert input_value >= input_shape['min'], \
+        assert sized_value >= input_shape['min'], \
                 f'Error in {input_shape_name}. Expected: {input_shape} >= {input_shape["min"]}'
     if 'max' in input_shape:
-        assert input_value <= input_shape['max'], \
+        assert sized_value <= input_shape['max'], \
                 f'Error in {input_shape_name}. Expected: {input_shape} <= {input_shape["max"]}'
     if 'pattern' in input_shape:
         assert bool(re.match(input_shape['pattern'], input_value)), \
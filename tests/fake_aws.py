@@ -0,0 +1,448 @@
+"""
+Stateful, in-process stand-ins for the Boto3 'ecs' and 'batch' clients.
+They can be injected into AwsEcsFargateExecutor.ecs and AwsBatchExecutor.batch to load-test the executors with
+thousands of tasks, without an AWS account:
+* Every request is validated against the Botocore service model, just like the unit tests do.
+* Tasks & jobs move through their lifecycles based on a clock; tests can pass in a FakeClock to control time.
+* API latency, throttling errors, capacity failures, and dropped ARNs are simulated at configurable rates.
+Randomness is seeded, so a given workload always produces the same behavior.
+"""
+import datetime as dt
+import heapq
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+from .botocore_helper import assert_botocore_call, get_botocore_model
+
+ACCOUNT_ID = '000000000000'
+
+
+class FakeClock:
+    """A manually advanced clock, in seconds"""
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def advance(self, seconds: float):
+        """Moves time forward"""
+        self.now += seconds
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeAwsService:
+    """
+    Behavior shared by the fake ECS & Batch clients.
+    :param latency: Seconds that every API call sleeps for (in real time).
+    :param throttle_rate: Probability that an API call raises a ThrottlingException.
+    :param failure_rate: Probability that a task/job exits with a non-zero exit code.
+    :param run_seconds: How long a task/job runs for, once it has started.
+    :param clock: Returns the current time in seconds. Drives the task/job lifecycles.
+    :param seed: Seeds the simulated failures.
+    :param validate: Whether to validate requests against the Botocore model. Benchmarks turn this off.
+    """
+    SERVICE_NAME = ''
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, failure_rate: float = 0.0,
+                 run_seconds: float = 10.0, clock: Callable[[], float] = time.monotonic, seed: int = 0,
+                 validate: bool = True):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.run_seconds = run_seconds
+        self.clock = clock
+        self.validate = validate
+        self.model = get_botocore_model(self.SERVICE_NAME)
+        # Number of calls per operation name, and the number of those calls that were throttled
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+
+    def _call(self, operation_name: str, kwargs: Dict[str, Any]):
+        """Validates a request against the Botocore model, and simulates latency & throttling"""
+        if self.validate:
+            assert_botocore_call(self.model, operation_name, (), kwargs)
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[operation_name] += 1
+            if self._chance(self.throttle_rate):
+                self.throttled[operation_name] += 1
+                raise ClientError(
+                    {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation_name
+                )
+
+    def _chance(self, rate: float) -> bool:
+        return rate > 0 and self._random.random() < rate
+
+    def _exit_code(self) -> int:
+        return 1 if self._chance(self.failure_rate) else 0
+
+    @staticmethod
+    def _paginate(items: List[Any], kwargs: Dict[str, Any], default_page_size: int):
+        """Returns a page of items, and the token for the next page"""
+        start = int(kwargs.get('nextToken') or 0)
+        end = start + kwargs.get('maxResults', default_page_size)
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    @staticmethod
+    def _timestamp(seconds: float) -> dt.datetime:
+        return dt.datetime.fromtimestamp(seconds, tz=dt.timezone.utc)
+
+
+class FakeEcsTask:
+    """A simulated ECS task"""
+    def __init__(self, arn: str, kwargs: Dict[str, Any], created_at: float, provisioning_seconds: float,
+                 run_seconds: float, exit_code: int, dropped: bool):
+        self.arn = arn
+        self.kwargs = kwargs
+        self.cluster = kwargs.get('cluster', 'default')
+        self.created_at = created_at
+        self.started_at = created_at + provisioning_seconds
+        self.stopped_at = self.started_at + run_seconds
+        self.exit_code = exit_code
+        self.dropped = dropped
+        self.stopped_reason = 'Essential container in task exited'
+
+    def is_stopped(self, now: float) -> bool:
+        """Whether or not the task has stopped at the given time"""
+        return now >= self.stopped_at
+
+    def stop(self, now: float, reason: str):
+        """StopTask"""
+        if not self.is_stopped(now):
+            self.stopped_at = now
+            self.exit_code = 137 if now >= self.started_at else None
+            self.stopped_reason = reason
+
+    def describe(self, now: float, container_name: str, include_tags: bool = False) -> Dict[str, Any]:
+        """The 'Task' shape at the given time. Like ECS, tags are only included when asked for"""
+        task = {
+            'taskArn': self.arn,
+            'clusterArn': self.kwargs.get('cluster'),
+            'taskDefinitionArn': self.kwargs.get('taskDefinition'),
+            'createdAt': FakeAwsService._timestamp(self.created_at),
+            'startedBy': self.kwargs.get('startedBy'),
+            'tags': self.kwargs.get('tags', []) if include_tags else None,
+        }
+        container = {'name': container_name}
+        if self.is_stopped(now):
+            task.update(lastStatus='STOPPED', desiredStatus='STOPPED', stoppedReason=self.stopped_reason,
+                        stoppedAt=FakeAwsService._timestamp(self.stopped_at))
+            container['lastStatus'] = 'STOPPED'
+            if self.exit_code is not None:
+                task['startedAt'] = FakeAwsService._timestamp(self.started_at)
+                container['exitCode'] = self.exit_code
+        elif now >= self.started_at:
+            task.update(lastStatus='RUNNING', desiredStatus='RUNNING',
+                        startedAt=FakeAwsService._timestamp(self.started_at))
+            container['lastStatus'] = 'RUNNING'
+        else:
+            task.update(lastStatus='PROVISIONING', desiredStatus='RUNNING')
+            container['lastStatus'] = 'PENDING'
+        task['containers'] = [container]
+        return {k: v for k, v in task.items() if v is not None}
+
+
+class FakeEcsClient(FakeAwsService):
+    """
+    Simulates RunTask, DescribeTasks, ListTasks, and StopTask on ECS/Fargate.
+    Tasks go PROVISIONING -> RUNNING -> STOPPED, and are only described or listed in the cluster that they run in.
+    :param provisioning_seconds: How long a task is provisioned for before it starts running.
+    :param max_running: Maximum number of tasks that aren't stopped. RunTask fails with a capacity failure beyond it.
+    :param capacity_failure_rate: Probability that RunTask fails with a capacity failure anyway.
+    :param drop_rate: Probability that a launched ARN is dropped; DescribeTasks then reports it as MISSING.
+    :param provisioning_failure_rate: Probability that a task is stopped before it ever starts running.
+    :param unavailable_capacity_providers: Capacity providers that are out of capacity (ex: FARGATE_SPOT). RunTask
+    fails with Fargate's capacity failure when every capacity provider of its strategy is out.
+    """
+    SERVICE_NAME = 'ecs'
+    CAPACITY_FAILURE_REASONS = ('RESOURCE:MEMORY', 'RESOURCE:CPU', 'AGENT')
+    FARGATE_CAPACITY_FAILURE_REASON = ('Capacity is unavailable at this time. Please try again later or in a different '
+                                       'availability zone')
+
+    def __init__(self, provisioning_seconds: float = 30.0, max_running: Optional[int] = None,
+                 capacity_failure_rate: float = 0.0, drop_rate: float = 0.0, provisioning_failure_rate: float = 0.0,
+                 unavailable_capacity_providers: Iterable[str] = (), **kwargs):
+        super().__init__(**kwargs)
+        self.provisioning_seconds = provisioning_seconds
+        self.max_running = max_running
+        self.capacity_failure_rate = capacity_failure_rate
+        self.drop_rate = drop_rate
+        self.provisioning_failure_rate = provisioning_failure_rate
+        self.unavailable_capacity_providers = set(unavailable_capacity_providers)
+        self.tasks: Dict[str, FakeEcsTask] = {}
+        # Heap of (stopped_at, arn) for the tasks in _active; entries are stale if the task was stopped early
+        self._stop_heap = []
+        self._active = set()
+
+    def run_task(self, **kwargs) -> Dict[str, Any]:
+        """ECS.Client.run_task"""
+        self._call('RunTask', kwargs)
+        with self._lock:
+            now = self.clock()
+            failures, tasks = [], []
+            for _ in range(kwargs.get('count', 1)):
+                if self.__capacity_unavailable(kwargs):
+                    failures.append({'reason': self.FARGATE_CAPACITY_FAILURE_REASON})
+                    continue
+                if self.__at_capacity(now) or self._chance(self.capacity_failure_rate):
+                    failures.append({'reason': self._random.choice(self.CAPACITY_FAILURE_REASONS)})
+                    continue
+                task = self.__launch(kwargs, now)
+                tasks.append(task.describe(now, self.__container_name(kwargs)))
+            return {'tasks': tasks, 'failures': failures}
+
+    def describe_tasks(self, **kwargs) -> Dict[str, Any]:
+        """ECS.Client.describe_tasks"""
+        self._call('DescribeTasks', kwargs)
+        with self._lock:
+            now = self.clock()
+            tasks, failures = [], []
+            for arn in kwargs['tasks']:
+                task = self.tasks.get(arn)
+                if task is None or task.dropped or task.cluster != kwargs.get('cluster', 'default'):
+                    failures.append({'arn': arn, 'reason': 'MISSING'})
+                else:
+                    tasks.append(task.describe(now, self.__container_name(task.kwargs),
+                                               include_tags='TAGS' in kwargs.get('include', ())))
+            return {'tasks': tasks, 'failures': failures}
+
+    def list_tasks(self, **kwargs) -> Dict[str, Any]:
+        """ECS.Client.list_tasks"""
+        self._call('ListTasks', kwargs)
+        with self._lock:
+            now = self.clock()
+            desired_status = kwargs.get('desiredStatus', 'RUNNING')
+            arns = [
+                arn for arn, task in self.tasks.items()
+                if not task.dropped and task.cluster == kwargs.get('cluster', 'default')
+                and task.is_stopped(now) == (desired_status == 'STOPPED')
+                and ('startedBy' not in kwargs or task.kwargs.get('startedBy') == kwargs['startedBy'])
+            ]
+            page, next_token = self._paginate(arns, kwargs, 100)
+            response = {'taskArns': page}
+            if next_token:
+                response['nextToken'] = next_token
+            return response
+
+    def stop_task(self, **kwargs) -> Dict[str, Any]:
+        """ECS.Client.stop_task"""
+        self._call('StopTask', kwargs)
+        with self._lock:
+            now = self.clock()
+            task = self.tasks[kwargs['task']]
+            task.stop(now, kwargs.get('reason', 'Task stopped by user'))
+            heapq.heappush(self._stop_heap, (task.stopped_at, task.arn))
+            return {'task': task.describe(now, self.__container_name(task.kwargs))}
+
+    def __launch(self, kwargs: Dict[str, Any], now: float) -> FakeEcsTask:
+        arn = 'arn:aws:ecs:us-west-1:{}:task/{}/{}'.format(ACCOUNT_ID, kwargs.get('cluster', 'default'),
+                                                           uuid.UUID(int=self._random.getrandbits(128)).hex)
+        task = FakeEcsTask(arn, kwargs, now, self.provisioning_seconds, self.run_seconds, self._exit_code(),
+                           self._chance(self.drop_rate))
+        if self._chance(self.provisioning_failure_rate):
+            task.stop(task.created_at, 'Timeout waiting for network interface provisioning to complete.')
+        self.tasks[arn] = task
+        self._active.add(arn)
+        heapq.heappush(self._stop_heap, (task.stopped_at, arn))
+        return task
+
+    def __capacity_unavailable(self, kwargs: Dict[str, Any]) -> bool:
+        providers = [item['capacityProvider'] for item in kwargs.get('capacityProviderStrategy', ())]
+        return bool(providers) and all(provider in self.unavailable_capacity_providers for provider in providers)
+
+    def __at_capacity(self, now: float) -> bool:
+        if self.max_running is None:
+            return False
+        while self._stop_heap and self._stop_heap[0][0] <= now:
+            stopped_at, arn = heapq.heappop(self._stop_heap)
+            if self.tasks[arn].stopped_at == stopped_at:
+                self._active.discard(arn)
+        return len(self._active) >= self.max_running
+
+    @staticmethod
+    def __container_name(kwargs: Dict[str, Any]) -> str:
+        container_overrides = kwargs.get('overrides', {}).get('containerOverrides') or [{'name': 'default'}]
+        return container_overrides[0]['name']
+
+
+class FakeBatchJob:
+    """A simulated Batch job"""
+    def __init__(self, job_id: str, kwargs: Dict[str, Any], created_at: float, queue_seconds: float,
+                 run_seconds: float, exit_code: int, array_index: Optional[int] = None):
+        self.job_id = job_id
+        # The index of a child of an array job
+        self.array_index = array_index
+        self.kwargs = kwargs
+        self.created_at = created_at
+        self.started_at = created_at + queue_seconds
+        self.stopped_at = self.started_at + run_seconds
+        self.exit_code = exit_code
+        self.status_reason = None
+
+    def status(self, now: float) -> str:
+        """The job status at the given time"""
+        if now >= self.stopped_at:
+            return 'SUCCEEDED' if self.exit_code == 0 else 'FAILED'
+        if now >= self.started_at:
+            return 'RUNNING'
+        if now == self.created_at:
+            return 'SUBMITTED'
+        return 'RUNNABLE'
+
+    def terminate(self, now: float, reason: str):
+        """TerminateJob"""
+        if now < self.stopped_at:
+            self.stopped_at = now
+            self.exit_code = 1
+            self.status_reason = reason
+
+    def describe(self, now: float) -> Dict[str, Any]:
+        """The 'JobDetail' shape at the given time"""
+        job = {
+            'jobId': self.job_id,
+            'jobName': self.kwargs['jobName'],
+            'jobQueue': self.kwargs['jobQueue'],
+            'jobDefinition': self.kwargs['jobDefinition'],
+            'status': self.status(now),
+            'createdAt': int(self.created_at * 1000),
+            'tags': self.kwargs.get('tags', {}),
+        }
+        if self.array_index is not None:
+            job['arrayProperties'] = {'index': self.array_index}
+        if now >= self.started_at:
+            job['startedAt'] = int(self.started_at * 1000)
+        if now >= self.stopped_at:
+            job['stoppedAt'] = int(self.stopped_at * 1000)
+            job['statusReason'] = self.status_reason or 'Essential container in task exited'
+            job['container'] = {'exitCode': self.exit_code}
+        return job
+
+
+class FakeBatchArrayJob(FakeBatchJob):
+    """A simulated Batch array job, which is running while any of its children are, and fails if any of them fail"""
+    def __init__(self, job_id: str, kwargs: Dict[str, Any], created_at: float, children: List[FakeBatchJob]):
+        super().__init__(job_id, kwargs, created_at, 0.0, 0.0, 0)
+        self.children = children
+
+    def status(self, now: float) -> str:
+        statuses = [child.status(now) for child in self.children]
+        if all(status in ('SUCCEEDED', 'FAILED') for status in statuses):
+            return 'FAILED' if 'FAILED' in statuses else 'SUCCEEDED'
+        if any(status in ('RUNNING', 'SUCCEEDED', 'FAILED') for status in statuses):
+            return 'RUNNING'
+        return 'SUBMITTED' if now == self.created_at else 'PENDING'
+
+    def terminate(self, now: float, reason: str):
+        for child in self.children:
+            child.terminate(now, reason)
+
+    def describe(self, now: float) -> Dict[str, Any]:
+        job = {
+            'jobId': self.job_id,
+            'jobName': self.kwargs['jobName'],
+            'jobQueue': self.kwargs['jobQueue'],
+            'jobDefinition': self.kwargs['jobDefinition'],
+            'status': self.status(now),
+            'createdAt': int(self.created_at * 1000),
+            'arrayProperties': {'size': len(self.children)},
+            'tags': self.kwargs.get('tags', {}),
+        }
+        return job
+
+
+class FakeBatchClient(FakeAwsService):
+    """
+    Simulates SubmitJob, DescribeJobs, ListJobs, and TerminateJob on AWS Batch.
+    Jobs go SUBMITTED -> RUNNABLE -> RUNNING -> SUCCEEDED/FAILED. The children of an array job are described by their
+    own job IDs ('jobId:index'), and only the array job itself is listed.
+    :param queue_seconds: How long a job waits in the queue before it starts running.
+    :param drop_rate: Probability that a submitted job ID is dropped; DescribeJobs then omits it.
+    """
+    SERVICE_NAME = 'batch'
+
+    def __init__(self, queue_seconds: float = 30.0, drop_rate: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.queue_seconds = queue_seconds
+        self.drop_rate = drop_rate
+        self.jobs: Dict[str, FakeBatchJob] = {}
+        self.dropped = set()
+
+    def submit_job(self, **kwargs) -> Dict[str, Any]:
+        """Batch.Client.submit_job"""
+        self._call('SubmitJob', kwargs)
+        with self._lock:
+            job_id = str(uuid.UUID(int=self._random.getrandbits(128)))
+            array_size = kwargs.get('arrayProperties', {}).get('size')
+            if array_size:
+                children = [
+                    FakeBatchJob('{}:{}'.format(job_id, i), kwargs, self.clock(), self.queue_seconds,
+                                 self.run_seconds, self._exit_code(), array_index=i)
+                    for i in range(array_size)
+                ]
+                self.jobs.update((child.job_id, child) for child in children)
+                self.jobs[job_id] = FakeBatchArrayJob(job_id, kwargs, self.clock(), children)
+            else:
+                self.jobs[job_id] = FakeBatchJob(job_id, kwargs, self.clock(), self.queue_seconds, self.run_seconds,
+                                                 self._exit_code())
+            if self._chance(self.drop_rate):
+                self.dropped.add(job_id)
+            return {
+                'jobArn': 'arn:aws:batch:us-west-1:{}:job/{}'.format(ACCOUNT_ID, job_id),
+                'jobName': kwargs['jobName'],
+                'jobId': job_id
+            }
+
+    def describe_jobs(self, **kwargs) -> Dict[str, Any]:
+        """Batch.Client.describe_jobs"""
+        self._call('DescribeJobs', kwargs)
+        with self._lock:
+            now = self.clock()
+            return {'jobs': [
+                self.jobs[job_id].describe(now) for job_id in kwargs['jobs']
+                if job_id in self.jobs and job_id not in self.dropped
+            ]}
+
+    def list_jobs(self, **kwargs) -> Dict[str, Any]:
+        """Batch.Client.list_jobs"""
+        self._call('ListJobs', kwargs)
+        with self._lock:
+            now = self.clock()
+            job_status = kwargs.get('jobStatus', 'RUNNING')
+            # With a filter, the job status is ignored, and jobs are listed most recent first
+            created_after = None
+            for list_jobs_filter in kwargs.get('filters', ()):
+                if list_jobs_filter['name'] == 'AFTER_CREATED_AT':
+                    created_after = int(list_jobs_filter['values'][0])
+            jobs = self.jobs.values()
+            if 'filters' in kwargs:
+                jobs = sorted(jobs, key=lambda job: job.created_at, reverse=True)
+            summaries = [
+                {'jobId': job.job_id, 'jobName': job.kwargs['jobName'], 'status': job.status(now),
+                 'createdAt': int(job.created_at * 1000)}
+                for job in jobs
+                if job.kwargs['jobQueue'] == kwargs.get('jobQueue') and job.job_id not in self.dropped
+                and job.array_index is None
+                and (job.status(now) == job_status if 'filters' not in kwargs
+                     else created_after is None or job.created_at * 1000 > created_after)
+            ]
+            page, next_token = self._paginate(summaries, kwargs, 1000)
+            response = {'jobSummaryList': page}
+            if next_token:
+                response['nextToken'] = next_token
+            return response
+
+    def terminate_job(self, **kwargs) -> Dict[str, Any]:
+        """Batch.Client.terminate_job"""
+        self._call('TerminateJob', kwargs)
+        with self._lock:
+            self.jobs[kwargs['jobId']].terminate(self.clock(), kwargs['reason'])
+            return {}
@@ -0,0 +1,93 @@
+from unittest import TestCase
+
+from airflow_aws_executors.admission import CapacityAdmissionController
+
+from .fake_aws import FakeEcsClient
+
+
+class TestCapacityAdmissionController(TestCase):
+    """Tests the CapacityAdmissionController"""
+    def test_disabled(self):
+        """Without a backoff, every pending task is always admitted"""
+        controller = CapacityAdmissionController()
+        controller.record(None, {'RESOURCE:MEMORY': 10}, 10)
+        self.assertFalse(controller.backing_off())
+        self.assertEqual(10, controller.admit(None, 10))
+
+    def test_capacity_failures(self):
+        """Only capacity failure reasons hold back launches"""
+        self.assertTrue(self.controller.is_capacity_failure('RESOURCE:MEMORY'))
+        self.assertTrue(self.controller.is_capacity_failure('RESOURCE:CPU'))
+        self.assertTrue(self.controller.is_capacity_failure('AGENT'))
+        self.assertTrue(self.controller.is_capacity_failure(FakeEcsClient.FARGATE_CAPACITY_FAILURE_REASON))
+        self.assertFalse(self.controller.is_capacity_failure('MISSING'))
+
+        self.controller.record(None, {'MISSING': 1}, 0)
+        self.assertEqual(10, self.controller.admit(None, 10))
+
+    def test_backoff_and_probe(self):
+        """Launches back off exponentially per reason, then a single task probes for capacity"""
+        self.controller.record(None, {'RESOURCE:MEMORY': 3, 'MISSING': 1}, 6)
+        self.assertListEqual(['RESOURCE:MEMORY'], self.controller.backing_off())
+        self.now = 9
+        self.assertEqual(0, self.controller.admit(None, 10))
+        self.now = 10
+        self.assertEqual(1, self.controller.admit(None, 10))
+
+        # a failed probe doubles the backoff
+        self.controller.record(None, {'RESOURCE:MEMORY': 1, 'RESOURCE:CPU': 1}, 0)
+        self.now = 29
+        self.assertEqual(0, self.controller.admit(None, 10))
+        self.now = 30
+        self.assertEqual(1, self.controller.admit(None, 10))
+        self.controller.record(None, {'RESOURCE:MEMORY': 1}, 0)
+        self.assertEqual(40, self.controller.backoff(3))
+        # every reason has to have backed off before probing again
+        self.now = 69
+        self.assertEqual(0, self.controller.admit(None, 10))
+
+        # a successful probe releases the queue
+        self.now = 70
+        self.assertEqual(1, self.controller.admit(None, 10))
+        self.controller.record(None, {}, 1)
+        self.assertFalse(self.controller.backing_off())
+        self.assertEqual(9, self.controller.admit(None, 9))
+
+    def test_failed_probe(self):
+        """A probe that fails for any other reason than capacity keeps holding back launches"""
+        self.controller.record(None, {'RESOURCE:MEMORY': 1}, 0)
+        self.now = 10
+        self.assertEqual(1, self.controller.admit(None, 10))
+        self.controller.record(None, {'MISSING': 1}, 0)
+        self.assertListEqual(['RESOURCE:MEMORY'], self.controller.backing_off())
+        self.assertEqual(1, self.controller.admit(None, 10))
+        # nothing was launched at all
+        self.controller.record(None, {}, 0)
+        self.assertListEqual(['RESOURCE:MEMORY'], self.controller.backing_off())
+
+    def test_targets(self):
+        """Each launch target backs off and probes on its own"""
+        self.controller.record('heavy', {'RESOURCE:MEMORY': 1}, 0)
+        self.assertTrue(self.controller.holding_back)
+        self.assertListEqual(['RESOURCE:MEMORY'], self.controller.backing_off('heavy'))
+        self.assertListEqual([], self.controller.backing_off())
+        self.assertEqual(0, self.controller.admit('heavy', 10))
+        self.assertEqual(10, self.controller.admit(None, 10))
+
+        # launches of other targets don't release the target
+        self.controller.record(None, {}, 10)
+        self.assertEqual(0, self.controller.admit('heavy', 10))
+        self.now = 10
+        self.controller.record('heavy', {}, 1)
+        self.assertFalse(self.controller.holding_back)
+        self.assertEqual(10, self.controller.admit('heavy', 10))
+
+    def test_max_backoff(self):
+        """Backoffs are capped"""
+        self.assertEqual(10, self.controller.backoff(1))
+        self.assertEqual(160, self.controller.backoff(5))
+        self.assertEqual(300, self.controller.backoff(10))
+
+    def setUp(self):
+        self.now = 0
+        self.controller = CapacityAdmissionController(initial_backoff=10, max_backoff=300, clock=lambda: self.now)
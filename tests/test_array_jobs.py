@@ -0,0 +1,59 @@
+import random
+from collections import namedtuple
+from unittest import TestCase, mock
+
+from airflow_aws_executors.array_jobs import (ARRAY_JOB_COMMAND, MAX_ARRAY_SIZE, MAX_MANIFEST_LENGTH, ArrayJobBuilder,
+                                              decode_manifest, encode_manifest, main)
+from airflow_aws_executors.packing import TaskArray, TaskPack, task_keys, unpack_states
+
+QueuedJob = namedtuple('QueuedJob', ('key', 'command', 'queue', 'executor_config'))
+
+
+class TestArrayJobBuilder(TestCase):
+    """Tests the ArrayJobBuilder"""
+    def test_build(self):
+        """Compatible jobs become the children of array jobs, in order, and lone jobs are left as they are"""
+        queued_jobs = [QueuedJob(i, ['airflow', str(i)], 'default', {}) for i in range(5)]
+        queued_jobs.append(QueuedJob('gpu', ['airflow', 'gpu'], 'default', {'gpu': 1}))
+        array_jobs = ArrayJobBuilder(3).build(queued_jobs)
+
+        self.assertListEqual([TaskArray((0, 1, 2)), TaskArray((3, 4)), 'gpu'], [job.key for job in array_jobs])
+        self.assertListEqual(ARRAY_JOB_COMMAND, array_jobs[0].command[:3])
+        self.assertListEqual([['airflow', '0'], ['airflow', '1'], ['airflow', '2']],
+                             decode_manifest(array_jobs[0].command[-1]))
+        self.assertIs(queued_jobs[-1], array_jobs[-1])
+
+    def test_manifest_length(self):
+        """Array jobs whose manifest doesn't fit in a SubmitJob request are split"""
+        rand = random.Random(0)
+        queued_jobs = [
+            QueuedJob(i, ['airflow', '{:032x}'.format(rand.getrandbits(128))], 'default', {}) for i in range(1000)
+        ]
+        array_jobs = ArrayJobBuilder(MAX_ARRAY_SIZE).build(queued_jobs)
+        self.assertGreater(len(array_jobs), 1)
+        self.assertTrue(all(len(job.command[-1]) <= MAX_MANIFEST_LENGTH for job in array_jobs))
+        self.assertListEqual(list(range(1000)), [key for job in array_jobs for key in task_keys(job.key)])
+
+    def test_invalid(self):
+        """Array sizes must be supported by AWS Batch"""
+        for array_size in (1, MAX_ARRAY_SIZE + 1):
+            with self.assertRaises(ValueError):
+                ArrayJobBuilder(array_size)
+
+    def test_task_keys(self):
+        """The children of an array job may be packs"""
+        key = TaskArray((TaskPack(('a', 'b')), 'c'))
+        self.assertTupleEqual(('a', 'b', 'c'), task_keys(key))
+        self.assertListEqual([('a', 'failed'), ('b', 'failed'), ('c', 'failed')], unpack_states(key, 'failed'))
+
+
+class TestArrayJobChild(TestCase):
+    """Tests the container side of an array job"""
+    def test_main(self):
+        """Each child runs the command at its array index"""
+        manifest = encode_manifest([['airflow', '0'], ['airflow', '1']])
+        execvp = mock.Mock()
+        main([manifest], environ={'AWS_BATCH_JOB_ARRAY_INDEX': '1'}, execvp=execvp)
+        execvp.assert_called_once_with('airflow', ['airflow', '1'])
+        with self.assertRaises(SystemExit):
+            main([manifest], environ={}, execvp=execvp)
@@ -1,12 +1,34 @@
 import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import wait
+from copy import deepcopy
 from unittest import TestCase, mock
 
 from airflow_aws_executors.batch_executor import (
-    AwsBatchExecutor, BatchJobDetailSchema, BatchJob, BatchJobCollection
+    AwsBatchExecutor, BatchDescribeJobsResponseSchema, BatchError, BatchJobDetailSchema, BatchJob, BatchJobCollection,
+    load_describe_jobs_response
 )
+from airflow_aws_executors.concurrency import BotoClientPool
+from airflow_aws_executors.metrics import ExecutorMetrics
+from airflow_aws_executors.packing import TaskPack, pack_exit_code
+from airflow_aws_executors.polling import StatusPollingScheduler
+from airflow_aws_executors.timeline import TaskTimeline, breakdown
 from airflow.utils.state import State
+from botocore.exceptions import ClientError
+from marshmallow import ValidationError
 
 from .botocore_helper import get_botocore_model, assert_botocore_call
+from .fake_aws import FakeBatchClient, FakeClock
+
+# Routes for test_queue_routes
+QUEUE_ROUTES = {
+    'heavy': {'jobQueue': 'heavy-job-queue', 'jobDefinition': 'heavy-job-def'},
+    'remote': {'region': 'us-east-2'},
+}
 
 
 class TestBatchCollection(TestCase):
@@ -27,6 +49,35 @@ class TestBatchCollection(TestCase):
         self.assertEqual(len(self.collection), 1)
         self.assertListEqual(self.collection.get_all_jobs(), [self.second_job_id])
 
+    def test_status_buckets(self):
+        """Test that jobs are bucketed by their last known status, along with the time that they entered it"""
+        clock = FakeClock()
+        collection = BatchJobCollection(clock=clock)
+        for job_id in ('AAA', 'BBB', 'CCC'):
+            collection.add_job(job_id, ('key', job_id))
+            clock.advance(10)
+        self.assertDictEqual({'SUBMITTED': 3}, collection.count_by_status())
+        self.assertIsNone(collection.update_status('AAA', 'SUBMITTED'))
+        self.assertIsNone(collection.update_status('XXX', 'RUNNING'))
+
+        self.assertTupleEqual(('SUBMITTED', 20), collection.update_status('BBB', 'RUNNABLE'))
+        clock.advance(10)
+        self.assertTupleEqual(('SUBMITTED', 40), collection.update_status('AAA', 'RUNNABLE'))
+        self.assertIsNone(collection.update_status('AAA', 'RUNNABLE'))
+        clock.advance(5)
+        self.assertDictEqual({'SUBMITTED': 1, 'RUNNABLE': 2}, collection.count_by_status())
+        self.assertEqual('RUNNABLE', collection.job_status('AAA'))
+        self.assertEqual(5, collection.status_age('AAA'))
+        self.assertTupleEqual(('BBB', 15), collection.oldest_in_status('RUNNABLE'))
+        self.assertIsNone(collection.oldest_in_status('RUNNING'))
+        self.assertListEqual(['BBB', 'AAA'], collection.jobs_in_status('RUNNABLE'))
+        self.assertListEqual(['BBB'], collection.jobs_in_status('RUNNABLE', min_age=10))
+
+        collection.pop_by_id('BBB')
+        self.assertDictEqual({'SUBMITTED': 1, 'RUNNABLE': 1}, collection.count_by_status())
+        self.assertIsNone(collection.job_status('BBB'))
+        self.assertListEqual([], collection.jobs_in_status('RUNNABLE', min_age=10))
+
     def setUp(self):
         """
         Create a ECS Task Collection and add 2 airflow tasks. Populates self.collection,
@@ -81,6 +132,38 @@ class TestBatchJob(TestCase):
         self.failed = 'FAILED'
 
 
+class TestBatchDecoding(TestCase):
+    """Tests that the low-overhead decoders are equivalent to the marshmallow schemas"""
+    def test_equivalent_to_schema(self):
+        """Decoded jobs match the marshmallow schemas"""
+        boto_response = {'jobs': [
+            {'jobId': 'AAA', 'jobName': 'some-job-name', 'status': 'RUNNING', 'createdAt': 1},
+            {'jobId': 'BBB', 'status': 'FAILED', 'statusReason': 'Essential container in task exited',
+             'stoppedAt': 1600000000000, 'container': {'image': 'airflow', 'exitCode': 3}},
+            {'jobId': 'CCC', 'status': 'RUNNING', 'container': {'image': 'airflow'}},
+        ]}
+        expected = BatchDescribeJobsResponseSchema().load(boto_response)['jobs']
+        actual = load_describe_jobs_response(boto_response)['jobs']
+        self.assertListEqual([vars(job) for job in expected], [vars(job) for job in actual])
+
+    def test_invalid_shapes(self):
+        """Shapes that fail the marshmallow schemas also fail the decoders"""
+        invalid_responses = [
+            {},
+            {'jobs': {}},
+            {'jobs': [{'jobId': 'AAA'}]},
+            {'jobs': [{'status': 'RUNNING'}]},
+            {'jobs': [{'jobId': 'AAA', 'status': 'RUNNING', 'statusReason': 3}]},
+            {'jobs': [{'jobId': 'AAA', 'status': 'FAILED', 'stoppedAt': 'yesterday'}]},
+            {'jobs': [{'jobId': 'AAA', 'status': 'FAILED', 'container': {'exitCode': 'one'}}]},
+        ]
+        for boto_response in invalid_responses:
+            with self.assertRaises(ValidationError):
+                BatchDescribeJobsResponseSchema().load(boto_response)
+            with self.assertRaises(ValidationError):
+                load_describe_jobs_response(boto_response)
+
+
 class TestAwsBatchExecutor(TestCase):
     """Tests the AWS Batch Executor itself"""
 
@@ -104,6 +187,389 @@ class TestAwsBatchExecutor(TestCase):
         # task is stored in active worker
         self.assertEqual(1, len(self.executor.active_workers))
 
+    def test_throttled_execute(self):
+        """Test that throttled SubmitJob calls are retried, and raised once they run out of retries"""
+        throttled = ClientError({'Error': {'Code': 'TooManyRequestsException', 'Message': 'Rate exceeded'}},
+                                'SubmitJob')
+        self.executor.batch.submit_job.side_effect = [throttled, {'jobId': 'ABC', 'jobName': 'some-job-name'}]
+        self.executor.rate_limiter.sleep = mock.Mock()
+
+        self.executor.execute_async(('key', 1), ['airflow', 'tasks', 'run'])
+        self.assertEqual(2, self.executor.batch.submit_job.call_count)
+        self.assertEqual(1, len(self.executor.active_workers))
+
+        self.executor.batch.submit_job.side_effect = throttled
+        with self.assertRaises(ClientError):
+            self.executor.execute_async(('key', 2), ['airflow', 'tasks', 'run'])
+        self.assertEqual(2 + 1 + self.executor.rate_limiter.max_retries, self.executor.batch.submit_job.call_count)
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_metrics(self, success_mock):
+        """Test that API latencies, job counts per status, time per status and the job lifecycle are emitted"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=30, run_seconds=60)
+        stats = mock.Mock()
+        with mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.metrics = ExecutorMetrics('batch_executor', stats=stats, clock=clock)
+            executor.start()
+        executor.active_workers = BatchJobCollection(clock=clock)
+        executor.execute_async(('dag', 'task', 0), ['airflow', 'tasks', 'run'])
+        for _ in range(5):
+            clock.advance(20)
+            executor.sync()
+        stats.gauge.assert_any_call('batch_executor.jobs.RUNNABLE', 1)
+        stats.gauge.assert_any_call('batch_executor.jobs.RUNNING', 1)
+        success_mock.assert_called_once_with(('dag', 'task', 0))
+        stats.incr.assert_called_once_with('batch_executor.jobs_succeeded', 1)
+
+        timings = {}
+        for call_args in stats.timing.call_args_list:
+            timings.setdefault(call_args[0][0], []).append(call_args[0][1].total_seconds())
+        self.assertListEqual([0], timings['batch_executor.launch_latency'])
+        self.assertListEqual([40], timings['batch_executor.start_latency'])
+        self.assertListEqual([60], timings['batch_executor.run_duration'])
+        self.assertListEqual([20], timings['batch_executor.job_status.SUBMITTED'])
+        self.assertListEqual([20], timings['batch_executor.job_status.RUNNABLE'])
+        self.assertListEqual([60], timings['batch_executor.job_status.RUNNING'])
+        self.assertEqual(1, len(timings['batch_executor.api.submit_job']))
+        self.assertEqual(5, len(timings['batch_executor.sync']))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    def test_task_packing(self, fail_mock):
+        """Test that compatible tasks are submitted in packs, and that each task gets its own final state"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__PACK_SIZE': '2'}), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+        for i in range(3):
+            executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+        # tasks are held until the next heartbeat
+        self.assertEqual(0, fake_batch.calls['SubmitJob'])
+        executor.sync()
+        self.assertEqual(2, fake_batch.calls['SubmitJob'])
+        self.assertIn(TaskPack((('dag', 'task', 0), ('dag', 'task', 1))), executor.active_workers.key_to_id)
+        for job in fake_batch.jobs.values():
+            command = job.kwargs['containerOverrides']['command']
+            if command[:3] == ['python', '-m', 'airflow_aws_executors.packing']:
+                self.assertListEqual([['airflow', 'tasks', 'run', '0'], ['airflow', 'tasks', 'run', '1']],
+                                     json.loads(command[-1]))
+                # the pack's first command failed
+                job.exit_code = pack_exit_code(0b1)
+        with mock.patch('airflow.executors.base_executor.BaseExecutor.success') as success_mock:
+            for _ in range(3):
+                clock.advance(30)
+                executor.sync()
+        self.assertListEqual([mock.call(('dag', 'task', 1)), mock.call(('dag', 'task', 2))],
+                             sorted(success_mock.call_args_list))
+        fail_mock.assert_called_once_with(('dag', 'task', 0))
+        self.assertEqual(0, len(executor.active_workers))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    def test_failed_pending_job(self, fail_mock):
+        """Test that a held job that fails to submit is retried, then failed, without holding back the status sync"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+        submit_job = fake_batch.submit_job
+
+        def failing_submit_job(**kwargs):
+            if kwargs['containerOverrides']['command'][-1] == '2':
+                raise ValueError('UnitTest Failure - Please ignore')
+            return submit_job(**kwargs)
+
+        fake_batch.submit_job = failing_submit_job
+        with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__PACK_SIZE': '2'}), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+        for i in range(3):
+            executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+        for attempt in range(1, AwsBatchExecutor.MAX_SUBMIT_JOB_ATTEMPTS):
+            executor.sync()
+            self.assertEqual(attempt, fake_batch.calls['DescribeJobs'])
+            self.assertListEqual([('dag', 'task', 2)], [queued_job.key for queued_job in executor.pending_jobs])
+            self.assertFalse(fail_mock.called)
+        executor.sync()
+        self.assertListEqual([], executor.pending_jobs)
+        fail_mock.assert_called_once_with(('dag', 'task', 2))
+        self.assertEqual(1, len(executor.active_workers))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    def test_array_jobs(self, fail_mock):
+        """Test that compatible tasks are submitted as array jobs, and that each child is tracked by its own job ID"""
+        for sync_strategy in ('describe_jobs', 'list_jobs'):
+            fail_mock.reset_mock()
+            clock = FakeClock()
+            fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+            with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__ARRAY_SIZE': '3',
+                                              'AIRFLOW__BATCH__SYNC_STRATEGY': sync_strategy}), \
+                    mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+                executor = AwsBatchExecutor()
+                executor.start()
+            for i in range(4):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            self.assertEqual(0, fake_batch.calls['SubmitJob'])
+            executor.sync()
+            # one array job of 3 children, and a lone job
+            self.assertEqual(2, fake_batch.calls['SubmitJob'])
+            array_job = next(job for job in fake_batch.jobs.values() if hasattr(job, 'children'))
+            self.assertDictEqual({'size': 3}, array_job.kwargs['arrayProperties'])
+            self.assertEqual(('dag', 'task', 1), executor.active_workers.id_to_key[array_job.job_id + ':1'])
+            self.assertEqual(4, len(executor.active_workers))
+            fake_batch.jobs[array_job.job_id + ':1'].exit_code = 1
+
+            with mock.patch('airflow.executors.base_executor.BaseExecutor.success') as success_mock:
+                for _ in range(3):
+                    clock.advance(30)
+                    executor.sync()
+            self.assertListEqual([mock.call(('dag', 'task', i)) for i in (0, 2, 3)],
+                                 sorted(success_mock.call_args_list))
+            fail_mock.assert_called_once_with(('dag', 'task', 1))
+            self.assertEqual(0, len(executor.active_workers))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    def test_queue_routes(self, fail_mock):
+        """Test that routed queues are submitted, described and listed with their own kwargs and client"""
+        for sync_strategy in ('describe_jobs', 'list_jobs'):
+            clock = FakeClock()
+            fake_clients = {region: FakeBatchClient(clock=clock, seed=seed, queue_seconds=10, run_seconds=60)
+                            for seed, region in enumerate(('us-west-1', 'us-east-2'))}
+            env = {
+                'AIRFLOW__BATCH__QUEUE_ROUTES': 'tests.test_batch_executor.QUEUE_ROUTES',
+                'AIRFLOW__BATCH__SYNC_STRATEGY': sync_strategy,
+            }
+            with mock.patch.dict(os.environ, env), \
+                    mock.patch('airflow_aws_executors.batch_executor.boto3.client',
+                               side_effect=lambda service, region_name: fake_clients[region_name]):
+                executor = AwsBatchExecutor()
+                executor.start()
+            for queue in ('default', 'heavy', 'remote'):
+                executor.execute_async(('dag', queue, 1), ['airflow', 'tasks', 'run', queue], queue=queue)
+
+            local_jobs = {job.kwargs['jobQueue']: job.kwargs for job in fake_clients['us-west-1'].jobs.values()}
+            self.assertSetEqual({'some-job-queue', 'heavy-job-queue'}, set(local_jobs))
+            self.assertEqual('heavy-job-def', local_jobs['heavy-job-queue']['jobDefinition'])
+            remote_job_id = next(iter(fake_clients['us-east-2'].jobs))
+            self.assertEqual('remote', executor.active_workers.queue_by_id(remote_job_id))
+
+            with mock.patch('airflow.executors.base_executor.BaseExecutor.success') as success_mock:
+                for _ in range(3):
+                    clock.advance(30)
+                    executor.sync()
+            self.assertListEqual([mock.call(('dag', queue, 1)) for queue in ('default', 'heavy', 'remote')],
+                                 sorted(success_mock.call_args_list))
+            self.assertEqual(0, len(executor.active_workers))
+        fail_mock.assert_not_called()
+
+    def test_route_clients_per_thread(self):
+        """Test that submitter threads submit routed jobs with their own clients of the route's region"""
+        clock = FakeClock()
+        route_clients = {region: FakeBatchClient(clock=clock, seed=seed)
+                         for seed, region in enumerate(('us-west-1', 'us-east-2'))}
+        env = {'AIRFLOW__BATCH__QUEUE_ROUTES': 'tests.test_batch_executor.QUEUE_ROUTES'}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client',
+                           side_effect=lambda service, region_name: route_clients[region_name]):
+            executor = AwsBatchExecutor()
+            executor.start()
+        thread_clients = {region: FakeBatchClient(clock=clock, seed=seed + 2)
+                          for seed, region in enumerate((None, 'us-east-2'))}
+        executor.submit_pool = BotoClientPool(lambda region=None: thread_clients[region], 1)
+        for queue in ('default', 'heavy', 'remote'):
+            executor.execute_async(('dag', queue, 1), ['airflow', 'tasks', 'run', queue], queue=queue)
+        wait(list(executor.pending_submissions))
+        executor.submit_pool.shutdown()
+
+        self.assertEqual(2, len(thread_clients[None].jobs))
+        self.assertEqual(1, len(thread_clients['us-east-2'].jobs))
+        self.assertFalse(any(client.jobs for client in route_clients.values()))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    def test_task_timeline(self, fail_mock):
+        """Test that failed submissions, status changes and the final state of every job are recorded"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=30, run_seconds=60, failure_rate=1.0)
+        events = []
+        with mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+        executor.submit_pool = BotoClientPool(lambda: fake_batch, 1)
+        executor.timeline = TaskTimeline(events.append, 'batch', clock=clock)
+        submit_job = fake_batch.submit_job
+        submit_errors = [ClientError({'Error': {'Code': 'ServerException'}}, 'SubmitJob')]
+
+        def flaky_submit_job(**kwargs):
+            """The first submission fails"""
+            if submit_errors:
+                raise submit_errors.pop()
+            return submit_job(**kwargs)
+        fake_batch.submit_job = flaky_submit_job
+        executor.execute_async(('dag', 'task', 0), ['airflow', 'tasks', 'run'])
+        for _ in range(6):
+            wait(list(executor.pending_submissions))
+            clock.advance(20)
+            executor.sync()
+        executor.end(heartbeat_interval=0)
+
+        self.assertListEqual(['queued', 'launch_failed', 'launched', 'running', 'stopped', 'finished'],
+                             [event['event'] for event in events])
+        self.assertEqual('ServerException', events[1]['reason'])
+        self.assertEqual(events[2]['job_id'], events[4]['job_id'])
+        self.assertEqual('failed', events[5]['state'])
+        fail_mock.assert_called_once_with(('dag', 'task', 0))
+        self.assertDictEqual({
+            'pending': 20, 'launch_retries': 20, 'provisioning': 20, 'runtime': 50, 'detection': 10, 'reporting': 0,
+            'total': 120
+        }, breakdown(events))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_journal_restart(self, success_mock, fail_mock):
+        """Test that a restarted executor adopts the journaled jobs instead of resubmitting them"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = {'AIRFLOW__BATCH__STATE_JOURNAL': os.path.join(directory, 'journal.sqlite')}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+            for i in range(10):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            executor.sync()
+            clock.advance(100)
+            executor.sync()
+            executor.execute_async(('dag', 'task', 10), ['airflow', 'tasks', 'run', '10'])
+            executor.sync()
+            clock.advance(20)
+
+            # the scheduler restarts without ending the executor
+            restarted_executor = AwsBatchExecutor()
+            restarted_executor.start()
+
+        self.assertEqual(11, fake_batch.calls['SubmitJob'])
+        self.assertEqual(10, success_mock.call_count)
+        self.assertEqual(1, len(restarted_executor.active_workers))
+        self.assertSetEqual({('dag', 'task', 10)}, restarted_executor.running)
+        tracked_ti, untracked_ti = mock.Mock(key=('dag', 'task', 10)), mock.Mock(key=('dag', 'task', 1))
+        self.assertListEqual([untracked_ti], restarted_executor.try_adopt_task_instances([tracked_ti, untracked_ti]))
+
+        clock.advance(60)
+        restarted_executor.sync()
+        self.assertEqual(11, success_mock.call_count)
+        self.assertEqual(0, len(restarted_executor.active_workers))
+
+    def test_adopt_by_tags(self):
+        """Test that orphaned task instances are adopted by the tags of the jobs that were submitted for them"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__ADOPT_BY_TAGS': 'True'}), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+            for i in range(5):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            clock.advance(100)
+            # this job finishes before the other scheduler takes over
+            executor.execute_async(('dag', 'task', 5), ['airflow', 'tasks', 'run', '5'])
+            clock.advance(20)
+
+            adopting_executor = AwsBatchExecutor()
+            adopting_executor.start()
+        self.assertDictEqual({'airflow.key0': 'dag', 'airflow.key1': 'task', 'airflow.key2': '0'},
+                             fake_batch.jobs[executor.active_workers.key_to_id[('dag', 'task', 0)]].kwargs['tags'])
+
+        tis = [mock.Mock(key=('dag', 'task', i)) for i in range(6)]
+        self.assertListEqual(tis[:5], adopting_executor.try_adopt_task_instances(tis))
+        self.assertDictEqual({('dag', 'task', 5): executor.active_workers.key_to_id[('dag', 'task', 5)]},
+                             adopting_executor.active_workers.key_to_id)
+        self.assertSetEqual({('dag', 'task', 5)}, adopting_executor.running)
+
+    def test_adopt_packs_by_tags(self):
+        """Test that packs are adopted by the tags of their tasks, and that array jobs can't be adopted by tags"""
+        clock = FakeClock()
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__ADOPT_BY_TAGS': 'True', 'AIRFLOW__BATCH__PACK_SIZE': '2'}), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+            for i in range(3):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            executor.sync()
+            clock.advance(20)
+
+            adopting_executor = AwsBatchExecutor()
+            adopting_executor.start()
+            with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__ARRAY_SIZE': '3'}), self.assertRaises(ValueError):
+                AwsBatchExecutor().start()
+
+        tis = [mock.Mock(key=('dag', 'task', i), queue='default') for i in range(3)]
+        self.assertListEqual([], adopting_executor.try_adopt_task_instances(tis))
+        self.assertSetEqual(set(executor.active_workers.key_to_id), set(adopting_executor.active_workers.key_to_id))
+        self.assertSetEqual({ti.key for ti in tis}, adopting_executor.running)
+
+        fake_batch.jobs[executor.active_workers.key_to_id[TaskPack((('dag', 'task', 0), ('dag', 'task', 1)))]] \
+            .exit_code = pack_exit_code(0b10)
+        clock.advance(60)
+        with mock.patch('airflow.executors.base_executor.BaseExecutor.success') as success_mock, \
+                mock.patch('airflow.executors.base_executor.BaseExecutor.fail') as fail_mock:
+            adopting_executor.sync()
+        self.assertListEqual([mock.call(('dag', 'task', 0)), mock.call(('dag', 'task', 2))],
+                             sorted(success_mock.call_args_list))
+        fail_mock.assert_called_once_with(('dag', 'task', 1))
+
+    def test_pipelined_execute(self):
+        """Test that the submission pipeline only enqueues jobs, and registers them on sync"""
+        self.executor.submit_pool = BotoClientPool(lambda: self.executor.batch, 4)
+        self.executor.batch.submit_job.side_effect = lambda **kwargs: {
+            'jobId': 'ID-' + kwargs['containerOverrides']['command'][-1],
+            'jobName': kwargs['jobName']
+        }
+        self.executor.batch.describe_jobs.return_value = {'jobs': []}
+
+        for i in range(10):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run', str(i)])
+        self.assertEqual(0, len(self.executor.active_workers))
+        self.assertEqual(10, len(self.executor.pending_submissions))
+
+        wait(list(self.executor.pending_submissions))
+        self.executor.sync()
+
+        # ensure that submit_job is called correctly as defined by Botocore docs
+        self.assertEqual(10, len(self.executor.batch.submit_job.call_args_list))
+        for call_args in self.executor.batch.submit_job.call_args_list:
+            self.assert_botocore_call('SubmitJob', *call_args)
+        # every submitted job is stored in active workers
+        self.assertEqual(0, len(self.executor.pending_submissions))
+        self.assertListEqual(sorted(self.executor.active_workers.get_all_jobs()),
+                             sorted('ID-' + str(i) for i in range(10)))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    def test_failed_pipelined_execute(self, fail_mock):
+        """Test that failed submissions are retried, and eventually failed"""
+        self.executor.submit_pool = BotoClientPool(lambda: self.executor.batch, 2)
+        self.executor.batch.submit_job.side_effect = Exception('UnitTest Failure - Please ignore')
+        airflow_key = mock.Mock(spec=tuple)
+        self.executor.execute_async(airflow_key, ['airflow', 'tasks', 'run'])
+
+        for attempt in range(1, AwsBatchExecutor.MAX_SUBMIT_JOB_ATTEMPTS):
+            wait(list(self.executor.pending_submissions))
+            self.executor.sync()
+            # task is resubmitted, and not failed
+            self.assertEqual(1, len(self.executor.pending_submissions))
+            self.assertFalse(fail_mock.called)
+
+        # Last attempt should fail the task
+        wait(list(self.executor.pending_submissions))
+        self.executor.sync()
+        self.assertEqual(AwsBatchExecutor.MAX_SUBMIT_JOB_ATTEMPTS, self.executor.batch.submit_job.call_count)
+        self.assertEqual(0, len(self.executor.pending_submissions))
+        self.assertEqual(0, len(self.executor.active_workers))
+        fail_mock.assert_called_once_with(airflow_key)
+
     @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
     @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
     def test_sync(self, success_mock, fail_mock):
@@ -147,6 +613,159 @@ class TestAwsBatchExecutor(TestCase):
         fail_mock.assert_called_once()
         self.assertFalse(success_mock.called)
 
+    def test_submit_job_kwargs(self):
+        """Test that SubmitJob kwargs are identical to a deep copy of the template with overrides"""
+        self.executor.submit_job_kwargs = deepcopy(self.executor.submit_job_kwargs)
+        self.executor.submit_job_kwargs['retryStrategy'] = {'attempts': 3}
+        self.executor.submit_job_kwargs['containerOverrides']['environment'] = [{'name': 'X', 'value': 'Y'}]
+        for exec_config in ({}, {'vcpus': 1, 'memory': 512}, {'environment': [{'name': 'A', 'value': '1'}]}):
+            expected = deepcopy(self.executor.submit_job_kwargs)
+            expected['containerOverrides'].update(exec_config)
+            expected['containerOverrides']['command'] = ['airflow', 'tasks', 'run']
+
+            for _ in range(2):
+                submit_job_kwargs = self.executor._submit_job_kwargs(  # pylint: disable=protected-access
+                    ('key',), ['airflow', 'tasks', 'run'], None, exec_config
+                )
+                self.assertEqual(json.dumps(expected), json.dumps(submit_job_kwargs))
+                self.assert_botocore_call('SubmitJob', (), submit_job_kwargs)
+
+    def test_tiered_sync(self):
+        """Test that running jobs are only described once they're due, and that end() sweeps everything"""
+        now = 0
+        self.executor.status_poller = StatusPollingScheduler({'running': [(0, 60)]}, clock=lambda: now)
+        mocked_job_json = self.__mock_sync()
+        mocked_job_json['status'] = 'RUNNING'
+
+        self.executor.sync()
+        self.executor.sync()
+        self.assertEqual(1, self.executor.batch.describe_jobs.call_count)
+        now = 60
+        self.executor.sync()
+        self.assertEqual(2, self.executor.batch.describe_jobs.call_count)
+
+        mocked_job_json['status'] = 'SUCCEEDED'
+        self.executor.end(heartbeat_interval=0)
+        self.assertEqual(3, self.executor.batch.describe_jobs.call_count)
+        self.assertEqual(0, len(self.executor.active_workers))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_list_jobs_sync(self, success_mock, fail_mock):
+        """Test that the list_jobs strategy pages ListJobs, and only describes finished active jobs"""
+        self.executor.sync_strategy = 'list_jobs'
+        # the first sync is a full reconciliation
+        self.executor.last_full_sync = time.monotonic()
+        for job_id in ('AAA', 'BBB', 'CCC'):
+            self.executor.active_workers.add_job(job_id, ('key', job_id))
+        pages = {
+            ('SUCCEEDED', None): {'jobSummaryList': [{'jobId': 'XXX', 'jobName': 'n'}], 'nextToken': 'page-2'},
+            ('SUCCEEDED', 'page-2'): {'jobSummaryList': [{'jobId': 'AAA', 'jobName': 'n'}]},
+            ('FAILED', None): {'jobSummaryList': [{'jobId': 'BBB', 'jobName': 'n'}, {'jobId': 'YYY', 'jobName': 'n'}]},
+        }
+        self.executor.batch.list_jobs.side_effect = lambda **kwargs: pages[
+            (kwargs['jobStatus'], kwargs.get('nextToken'))
+        ]
+        self.executor.batch.describe_jobs.side_effect = lambda jobs: {'jobs': [
+            {'jobId': job_id, 'status': 'SUCCEEDED' if job_id == 'AAA' else 'FAILED'} for job_id in jobs
+        ]}
+
+        self.executor.sync()
+
+        # ensure that list_jobs is called correctly as defined by Botocore docs
+        self.assertEqual(3, self.executor.batch.list_jobs.call_count)
+        for call_args in self.executor.batch.list_jobs.call_args_list:
+            self.assert_botocore_call('ListJobs', *call_args)
+            self.assertEqual('some-job-queue', call_args[1]['jobQueue'])
+        # only finished jobs that are active are described
+        self.executor.batch.describe_jobs.assert_called_once_with(jobs=['AAA', 'BBB'])
+        success_mock.assert_called_once_with(('key', 'AAA'))
+        fail_mock.assert_called_once_with(('key', 'BBB'))
+        self.assertListEqual(['CCC'], self.executor.active_workers.get_all_jobs())
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_list_jobs_created_after(self, success_mock):
+        """Test that ListJobs only lists the jobs created after the oldest tracked one, and that everything is
+        periodically reconciled"""
+        clock = FakeClock(1600000000)
+        fake_batch = FakeBatchClient(clock=clock, queue_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__BATCH__SYNC_STRATEGY': 'list_jobs'}), \
+                mock.patch('airflow_aws_executors.batch_executor.boto3.client', return_value=fake_batch):
+            executor = AwsBatchExecutor()
+            executor.start()
+        executor.wall_clock = clock
+        # the job queue's history
+        for i in range(5):
+            fake_batch.submit_job(jobName='old', jobQueue='some-job-queue', jobDefinition='some-job-def')
+            clock.advance(1000)
+        executor.execute_async(('dag', 'task', 0), ['airflow', 'tasks', 'run', '0'])
+        self.assertEqual(1600005000 * 1000, executor.active_workers.oldest_created_at())
+
+        # the first sync is a full reconciliation
+        executor.sync()
+        self.assertEqual(0, fake_batch.calls['ListJobs'])
+        self.assertEqual(1, fake_batch.calls['DescribeJobs'])
+
+        list_jobs = mock.Mock(side_effect=fake_batch.list_jobs)
+        with mock.patch.object(fake_batch, 'list_jobs', list_jobs):
+            clock.advance(30)
+            executor.sync()
+            self.assertEqual(1, fake_batch.calls['DescribeJobs'])
+            clock.advance(60)
+            executor.sync()
+        self.assertEqual(2, list_jobs.call_count)
+        for call_args in list_jobs.call_args_list:
+            self.assert_botocore_call('ListJobs', *call_args)
+            self.assertListEqual([{'name': 'AFTER_CREATED_AT', 'values': [str((1600005000 - 300) * 1000)]}],
+                                 call_args[1]['filters'])
+            self.assertNotIn('jobStatus', call_args[1])
+        success_mock.assert_called_once_with(('dag', 'task', 0))
+
+        # a job that ListJobs never reports as finished is found by the next full reconciliation
+        executor.execute_async(('dag', 'task', 1), ['airflow', 'tasks', 'run', '1'])
+        clock.advance(100)
+        with mock.patch.object(fake_batch, 'list_jobs', return_value={'jobSummaryList': []}):
+            executor.sync()
+            self.assertEqual(1, len(executor.active_workers))
+            executor.last_full_sync -= executor.full_sync_interval
+            executor.sync()
+        self.assertEqual(0, len(executor.active_workers))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_sync_only_handles_transitions(self, success_mock):
+        """Test that jobs are only handled when they change status, and that stuck RUNNABLE jobs are logged once"""
+        clock = FakeClock()
+        self.executor.active_workers = BatchJobCollection(clock=clock)
+        self.executor.max_runnable_seconds = 60
+        mocked_job_json = self.__mock_sync()
+        mocked_job_json['status'] = 'RUNNABLE'
+
+        with mock.patch.object(BatchJob, 'get_job_state', autospec=True, side_effect=BatchJob.get_job_state) as state:
+            self.executor.sync()
+            self.executor.sync()
+            self.assertEqual(1, state.call_count)
+        self.assertDictEqual({'RUNNABLE': 1}, self.executor.active_workers.count_by_status())
+
+        clock.advance(61)
+        with mock.patch.object(self.executor.log, 'warning') as warning_mock:
+            self.executor.sync()
+            self.executor.sync()
+        warning_mock.assert_called_once()
+        self.assertSetEqual({'ABC'}, self.executor.stuck_job_ids)
+
+        mocked_job_json['status'] = 'SUCCEEDED'
+        self.executor.sync()
+        success_mock.assert_called_once()
+        self.assertSetEqual(set(), self.executor.stuck_job_ids)
+        self.assertDictEqual({}, self.executor.active_workers.count_by_status())
+
+    def test_invalid_sync_api(self):
+        """Test that DescribeJobs responses of an unexpected shape raise a BatchError"""
+        self.__mock_sync()
+        self.executor.batch.describe_jobs.return_value = {'jobs': [{'jobId': 'ABC'}]}
+        with self.assertRaises(BatchError):
+            self.executor.sync()
+
     def test_terminate(self):
         """Test that executor can shut everything down; forcing all tasks to unnaturally exit"""
         mocked_job_json = self.__mock_sync()
@@ -0,0 +1,61 @@
+import threading
+from unittest import TestCase
+
+from airflow_aws_executors.concurrency import BotoClientPool
+
+
+class TestBotoClientPool(TestCase):
+    """Tests the BotoClientPool"""
+    def test_client_per_thread(self):
+        """Every worker thread builds exactly one client, and re-uses it"""
+        created = []
+        lock = threading.Lock()
+
+        def client_factory():
+            with lock:
+                created.append(threading.current_thread().name)
+            return threading.current_thread().name
+
+        pool = BotoClientPool(client_factory, 4)
+        results = pool.map(lambda client, item: (client, threading.current_thread().name, item), range(100))
+        pool.shutdown()
+
+        # results maintain order & each call got the client belonging to its thread
+        self.assertListEqual([item for _, _, item in results], list(range(100)))
+        for client, thread_name, _ in results:
+            self.assertEqual(client, thread_name)
+        self.assertEqual(len(created), len(set(created)))
+        self.assertLessEqual(len(created), 4)
+
+    def test_client_per_region(self):
+        """Workers build a client per region, and re-use them"""
+        created = []
+        lock = threading.Lock()
+
+        def client_factory(region='default'):
+            with lock:
+                created.append((threading.current_thread().name, region))
+            return region
+
+        pool = BotoClientPool(client_factory, 1)
+        futures = [pool.submit(lambda client, item: (client, item), i, region=region)
+                   for i, region in enumerate([None, 'us-east-2', None, 'us-east-2'])]
+        self.assertListEqual([('default', 0), ('us-east-2', 1), ('default', 2), ('us-east-2', 3)],
+                             [future.result() for future in futures])
+        pool.shutdown()
+        self.assertListEqual(['default', 'us-east-2'], [region for _, region in created])
+
+    def test_exceptions_propagate(self):
+        """The first error raised on a worker is re-raised to the caller"""
+        def fail(client, item):
+            raise KeyError(item)
+
+        pool = BotoClientPool(object, 2)
+        with self.assertRaises(KeyError):
+            pool.map(fail, [1, 2, 3])
+        pool.shutdown()
+
+    def test_invalid_size(self):
+        """A pool without workers can never make progress"""
+        with self.assertRaises(ValueError):
+            BotoClientPool(object, 0)
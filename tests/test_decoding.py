@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from marshmallow import ValidationError
+
+from airflow_aws_executors.decoding import load_list, load_member, load_object
+
+
+class TestDecoding(TestCase):
+    """Tests the Botocore decoding helpers"""
+    def test_load_member(self):
+        """Members are type-checked, and optional members default to None"""
+        data = {'name': 'AAA', 'exitCode': 0, 'flag': True}
+        self.assertEqual('AAA', load_member(data, 'name', str, required=True))
+        self.assertEqual(0, load_member(data, 'exitCode', int))
+        self.assertIsNone(load_member(data, 'missing', str))
+        with self.assertRaises(ValidationError):
+            load_member(data, 'missing', str, required=True)
+        with self.assertRaises(ValidationError):
+            load_member(data, 'name', int)
+        # booleans are not integers in Botocore
+        with self.assertRaises(ValidationError):
+            load_member(data, 'flag', int)
+
+    def test_error_paths(self):
+        """Errors are keyed by the path of the offending member"""
+        with self.assertRaises(ValidationError) as ctx:
+            load_member({}, 'taskArn', str, required=True, path='tasks.0.')
+        self.assertIn('tasks.0.taskArn', ctx.exception.messages)
+
+    def test_load_object_and_list(self):
+        """Structures must be dictionaries, and optional lists default to empty"""
+        self.assertDictEqual({}, load_object({}))
+        with self.assertRaises(ValidationError):
+            load_object([])
+        self.assertListEqual([], load_list({}, 'tasks'))
+        with self.assertRaises(ValidationError):
+            load_list({'tasks': {}}, 'tasks')
@@ -1,12 +1,43 @@
 import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+import time
+from copy import deepcopy
 from unittest import TestCase, mock
 
+from airflow_aws_executors.admission import CapacityAdmissionController
+from airflow_aws_executors.concurrency import BotoClientPool
+from airflow_aws_executors.failover import FAILOVER, PRIMARY, CapacityFailover
+from airflow_aws_executors.metrics import ExecutorMetrics
+from airflow_aws_executors.packing import TaskPack, pack_exit_code
+from airflow_aws_executors.polling import StatusPollingScheduler
+from airflow_aws_executors.relaunch import RelaunchScheduler
+from airflow_aws_executors.timeline import breakdown, load_timelines
+from airflow_aws_executors.worker import run_worker
 from airflow_aws_executors.ecs_fargate_executor import (
-    AwsEcsFargateExecutor, BotoTaskSchema, EcsFargateTask, EcsFargateTaskCollection
+    AwsEcsFargateExecutor, BotoDescribeTasksSchema, BotoTaskSchema, EcsFargateError, EcsFargateTask,
+    EcsFargateTaskCollection, load_tasks_response
 )
 from airflow.utils.state import State
+from botocore.exceptions import ClientError
+from marshmallow import ValidationError
 
 from .botocore_helper import get_botocore_model, assert_botocore_call
+from .fake_aws import FakeClock, FakeEcsClient
+
+# Routes for test_queue_routes
+QUEUE_ROUTES = {
+    'heavy': {
+        'cluster': 'heavy-cluster',
+        'taskDefinition': 'heavy-task-def',
+        'launchType': None,
+        'capacityProviderStrategy': [{'capacityProvider': 'FARGATE_SPOT', 'weight': 1}]
+    },
+    'remote': {'region': 'us-east-2', 'cluster': 'remote-cluster'},
+}
+ON_DEMAND = [{'capacityProvider': 'FARGATE', 'weight': 1}]
 
 
 class TestEcsTaskCollection(TestCase):
@@ -46,6 +77,17 @@ class TestEcsTaskCollection(TestCase):
         self.assertEqual(self.collection.pop_by_key(self.first_airflow_key), self.first_task)
         self.assertNotIn('001', self.collection.get_all_arns())
 
+    def test_relaunch(self):
+        """Test that adding a new ARN for an Airflow task drops its previous ARN"""
+        relaunched_task = mock.Mock(spec=EcsFargateTask)
+        relaunched_task.task_arn = '003'
+        self.collection.add_task(relaunched_task, self.first_airflow_key, self.first_airflow_queue,
+                                 self.first_airflow_cmd, self.first_airflow_exec_config)
+        self.assertEqual(len(self.collection), 2)
+        self.assertListEqual(self.collection.get_all_arns(), ['003', '002'])
+        self.assertFalse(self.collection.has_arn('001'))
+        self.assertEqual(self.collection.task_by_key(self.first_airflow_key), relaunched_task)
+
     def test_update(self):
         """Test update_task"""
         # update arn with new task object
@@ -153,6 +195,61 @@ class TestEcsFargateTask(TestCase):
             self.assertEqual(State.FAILED, failed_task.get_task_state())
 
 
+class TestEcsFargateDecoding(TestCase):
+    """Tests that the low-overhead decoders are equivalent to the marshmallow schemas"""
+    def test_equivalent_to_schema(self):
+        """Decoded tasks and failures match the marshmallow schemas"""
+        boto_response = {
+            'tasks': [{
+                'taskArn': 'AAA',
+                'lastStatus': 'STOPPED',
+                'desiredStatus': 'STOPPED',
+                'startedAt': dt.datetime.now(),
+                'stoppedAt': dt.datetime.now(),
+                'stoppedReason': 'Essential container in task exited',
+                'cpu': '256',
+                'containers': [
+                    {'name': 'some-ecs-container', 'lastStatus': 'STOPPED', 'exitCode': 0, 'image': 'busybox'},
+                    {'name': 'some-sidecar'}
+                ]
+            }, {
+                'taskArn': 'BBB',
+                'lastStatus': 'PROVISIONING',
+                'desiredStatus': 'RUNNING',
+                'containers': []
+            }],
+            'failures': [{'arn': 'CCC', 'reason': 'MISSING', 'detail': 'UnitTest Failure - Please ignore'}]
+        }
+        expected = BotoDescribeTasksSchema().load(boto_response)
+        actual = load_tasks_response(boto_response)
+
+        self.assertListEqual(expected['failures'], actual['failures'])
+        self.assertEqual(len(expected['tasks']), len(actual['tasks']))
+        for expected_task, actual_task in zip(expected['tasks'], actual['tasks']):
+            for attr in EcsFargateTask.__slots__:
+                self.assertEqual(getattr(expected_task, attr), getattr(actual_task, attr))
+            self.assertEqual(expected_task.get_task_state(), actual_task.get_task_state())
+
+    def test_invalid_shapes(self):
+        """Shapes that fail the marshmallow schemas also fail the decoders"""
+        valid_task = {'taskArn': 'AAA', 'lastStatus': 'RUNNING', 'desiredStatus': 'RUNNING', 'containers': []}
+        invalid_responses = [
+            [],
+            {'tasks': []},
+            {'failures': []},
+            {'tasks': [{'taskArn': 'AAA'}], 'failures': []},
+            {'tasks': [dict(valid_task, lastStatus=None)], 'failures': []},
+            {'tasks': [dict(valid_task, containers=[{'lastStatus': 'RUNNING'}])], 'failures': []},
+            {'tasks': [dict(valid_task, containers=[{'name': 'x', 'exitCode': 'zero'}])], 'failures': []},
+            {'tasks': [valid_task], 'failures': [{'arn': 1}]},
+        ]
+        for boto_response in invalid_responses:
+            with self.assertRaises(ValidationError):
+                BotoDescribeTasksSchema().load(boto_response)
+            with self.assertRaises(ValidationError):
+                load_tasks_response(boto_response)
+
+
 class TestAwsEcsFargateExecutor(TestCase):
     """Tests the AWS ECS Executor itself"""
     def test_execute(self):
@@ -205,6 +302,124 @@ class TestAwsEcsFargateExecutor(TestCase):
             # task is not stored in active workers
             self.assertEqual(len(self.executor.active_workers), 0)
 
+    def test_concurrent_execute(self):
+        """Test that RunTask calls are issued on the launch pool, and failed launches are requeued"""
+        def run_task(**kwargs):
+            """Every even task launches, every odd task is out of capacity"""
+            i = int(kwargs['overrides']['containerOverrides'][0]['command'][-1])
+            if i % 2:
+                return {'tasks': [], 'failures': [{'arn': str(i), 'reason': 'RESOURCE:MEMORY'}]}
+            return {'tasks': [{'taskArn': str(i), 'lastStatus': '', 'desiredStatus': '', 'containers': []}],
+                    'failures': []}
+        self.executor.ecs.run_task.side_effect = run_task
+        self.executor.launch_pool = BotoClientPool(lambda: self.executor.ecs, 4)
+
+        for i in range(20):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run', str(i)])
+        self.executor.attempt_task_runs()
+
+        # ensure that run_task is called correctly as defined by Botocore docs
+        self.assertEqual(20, len(self.executor.ecs.run_task.call_args_list))
+        for call_args in self.executor.ecs.run_task.call_args_list:
+            self.assert_botocore_call('RunTask', *call_args)
+        # launched tasks are stored in active workers, the rest are requeued in order
+        self.assertListEqual(sorted(self.executor.active_workers.get_all_arns(), key=int),
+                             [str(i) for i in range(0, 20, 2)])
+        self.assertListEqual([task.key for task in self.executor.pending_tasks], [('key', i) for i in range(1, 20, 2)])
+
+    def test_capacity_admission(self):
+        """Test that capacity failures hold back launches, and that a single probe releases the queue"""
+        now = 0
+        self.executor.capacity_admission = CapacityAdmissionController(initial_backoff=10, clock=lambda: now)
+        self.executor.ecs.run_task.return_value = {'tasks': [], 'failures': [{'arn': '001', 'reason': 'AGENT'}]}
+        for i in range(20):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run', str(i)])
+
+        # launches stop at the first capacity failure
+        self.executor.attempt_task_runs()
+        self.assertEqual(1, self.executor.ecs.run_task.call_count)
+        self.executor.attempt_task_runs()
+        self.assertEqual(1, self.executor.ecs.run_task.call_count)
+
+        # a failed probe backs off for twice as long
+        now = 10
+        self.executor.attempt_task_runs()
+        self.assertEqual(2, self.executor.ecs.run_task.call_count)
+        now = 29
+        self.executor.attempt_task_runs()
+        self.assertEqual(2, self.executor.ecs.run_task.call_count)
+
+        # a successful probe releases the rest of the queue
+        now = 30
+        self.executor.ecs.run_task.side_effect = lambda **kwargs: {'tasks': [{
+            'taskArn': kwargs['overrides']['containerOverrides'][0]['command'][-1], 'lastStatus': '',
+            'desiredStatus': '', 'containers': []
+        }], 'failures': []}
+        self.executor.attempt_task_runs()
+        self.assertEqual(22, self.executor.ecs.run_task.call_count)
+        self.assertEqual(20, len(self.executor.active_workers))
+        self.assertEqual(0, len(self.executor.pending_tasks))
+
+    def test_concurrent_execute_api_error(self):
+        """Test that tasks whose RunTask call raised are requeued before the error is re-raised"""
+        self.executor.ecs.run_task.side_effect = Exception('UnitTest Failure - Please ignore')
+        self.executor.launch_pool = BotoClientPool(lambda: self.executor.ecs, 2)
+        for i in range(3):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run'])
+
+        with self.assertRaises(Exception):
+            self.executor.attempt_task_runs()
+        self.assertEqual(3, len(self.executor.pending_tasks))
+        self.assertEqual(0, len(self.executor.active_workers))
+
+    def test_execute_api_error(self):
+        """Test that a task whose RunTask call raised is requeued, and that the rest are still launched"""
+        def run_task(**kwargs):
+            i = kwargs['overrides']['containerOverrides'][0]['command'][-1]
+            if i == '0':
+                raise Exception('UnitTest Failure - Please ignore')
+            return {'tasks': [{'taskArn': i, 'lastStatus': '', 'desiredStatus': '', 'containers': []}],
+                    'failures': []}
+        self.executor.ecs.run_task.side_effect = run_task
+        for i in range(3):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run', str(i)])
+
+        with self.assertRaises(Exception):
+            self.executor.attempt_task_runs()
+        self.assertListEqual([('key', 0)], [task.key for task in self.executor.pending_tasks])
+        self.assertListEqual(['1', '2'], sorted(self.executor.active_workers.get_all_arns()))
+
+    def test_concurrent_capacity_admission(self):
+        """Test that launches on the launch pool stop at the first capacity failure too"""
+        self.executor.capacity_admission = CapacityAdmissionController(initial_backoff=10, clock=lambda: 0)
+        self.executor.ecs.run_task.return_value = {'tasks': [], 'failures': [{'arn': '001', 'reason': 'AGENT'}]}
+        self.executor.launch_pool = BotoClientPool(lambda: self.executor.ecs, 1)
+        for i in range(20):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run', str(i)])
+
+        self.executor.attempt_task_runs()
+        # at most the call that was already running when the first one failed is let through
+        self.assertLessEqual(self.executor.ecs.run_task.call_count, 2)
+        self.assertListEqual([task.key for task in self.executor.pending_tasks], [('key', i) for i in range(20)])
+
+    def test_concurrent_execute_bad_response(self):
+        """Test that the tasks launched alongside a malformed RunTask response are tracked before it's raised"""
+        def run_task(**kwargs):
+            i = kwargs['overrides']['containerOverrides'][0]['command'][-1]
+            if i == '1':
+                return {'tasks': [], 'failures': []}
+            return {'tasks': [{'taskArn': i, 'lastStatus': '', 'desiredStatus': '', 'containers': []}],
+                    'failures': []}
+        self.executor.ecs.run_task.side_effect = run_task
+        self.executor.launch_pool = BotoClientPool(lambda: self.executor.ecs, 2)
+        for i in range(4):
+            self.executor.execute_async(('key', i), ['airflow', 'tasks', 'run', str(i)])
+
+        with self.assertRaises(EcsFargateError):
+            self.executor.attempt_task_runs()
+        self.assertListEqual(['0', '2', '3'], sorted(self.executor.active_workers.get_all_arns()))
+        self.assertListEqual([('key', 1)], [task.key for task in self.executor.pending_tasks])
+
     @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
     @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
     def test_sync(self, success_mock, fail_mock):
@@ -246,18 +461,42 @@ class TestAwsEcsFargateExecutor(TestCase):
         fail_mock.assert_called_once()
         self.assertFalse(success_mock.called)
 
+    def test_sync_failure_without_arn(self):
+        """Test that DescribeTasks failures that aren't about a particular task are skipped"""
+        running_task = mock.Mock(spec=EcsFargateTask)
+        running_task.task_arn = 'ABC'
+        running_task.last_status = 'RUNNING'
+        running_task.get_task_state.return_value = State.RUNNING
+        self.executor.active_workers.add_task(running_task, ('dag', 'task', 1), None, ['airflow', 'tasks', 'run'], {})
+        self.executor.ecs.describe_tasks.return_value = {
+            'tasks': [], 'failures': [{'reason': 'Sample Failure', 'detail': 'UnitTest Failure - Please ignore'}]
+        }
+
+        self.executor.sync_running_tasks()
+        self.assertListEqual(['ABC'], self.executor.active_workers.get_all_arns())
+        self.assertEqual(0, len(self.executor.relaunches))
+
     @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
     @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
     def test_failed_sync_api(self, success_mock, fail_mock):
         """Test what happens when ECS sync fails for certain tasks repeatedly"""
-        self.__mock_sync()
-        self.executor.ecs.describe_tasks.return_value = {
+        running_task = mock.Mock(spec=EcsFargateTask)
+        running_task.task_arn = 'ABC'
+        self.executor.active_workers.add_task(running_task, ('dag', 'task', 1), None, ['airflow', 'tasks', 'run'], {})
+        now = 0
+        self.executor.relaunches = RelaunchScheduler(initial_delay=10, jitter=0, clock=lambda: now)
+        self.executor.ecs.describe_tasks.side_effect = lambda tasks, cluster: {
             'tasks': [],
             'failures': [{
-                'arn': 'ABC',
+                'arn': arn,
                 'reason': 'Sample Failure',
                 'detail': 'UnitTest Failure - Please ignore'
-            }]
+            } for arn in tasks]
+        }
+        self.executor.ecs.run_task.side_effect = lambda **kwargs: {
+            'tasks': [{'taskArn': str(self.executor.ecs.run_task.call_count), 'lastStatus': '', 'desiredStatus': '',
+                       'containers': []}],
+            'failures': []
         }
 
         # Call Sync 3 times with failures
@@ -267,8 +506,22 @@ class TestAwsEcsFargateExecutor(TestCase):
             self.assertEqual(self.executor.ecs.describe_tasks.call_count, check_count + 1)
             self.assert_botocore_call('DescribeTasks', *self.executor.ecs.describe_tasks.call_args)
 
-            # Ensure task arn is not removed from active
-            self.assertIn('ABC', self.executor.active_workers.get_all_arns())
+            # The failed ARN is no longer tracked, so it isn't described again while the task waits
+            self.assertEqual(0, len(self.executor.active_workers))
+            self.assertEqual(1, len(self.executor.relaunches))
+            self.executor.sync_running_tasks()
+            self.assertEqual(self.executor.ecs.describe_tasks.call_count, check_count + 1)
+
+            # The task is only relaunched once its backoff has elapsed, which doubles with every failure
+            now += 10 * 2 ** check_count - 1
+            self.executor.attempt_task_runs()
+            self.assertEqual(check_count, self.executor.ecs.run_task.call_count)
+            now += 1
+            self.executor.attempt_task_runs()
+            self.assertEqual(check_count + 1, self.executor.ecs.run_task.call_count)
+            self.assertEqual(check_count + 1, self.executor.active_workers.failure_count_by_key(
+                self.executor.active_workers.get_all_task_keys()[0]
+            ))
 
             # Task is not failed or succeeded
             self.assertFalse(fail_mock.called)
@@ -276,10 +529,692 @@ class TestAwsEcsFargateExecutor(TestCase):
 
         # Last call should fail the task
         self.executor.sync_running_tasks()
-        self.assertNotIn('ABC', self.executor.active_workers.get_all_arns())
+        self.assertEqual(0, len(self.executor.active_workers))
+        self.assertEqual(0, len(self.executor.relaunches))
         self.assertTrue(fail_mock.called)
         self.assertFalse(success_mock.called)
 
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_concurrent_sync(self, success_mock, fail_mock):
+        """Test that DescribeTasks batches are fanned out on the describe pool, and merged back together"""
+        num_tasks = AwsEcsFargateExecutor.DESCRIBE_TASKS_BATCH_SIZE * 2 + 1
+        for i in range(num_tasks):
+            task = mock.Mock(spec=EcsFargateTask)
+            task.task_arn = str(i)
+            self.executor.active_workers.add_task(task, ('key', i), 'queue', ['cmd'], {})
+
+        def describe_tasks(tasks, cluster):
+            """Every odd ARN is a success, every even ARN is missing"""
+            return {
+                'tasks': [{
+                    'taskArn': arn,
+                    'desiredStatus': 'STOPPED',
+                    'lastStatus': 'STOPPED',
+                    'startedAt': dt.datetime.now(),
+                    'containers': [{'name': 'some-ecs-container', 'lastStatus': 'STOPPED', 'exitCode': 0}]
+                } for arn in tasks if int(arn) % 2],
+                'failures': [{'arn': arn, 'reason': 'MISSING'} for arn in tasks if not int(arn) % 2]
+            }
+        self.executor.ecs.describe_tasks.side_effect = describe_tasks
+        self.executor.describe_pool = BotoClientPool(lambda: self.executor.ecs, 3)
+
+        self.executor.sync_running_tasks()
+
+        # one call per batch, all of which adhere to the Botocore docs
+        self.assertEqual(3, len(self.executor.ecs.describe_tasks.call_args_list))
+        for call_args in self.executor.ecs.describe_tasks.call_args_list:
+            self.assert_botocore_call('DescribeTasks', *call_args)
+        # results from every batch are merged back together
+        self.assertEqual(num_tasks // 2, success_mock.call_count)
+        self.assertFalse(fail_mock.called)
+        # missing tasks are no longer tracked, and wait to be relaunched
+        self.assertEqual(0, len(self.executor.active_workers))
+        self.assertEqual(num_tasks - num_tasks // 2, len(self.executor.relaunches))
+
+    def test_run_task_kwargs(self):
+        """Test that RunTask kwargs are identical to a deep copy of the template with overrides"""
+        self.executor.run_task_kwargs = deepcopy(self.executor.run_task_kwargs)
+        self.executor.run_task_kwargs['group'] = 'some-group'
+        self.executor.run_task_kwargs['overrides']['containerOverrides'].insert(0, {'name': 'sidecar', 'command': []})
+        for exec_config in ({}, {'cpu': 256, 'memory': 512}, {'environment': [{'name': 'A', 'value': '1'}]}):
+            expected = deepcopy(self.executor.run_task_kwargs)
+            container = self.executor.get_container(expected['overrides']['containerOverrides'])
+            container['command'] = ['airflow', 'tasks', 'run']
+            container.update(exec_config)
+
+            for _ in range(2):
+                run_task_kwargs = self.executor._run_task_kwargs(  # pylint: disable=protected-access
+                    ('key',), ['airflow', 'tasks', 'run'], None, exec_config
+                )
+                self.assertEqual(json.dumps(expected), json.dumps(run_task_kwargs))
+                self.assert_botocore_call('RunTask', (), run_task_kwargs)
+
+    def test_tiered_sync(self):
+        """Test that running tasks are only described once they're due, and that end() sweeps everything"""
+        now = 0
+        self.executor.status_poller = StatusPollingScheduler({'running': [(0, 60)]}, clock=lambda: now)
+        after_fargate_task = self.__mock_sync()
+        after_fargate_task.update(desiredStatus='RUNNING', lastStatus='RUNNING')
+
+        self.executor.sync_running_tasks()
+        self.executor.sync_running_tasks()
+        self.assertEqual(1, self.executor.ecs.describe_tasks.call_count)
+        now = 60
+        self.executor.sync_running_tasks()
+        self.assertEqual(2, self.executor.ecs.describe_tasks.call_count)
+
+        after_fargate_task.update(desiredStatus='STOPPED', lastStatus='STOPPED')
+        self.executor.end(heartbeat_interval=0)
+        self.assertEqual(3, self.executor.ecs.describe_tasks.call_count)
+        self.assertEqual(0, len(self.executor.active_workers))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_list_tasks_sync(self, success_mock, fail_mock):
+        """Test that the list_tasks strategy only describes stopped tasks, and periodically reconciles everything"""
+        with mock.patch.dict(os.environ, {'AIRFLOW__ECS_FARGATE__SYNC_STRATEGY': 'list_tasks'}):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        executor.ecs = self.executor.ecs
+        # tasks are launched with a startedBy marker
+        run_task_kwargs = executor._run_task_kwargs(('key',), ['airflow'], None, {})  # pylint: disable=protected-access
+        self.assertEqual(AwsEcsFargateExecutor.DEFAULT_STARTED_BY, run_task_kwargs['startedBy'])
+        self.assert_botocore_call('RunTask', (), run_task_kwargs)
+
+        for arn in ('AAA', 'BBB'):
+            task = mock.Mock(spec=EcsFargateTask)
+            task.task_arn = arn
+            executor.active_workers.add_task(task, ('key', arn), None, ['airflow'], {})
+        pages = {
+            None: {'taskArns': ['ZZZ', 'AAA'], 'nextToken': 'page-2'},
+            'page-2': {'taskArns': ['YYY']},
+        }
+        executor.ecs.list_tasks.side_effect = lambda **kwargs: pages[kwargs.get('nextToken')]
+        executor.ecs.describe_tasks.side_effect = lambda tasks, cluster: {'tasks': [{
+            'taskArn': arn,
+            'desiredStatus': 'STOPPED' if arn == 'AAA' else 'RUNNING',
+            'lastStatus': 'STOPPED' if arn == 'AAA' else 'RUNNING',
+            'startedAt': dt.datetime.now(),
+            'containers': [{'name': 'some-ecs-container', 'lastStatus': 'STOPPED', 'exitCode': 0}]
+        } for arn in tasks], 'failures': []}
+
+        # the first sync is a full reconciliation
+        executor.sync_running_tasks()
+        self.assertFalse(executor.ecs.list_tasks.called)
+        self.assertListEqual(['AAA', 'BBB'], executor.ecs.describe_tasks.call_args[1]['tasks'])
+        success_mock.assert_called_once_with(('key', 'AAA'))
+
+        # afterwards, only stopped tasks are described
+        task = mock.Mock(spec=EcsFargateTask)
+        task.task_arn = 'AAA'
+        executor.active_workers.add_task(task, ('key', 'AAA'), None, ['airflow'], {})
+        executor.ecs.describe_tasks.reset_mock()
+        executor.sync_running_tasks()
+        self.assertEqual(2, executor.ecs.list_tasks.call_count)
+        for call_args in executor.ecs.list_tasks.call_args_list:
+            self.assert_botocore_call('ListTasks', *call_args)
+            self.assertEqual('STOPPED', call_args[1]['desiredStatus'])
+            self.assertEqual(AwsEcsFargateExecutor.DEFAULT_STARTED_BY, call_args[1]['startedBy'])
+        executor.ecs.describe_tasks.assert_called_once_with(tasks=['AAA'], cluster='some-cluster')
+
+        # until the next full reconciliation is due
+        executor.last_full_sync = time.monotonic() - executor.full_sync_interval
+        executor.sync_running_tasks()
+        self.assertListEqual(['BBB'], executor.ecs.describe_tasks.call_args[1]['tasks'])
+        self.assertFalse(fail_mock.called)
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_throttled_sync(self, success_mock, fail_mock):
+        """Test that throttled API calls are retried within the heartbeat"""
+        self.__mock_sync()
+        describe_tasks_response = self.executor.ecs.describe_tasks.return_value
+        self.executor.ecs.describe_tasks.return_value = None
+        self.executor.ecs.describe_tasks.side_effect = [
+            ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'DescribeTasks'),
+            describe_tasks_response
+        ]
+        self.executor.rate_limiter.sleep = mock.Mock()
+
+        self.executor.sync_running_tasks()
+        self.assertEqual(2, self.executor.ecs.describe_tasks.call_count)
+        self.assertEqual(0, len(self.executor.active_workers))
+        success_mock.assert_called_once()
+        self.assertEqual(1, self.executor.rate_limiter.stats()['describe_tasks']['throttled'])
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_metrics(self, success_mock):
+        """Test that API latencies, queue depths, failure reasons and the task lifecycle are emitted"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60, max_running=1)
+        stats = mock.Mock()
+        with mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.metrics = ExecutorMetrics('ecs_executor', stats=stats, clock=clock)
+            executor.start()
+        executor.execute_async(('dag', 'task', 0), ['airflow', 'tasks', 'run'])
+        executor.execute_async(('dag', 'task', 1), ['airflow', 'tasks', 'run'])
+        executor.sync()
+        stats.gauge.assert_has_calls([mock.call('ecs_executor.pending_tasks', 1),
+                                      mock.call('ecs_executor.active_tasks', 1)])
+        stats.incr.assert_called_once_with('ecs_executor.run_task_failures.RESOURCE_CPU', 1)
+        for _ in range(2):
+            clock.advance(35)
+            executor.sync()
+        success_mock.assert_called_once_with(('dag', 'task', 0))
+
+        timings = {}
+        for call_args in stats.timing.call_args_list:
+            timings.setdefault(call_args[0][0], []).append(call_args[0][1].total_seconds())
+        # the second task only launched once the first had finished
+        self.assertListEqual([0, 70], timings['ecs_executor.launch_latency'])
+        self.assertListEqual([35], timings['ecs_executor.start_latency'])
+        self.assertListEqual([35], timings['ecs_executor.run_duration'])
+        self.assertEqual(3, len(timings['ecs_executor.sync']))
+        self.assertEqual(fake_ecs.calls['RunTask'], len(timings['ecs_executor.api.run_task']))
+        self.assertEqual(fake_ecs.calls['DescribeTasks'], len(timings['ecs_executor.api.describe_tasks']))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_task_timeline(self, success_mock):
+        """Test that the lifecycle of every task is written to the JSONL task timeline"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60, max_running=1)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'timeline.jsonl')
+        with mock.patch.dict(os.environ, {'AIRFLOW__ECS_FARGATE__TASK_TIMELINE': path}), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        executor.timeline.clock = clock
+        executor.execute_async(('dag', 'task', 0), ['airflow', 'tasks', 'run'])
+        executor.execute_async(('dag', 'task', 1), ['airflow', 'tasks', 'run'])
+        for _ in range(30):
+            clock.advance(6)
+            executor.sync()
+        self.assertEqual(2, success_mock.call_count)
+        executor.end(heartbeat_interval=0)
+
+        with open(path) as timeline_file:
+            timelines = load_timelines(timeline_file)
+        events = timelines[('ecs', ('dag', 'task', 1))]
+        # the second task can't launch until the first has stopped
+        self.assertListEqual(['queued'] + ['launch_failed'] * 12 + ['launched', 'running', 'stopped', 'finished'],
+                             [event['event'] for event in events])
+        self.assertTrue(events[1]['reason'].startswith('RESOURCE:'))
+        self.assertEqual(events[-4]['arn'], events[-3]['arn'])
+        self.assertEqual('success', events[-1]['state'])
+        self.assertDictEqual({
+            'pending': 6, 'launch_retries': 72, 'provisioning': 12, 'runtime': 58, 'detection': 2, 'reporting': 0,
+            'total': 150
+        }, breakdown(events))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_task_packing(self, success_mock, fail_mock):
+        """Test that compatible tasks are launched in packs, and that each task gets its own final state"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__ECS_FARGATE__PACK_SIZE': '3'}), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        for i in range(5):
+            executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+        executor.execute_async(('dag', 'task', 5), ['airflow', 'tasks', 'run', '5'], executor_config={'cpu': 1024})
+        executor.sync()
+        # tasks 0-2, tasks 3-4, and task 5 on its own because of its executor config
+        self.assertEqual(3, fake_ecs.calls['RunTask'])
+        first_pack = TaskPack((('dag', 'task', 0), ('dag', 'task', 1), ('dag', 'task', 2)))
+        self.assertListEqual([first_pack, TaskPack((('dag', 'task', 3), ('dag', 'task', 4))), ('dag', 'task', 5)],
+                             executor.active_workers.get_all_task_keys())
+        task = fake_ecs.tasks[executor.active_workers.task_by_key(first_pack).task_arn]
+        command = task.kwargs['overrides']['containerOverrides'][0]['command']
+        self.assertListEqual(['python', '-m', 'airflow_aws_executors.packing', '--mode', 'concurrent'], command[:5])
+        self.assertEqual(['airflow', 'tasks', 'run', '2'], json.loads(command[-1])[2])
+        # the first pack's second command failed
+        task.exit_code = pack_exit_code(0b010)
+
+        for _ in range(3):
+            clock.advance(30)
+            executor.sync()
+        self.assertListEqual([mock.call(('dag', 'task', i)) for i in (0, 2, 3, 4, 5)],
+                             sorted(success_mock.call_args_list))
+        fail_mock.assert_called_once_with(('dag', 'task', 1))
+        self.assertEqual(0, len(executor.active_workers))
+
+    def test_pending_priority(self):
+        """Test that pending tasks launch by priority weight, and that tasks that fail to launch keep their place"""
+        self.executor.ecs.run_task.return_value = {'tasks': [], 'failures': [{'arn': '', 'reason': 'RESOURCE:CPU'}]}
+        for i, priority in enumerate([1, 1, 10]):
+            task_instance = mock.Mock(key=('dag', i), executor_config={})
+            self.executor.queue_command(task_instance, ['airflow', 'tasks', 'run', str(i)], priority)
+            self.executor.trigger_tasks(open_slots=1)
+        self.assertDictEqual({}, self.executor.task_priorities)
+        # priorities are only kept while tasks are triggered, even for tasks that Airflow holds back or drops
+        self.executor.running.add(('dag', 3))
+        self.executor.queue_command(mock.Mock(key=('dag', 3), executor_config={}), ['airflow'], 5)
+        self.executor.trigger_tasks(open_slots=1)
+        self.assertIn(('dag', 3), self.executor.queued_tasks)
+        self.assertDictEqual({}, self.executor.task_priorities)
+        del self.executor.queued_tasks[('dag', 3)]
+
+        self.executor.attempt_task_runs()
+        self.assertListEqual(['2', '0', '1'], [
+            call_args[1]['overrides']['containerOverrides'][0]['command'][-1]
+            for call_args in self.executor.ecs.run_task.call_args_list
+        ])
+        self.assertListEqual([('dag', 2), ('dag', 0), ('dag', 1)],
+                             [task.key for task in self.executor.pending_tasks])
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_queue_routes(self, success_mock, fail_mock):
+        """Test that routed queues are launched, described and listed with their own kwargs, cluster and client"""
+        for sync_strategy in ('describe_tasks', 'list_tasks'):
+            success_mock.reset_mock()
+            clock = FakeClock()
+            fake_clients = {region: FakeEcsClient(clock=clock, seed=seed, provisioning_seconds=10, run_seconds=60)
+                            for seed, region in enumerate(('us-west-1', 'us-east-2'))}
+            env = {
+                'AIRFLOW__ECS_FARGATE__QUEUE_ROUTES': 'tests.test_ecs_fargate_executor.QUEUE_ROUTES',
+                'AIRFLOW__ECS_FARGATE__SYNC_STRATEGY': sync_strategy,
+            }
+            with mock.patch.dict(os.environ, env), \
+                    mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client',
+                               side_effect=lambda service, region_name: fake_clients[region_name]):
+                executor = AwsEcsFargateExecutor()
+                executor.start()
+            for queue in ('default', 'heavy', 'remote'):
+                executor.execute_async(('dag', queue, 1), ['airflow', 'tasks', 'run', queue], queue=queue)
+            executor.sync()
+
+            local_tasks = {task.kwargs['cluster']: task.kwargs for task in fake_clients['us-west-1'].tasks.values()}
+            self.assertSetEqual({'some-cluster', 'heavy-cluster'}, set(local_tasks))
+            self.assertEqual('FARGATE', local_tasks['some-cluster']['launchType'])
+            self.assertNotIn('launchType', local_tasks['heavy-cluster'])
+            self.assertEqual('heavy-task-def', local_tasks['heavy-cluster']['taskDefinition'])
+            self.assertEqual([{'capacityProvider': 'FARGATE_SPOT', 'weight': 1}],
+                             local_tasks['heavy-cluster']['capacityProviderStrategy'])
+            self.assertEqual(1, fake_clients['us-east-2'].calls['RunTask'])
+
+            for _ in range(3):
+                clock.advance(30)
+                executor.sync()
+            self.assertListEqual([mock.call(('dag', queue, 1)) for queue in ('default', 'heavy', 'remote')],
+                                 sorted(success_mock.call_args_list))
+            fail_mock.assert_not_called()
+            # none of the tasks went missing and were relaunched
+            self.assertEqual(2, fake_clients['us-west-1'].calls['RunTask'])
+            self.assertEqual(0, len(executor.active_workers))
+
+    def test_route_capacity_admission(self):
+        """Test that a route's capacity failures only hold back that route's launches"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=3600,
+                                 unavailable_capacity_providers=['FARGATE_SPOT'])
+        env = {'AIRFLOW__ECS_FARGATE__QUEUE_ROUTES': 'tests.test_ecs_fargate_executor.QUEUE_ROUTES'}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        executor.capacity_admission = CapacityAdmissionController(initial_backoff=10, clock=clock)
+        for i in range(4):
+            for queue in ('heavy', 'default'):
+                executor.execute_async((queue, i), ['airflow', 'tasks', 'run', queue], queue=queue)
+
+        # the Spot route stops at its first capacity failure, and the default tasks launch
+        executor.attempt_task_runs()
+        self.assertEqual(5, fake_ecs.calls['RunTask'])
+        self.assertListEqual([('default', i) for i in range(4)], sorted(executor.active_workers.get_all_task_keys()))
+        self.assertListEqual([FakeEcsClient.FARGATE_CAPACITY_FAILURE_REASON],
+                             executor.capacity_admission.backing_off('heavy'))
+
+        # while the route backs off, other queues keep launching
+        executor.execute_async(('default', 4), ['airflow', 'tasks', 'run', 'default'], queue='default')
+        executor.attempt_task_runs()
+        self.assertEqual(6, fake_ecs.calls['RunTask'])
+        self.assertEqual(4, len(executor.pending_tasks))
+
+        # the route's probe fails, and the default launches don't release it
+        clock.advance(10)
+        executor.execute_async(('default', 5), ['airflow', 'tasks', 'run', 'default'], queue='default')
+        executor.attempt_task_runs()
+        self.assertEqual(8, fake_ecs.calls['RunTask'])
+        self.assertEqual(0, executor.capacity_admission.admit('heavy', 4))
+
+        # once Spot has capacity again, a single probe releases the route's tasks
+        fake_ecs.unavailable_capacity_providers.clear()
+        clock.advance(20)
+        executor.attempt_task_runs()
+        self.assertEqual(12, fake_ecs.calls['RunTask'])
+        self.assertEqual(0, len(executor.pending_tasks))
+        self.assertFalse(executor.capacity_admission.holding_back)
+
+    def test_route_clients_per_thread(self):
+        """Test that pool threads launch and describe routed tasks with their own clients of the route's region"""
+        clock = FakeClock()
+        route_clients = {region: FakeEcsClient(clock=clock, seed=seed)
+                         for seed, region in enumerate(('us-west-1', 'us-east-2'))}
+        env = {'AIRFLOW__ECS_FARGATE__QUEUE_ROUTES': 'tests.test_ecs_fargate_executor.QUEUE_ROUTES'}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client',
+                           side_effect=lambda service, region_name: route_clients[region_name]):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        thread_clients = {region: FakeEcsClient(clock=clock, seed=seed + 2)
+                          for seed, region in enumerate((None, 'us-east-2'))}
+        executor.launch_pool = BotoClientPool(lambda region=None: thread_clients[region], 1)
+        executor.describe_pool = BotoClientPool(lambda region=None: thread_clients[region], 1)
+        for queue in ('default', 'heavy', 'remote', 'remote'):
+            executor.execute_async(('dag', queue, len(executor.pending_tasks)), ['airflow'], queue=queue)
+        executor.attempt_task_runs()
+        self.assertEqual(4, len(executor.active_workers))
+        self.assertEqual(2, thread_clients[None].calls['RunTask'])
+        self.assertEqual(2, thread_clients['us-east-2'].calls['RunTask'])
+
+        executor.DESCRIBE_TASKS_BATCH_SIZE = 1
+        executor.sync_running_tasks()
+        self.assertEqual(2, thread_clients[None].calls['DescribeTasks'])
+        self.assertEqual(2, thread_clients['us-east-2'].calls['DescribeTasks'])
+        for client in route_clients.values():
+            self.assertEqual(0, client.calls['RunTask'] + client.calls['DescribeTasks'])
+        executor.launch_pool.shutdown()
+        executor.describe_pool.shutdown()
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_capacity_failover(self, success_mock, fail_mock):
+        """Test that a Spot route fails over to on-demand Fargate while Spot is out of capacity, and then back"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60,
+                                 unavailable_capacity_providers=['FARGATE_SPOT'])
+        env = {
+            'AIRFLOW__ECS_FARGATE__QUEUE_ROUTES': 'tests.test_ecs_fargate_executor.QUEUE_ROUTES',
+            'AIRFLOW__ECS_FARGATE__FAILOVER_CAPACITY_PROVIDER_STRATEGY': json.dumps(ON_DEMAND),
+        }
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        self.assertEqual(ON_DEMAND, executor.routes['heavy'].failover_strategy)
+        # run failover on the fake clock
+        executor.failover = CapacityFailover({'heavy': ON_DEMAND}, failure_threshold=2, recovery_interval=60,
+                                             on_switch=executor.failover.on_switch, clock=clock)
+
+        for i in range(3):
+            executor.execute_async(('dag', 'heavy', i), ['airflow', 'tasks', 'run', str(i)], queue='heavy')
+        executor.sync()
+        # two Spot launches failed, then the third task launched on demand
+        self.assertEqual(3, fake_ecs.calls['RunTask'])
+        self.assertEqual(1, len(executor.active_workers))
+        clock.advance(30)
+        executor.sync()
+        self.assertEqual(3, len(executor.active_workers))
+
+        # Spot recovers, and the route goes back to it
+        fake_ecs.unavailable_capacity_providers.clear()
+        clock.advance(30)
+        executor.execute_async(('dag', 'heavy', 3), ['airflow', 'tasks', 'run', '3'], queue='heavy')
+        executor.sync()
+        launched = [task.kwargs for task in fake_ecs.tasks.values()]
+        self.assertListEqual([ON_DEMAND] * 3 + [QUEUE_ROUTES['heavy']['capacityProviderStrategy']],
+                             [kwargs['capacityProviderStrategy'] for kwargs in launched])
+        self.assertFalse(any('launchType' in kwargs for kwargs in launched))
+
+        for _ in range(3):
+            clock.advance(30)
+            executor.sync()
+        self.assertEqual(4, success_mock.call_count)
+        fail_mock.assert_not_called()
+        self.assertDictEqual({PRIMARY: 90, FAILOVER: 60}, executor.failover.mode_seconds('heavy'))
+
+    def test_failover_list_tasks(self):
+        """Test that provisioning tasks are described on every heartbeat, so that running tasks don't fail over"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=3600)
+        env = {
+            'AIRFLOW__ECS_FARGATE__QUEUE_ROUTES': 'tests.test_ecs_fargate_executor.QUEUE_ROUTES',
+            'AIRFLOW__ECS_FARGATE__FAILOVER_CAPACITY_PROVIDER_STRATEGY': json.dumps(ON_DEMAND),
+            'AIRFLOW__ECS_FARGATE__SYNC_STRATEGY': 'list_tasks',
+        }
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        executor.failover = CapacityFailover({'heavy': ON_DEMAND}, latency_budget=60, clock=clock)
+        executor.execute_async(('dag', 'heavy', 0), ['airflow', 'tasks', 'run', '0'], queue='heavy')
+        executor.sync()
+        executor.sync()
+        self.assertListEqual(executor.active_workers.get_all_arns(), executor.failover.provisioning)
+
+        # active tasks aren't described until the next full sync, except for the ones that failover waits for
+        for _ in range(10):
+            clock.advance(15)
+            executor.sync()
+        self.assertListEqual([], executor.failover.provisioning)
+        self.assertIsNone(executor.failover.strategy('heavy'))
+        self.assertEqual(1, fake_ecs.calls['RunTask'])
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_warm_workers(self, success_mock, fail_mock):
+        """Test that warm workers are launched for the backlog, and that their exit codes are reported"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=3600)
+        env = {
+            'AIRFLOW__ECS_FARGATE__WARM_WORKERS': '3',
+            'AIRFLOW__ECS_FARGATE__WORK_QUEUE': 'airflow_aws_executors.work_queue.LocalWorkQueue',
+        }
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        work_queue = executor.warm_pool.work_queue
+        for i in range(5):
+            executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)], executor_config={'cpu': 1})
+        self.assertEqual(0, len(executor.pending_tasks))
+        executor.sync()
+        # all three workers are launched by a single RunTask call
+        self.assertEqual(1, fake_ecs.calls['RunTask'])
+        self.assertEqual(3, len(executor.warm_pool.workers))
+        worker_arn, lost_worker_arn, _ = sorted(executor.warm_pool.workers)
+        container_override = fake_ecs.tasks[worker_arn].kwargs['overrides']['containerOverrides'][0]
+        self.assertListEqual(['python', '-m', 'airflow_aws_executors.worker'], container_override['command'])
+        self.assertEqual(5, len(work_queue))
+
+        # one worker starts a command and is stopped, another runs the rest
+        work_queue.started(work_queue.get(0), lost_worker_arn)
+        self.assertEqual(4, run_worker(work_queue, worker_arn, idle_timeout=0,
+                                       run=lambda command: 1 if command[-1] == '4' else 0))
+        fake_ecs.stop_task(cluster=executor.cluster, task=lost_worker_arn)
+        clock.advance(10)
+        executor.sync()
+        self.assertListEqual([mock.call(('dag', 'task', i)) for i in range(1, 4)], success_mock.call_args_list)
+        self.assertListEqual([mock.call(('dag', 'task', 4)), mock.call(('dag', 'task', 0))], fail_mock.call_args_list)
+        self.assertEqual(0, executor.warm_pool.outstanding)
+        self.assertEqual(2, len(executor.warm_pool.workers))
+        # idle workers aren't replaced
+        self.assertEqual(1, fake_ecs.calls['RunTask'])
+        executor.end(heartbeat_interval=0)
+
+    def test_terminate_warm_workers(self):
+        """Test that the warm workers that are stopped by terminate aren't replaced while the executor ends"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=3600)
+        env = {
+            'AIRFLOW__ECS_FARGATE__WARM_WORKERS': '3',
+            'AIRFLOW__ECS_FARGATE__MIN_WARM_WORKERS': '2',
+            'AIRFLOW__ECS_FARGATE__WORK_QUEUE': 'airflow_aws_executors.work_queue.LocalWorkQueue',
+        }
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+        executor.sync()
+        self.assertEqual(2, len(executor.warm_pool.workers))
+        self.assertEqual(1, fake_ecs.calls['RunTask'])
+
+        executor.terminate()
+        self.assertEqual(2, fake_ecs.calls['StopTask'])
+        self.assertEqual(0, len(executor.warm_pool.workers))
+        self.assertEqual(1, fake_ecs.calls['RunTask'])
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_journal_restart(self, success_mock, fail_mock):
+        """Test that a restarted executor adopts the journaled tasks instead of relaunching them"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = {'AIRFLOW__ECS_FARGATE__STATE_JOURNAL': os.path.join(directory, 'journal.sqlite')}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+            for i in range(10):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            executor.sync()
+            # one task has already been retried once
+            executor.active_workers.increment_failure_count(('dag', 'task', 0))
+            executor.sync()
+            clock.advance(20)
+            describe_tasks_calls = fake_ecs.calls['DescribeTasks']
+
+            # the scheduler restarts without ending the executor
+            restarted_executor = AwsEcsFargateExecutor()
+            restarted_executor.start()
+
+        self.assertEqual(10, fake_ecs.calls['RunTask'])
+        # the restored tasks were reconciled with one bulk describe
+        self.assertEqual(describe_tasks_calls + 1, fake_ecs.calls['DescribeTasks'])
+        self.assertEqual(10, len(restarted_executor.active_workers))
+        self.assertSetEqual({('dag', 'task', i) for i in range(10)}, restarted_executor.running)
+        self.assertEqual(1, restarted_executor.active_workers.failure_count_by_key(('dag', 'task', 0)))
+        self.assertEqual(State.RUNNING, restarted_executor.active_workers.task_by_key(
+            ('dag', 'task', 1)).get_task_state())
+
+        tracked_ti, untracked_ti = mock.Mock(key=('dag', 'task', 1)), mock.Mock(key=('dag', 'task', 10))
+        self.assertListEqual([untracked_ti], restarted_executor.try_adopt_task_instances([tracked_ti, untracked_ti]))
+
+        clock.advance(60)
+        restarted_executor.sync()
+        self.assertEqual(10, success_mock.call_count)
+        self.assertEqual(0, len(restarted_executor.active_workers))
+        self.assertEqual(10, fake_ecs.calls['RunTask'])
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_journal_restart_relaunch(self, success_mock, fail_mock):
+        """Test that a restarted executor relaunches the journaled tasks that were waiting to be relaunched"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = {'AIRFLOW__ECS_FARGATE__STATE_JOURNAL': os.path.join(directory, 'journal.sqlite')}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+            for i in range(2):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            executor.sync()
+            # a task stops before it runs, and waits to be relaunched
+            fake_ecs.stop_task(cluster=executor.cluster, task=executor.active_workers.get_all_arns()[0])
+            executor.sync()
+            self.assertEqual(1, len(executor.relaunches))
+
+            # the scheduler restarts during the backoff
+            with mock.patch.dict(os.environ, {'AIRFLOW__ECS_FARGATE__RELAUNCH_BACKOFF': '0'}):
+                restarted_executor = AwsEcsFargateExecutor()
+                restarted_executor.start()
+
+        self.assertEqual(1, len(restarted_executor.active_workers))
+        self.assertEqual(1, len(restarted_executor.relaunches))
+        self.assertSetEqual({('dag', 'task', 0), ('dag', 'task', 1)}, restarted_executor.running)
+        tis = [mock.Mock(key=('dag', 'task', i)) for i in range(2)]
+        self.assertListEqual([], restarted_executor.try_adopt_task_instances(tis))
+
+        restarted_executor.sync()
+        self.assertEqual(3, fake_ecs.calls['RunTask'])
+        self.assertEqual(2, len(restarted_executor.active_workers))
+        self.assertEqual(1, restarted_executor.active_workers.failure_count_by_key(('dag', 'task', 0)))
+        clock.advance(80)
+        restarted_executor.sync()
+        self.assertEqual(2, success_mock.call_count)
+        self.assertFalse(fail_mock.called)
+
+    def test_adopt_by_tags(self):
+        """Test that orphaned task instances are adopted by the tags of the tasks that were launched for them"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__ECS_FARGATE__ADOPT_BY_TAGS': 'True'}), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+            for i in range(150):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            executor.sync()
+            # another scheduler's task in the same cluster
+            fake_ecs.run_task(**dict(executor.run_task_kwargs, tags=[{'key': 'team', 'value': 'data'}]))
+            clock.advance(20)
+
+            # another scheduler takes over
+            adopting_executor = AwsEcsFargateExecutor()
+            adopting_executor.start()
+        self.assert_botocore_call('RunTask', (), executor._run_task_kwargs(  # pylint: disable=protected-access
+            ('dag', 'task', 0), ['airflow'], None, {}))
+
+        tis = [mock.Mock(key=('dag', 'task', i), queue='default', executor_config={}) for i in range(151)]
+        for ti in tis:
+            ti.command_as_list.return_value = ['airflow', 'tasks', 'run', str(ti.key[-1])]
+        describe_tasks_calls = fake_ecs.calls['DescribeTasks']
+        self.assertListEqual([tis[150]], adopting_executor.try_adopt_task_instances(tis))
+        self.assertEqual(2, fake_ecs.calls['DescribeTasks'] - describe_tasks_calls)
+        self.assertEqual(150, len(adopting_executor.active_workers))
+        self.assertEqual(State.RUNNING, adopting_executor.active_workers.task_by_key(
+            ('dag', 'task', 7)).get_task_state())
+        self.assertEqual(['airflow', 'tasks', 'run', '7'],
+                         adopting_executor.active_workers.info_by_key(('dag', 'task', 7)).cmd)
+        self.assertEqual(150, len(adopting_executor.running))
+
+    def test_adopt_packs_by_tags(self):
+        """Test that packs are adopted by the tags of their tasks, along with the command of the pack"""
+        clock = FakeClock()
+        fake_ecs = FakeEcsClient(clock=clock, provisioning_seconds=10, run_seconds=60)
+        with mock.patch.dict(os.environ, {'AIRFLOW__ECS_FARGATE__ADOPT_BY_TAGS': 'True',
+                                          'AIRFLOW__ECS_FARGATE__PACK_SIZE': '2'}), \
+                mock.patch('airflow_aws_executors.ecs_fargate_executor.boto3.client', return_value=fake_ecs):
+            executor = AwsEcsFargateExecutor()
+            executor.start()
+            for i in range(3):
+                executor.execute_async(('dag', 'task', i), ['airflow', 'tasks', 'run', str(i)])
+            executor.sync()
+            clock.advance(20)
+
+            adopting_executor = AwsEcsFargateExecutor()
+            adopting_executor.start()
+
+        tis = [mock.Mock(key=('dag', 'task', i), queue='default', executor_config={}) for i in range(4)]
+        for ti in tis:
+            ti.command_as_list.return_value = ['airflow', 'tasks', 'run', str(ti.key[-1])]
+        self.assertListEqual([tis[3]], adopting_executor.try_adopt_task_instances(tis))
+        pack = TaskPack((('dag', 'task', 0), ('dag', 'task', 1)))
+        self.assertSetEqual(set(executor.active_workers.get_all_task_keys()),
+                            set(adopting_executor.active_workers.get_all_task_keys()))
+        self.assertEqual(executor.active_workers.info_by_key(pack).cmd,
+                         adopting_executor.active_workers.info_by_key(pack).cmd)
+        self.assertSetEqual({ti.key for ti in tis[:3]}, adopting_executor.running)
+
+    def test_invalid_sync_api(self):
+        """Test that DescribeTasks responses of an unexpected shape raise an EcsFargateError"""
+        self.__mock_sync()
+        self.executor.ecs.describe_tasks.return_value = {'tasks': [{'taskArn': 'ABC'}], 'failures': []}
+        with self.assertRaises(EcsFargateError):
+            self.executor.sync_running_tasks()
+
     def test_terminate(self):
         """Test that executor can shut everything down; forcing all tasks to unnaturally exit"""
         after_fargate_task = self.__mock_sync()
@@ -0,0 +1,91 @@
+from unittest import TestCase, mock
+
+from airflow_aws_executors.failover import FAILOVER, PRIMARY, CapacityFailover
+
+from .fake_aws import FakeClock
+
+ON_DEMAND = [{'capacityProvider': 'FARGATE', 'weight': 1}]
+
+
+class TestCapacityFailover(TestCase):
+    """Tests the CapacityFailover"""
+    def test_capacity_failures(self):
+        """Targets fail over after consecutive capacity failures, unless they don't have a failover strategy"""
+        self.failover.record_launch(None, capacity_failure=True)
+        self.failover.record_launch(None, 'arn-1')
+        self.failover.record_launch(None, capacity_failure=True)
+        self.failover.record_launch(None, capacity_failure=False)
+        self.assertIsNone(self.failover.strategy(None))
+
+        self.clock.advance(10)
+        self.failover.record_launch(None, capacity_failure=True)
+        self.assertEqual(ON_DEMAND, self.failover.strategy(None))
+        self.on_switch.assert_called_once_with(None, PRIMARY, FAILOVER, 10)
+
+        for _ in range(3):
+            self.failover.record_launch('no_failover', capacity_failure=True)
+        self.assertIsNone(self.failover.strategy('no_failover'))
+        self.assertTrue(self.failover.enabled)
+        self.assertFalse(CapacityFailover({None: None}).enabled)
+
+    def test_recovery(self):
+        """Failed over targets go back on probation, and fail over for twice as long if they fail again"""
+        self.fail_over()
+        self.clock.advance(59)
+        self.failover.tick()
+        self.assertEqual(ON_DEMAND, self.failover.strategy(None))
+        self.clock.advance(1)
+        self.failover.tick()
+        self.assertIsNone(self.failover.strategy(None))
+
+        # a single failure on probation fails over again, for twice as long
+        self.failover.record_launch(None, capacity_failure=True)
+        self.assertEqual(ON_DEMAND, self.failover.strategy(None))
+        self.clock.advance(119)
+        self.failover.tick()
+        self.assertEqual(ON_DEMAND, self.failover.strategy(None))
+        self.clock.advance(1)
+        self.failover.tick()
+        self.assertIsNone(self.failover.strategy(None))
+
+        # a running task ends the probation, and resets the recovery interval
+        self.failover.record_launch(None, 'arn-1')
+        self.failover.task_running('arn-1')
+        self.fail_over()
+        self.clock.advance(60)
+        self.failover.tick()
+        self.assertIsNone(self.failover.strategy(None))
+        self.clock.advance(30)
+        self.assertDictEqual({PRIMARY: 30, FAILOVER: 240}, self.failover.mode_seconds(None))
+
+    def test_latency_budget(self):
+        """Targets fail over once a task has been provisioning for longer than the latency budget"""
+        self.failover.record_launch(None, 'arn-1')
+        self.clock.advance(50)
+        self.failover.record_launch(None, 'arn-2')
+        self.failover.record_launch(None, 'arn-3')
+        self.failover.task_stopped('arn-2')
+        self.clock.advance(50)
+        self.failover.tick()
+        self.assertIsNone(self.failover.strategy(None))
+
+        self.failover.task_running('arn-1')
+        self.clock.advance(50)
+        self.failover.tick()
+        self.assertIsNone(self.failover.strategy(None))
+        self.clock.advance(1)
+        self.failover.tick()
+        self.assertEqual(ON_DEMAND, self.failover.strategy(None))
+        # tasks that were launched before the failover don't count against the probation
+        self.assertDictEqual({}, self.failover._provisioning)
+
+    def fail_over(self):
+        for _ in range(2):
+            self.failover.record_launch(None, capacity_failure=True)
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.on_switch = mock.Mock()
+        self.failover = CapacityFailover({None: ON_DEMAND, 'no_failover': None}, failure_threshold=2,
+                                         latency_budget=100, recovery_interval=60, max_recovery_interval=600,
+                                         on_switch=self.on_switch, clock=self.clock)
@@ -0,0 +1,102 @@
+from unittest import TestCase, mock
+
+from botocore.exceptions import ClientError
+
+from airflow_aws_executors.batch_executor import AwsBatchExecutor
+from airflow_aws_executors.ecs_fargate_executor import AwsEcsFargateExecutor
+
+from .fake_aws import FakeBatchClient, FakeClock, FakeEcsClient
+
+
+class TestFakeEcsClient(TestCase):
+    """Drives the ECS executor against the fake ECS service"""
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_lifecycle(self, success_mock, fail_mock):
+        """Every task eventually succeeds or fails, despite dropped ARNs & provisioning failures"""
+        executor = self.run_workload(300, drop_rate=0.05, provisioning_failure_rate=0.05, failure_rate=0.1)
+
+        finished = [call[0][0] for call in success_mock.call_args_list + fail_mock.call_args_list]
+        self.assertCountEqual(self.keys, finished)
+        self.assertTrue(fail_mock.called)
+        # dropped & removed tasks were relaunched
+        self.assertGreater(executor.ecs.calls['RunTask'], len(self.keys))
+
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_capacity(self, success_mock, fail_mock):
+        """Tasks that fail to launch due to capacity stay pending until capacity frees up"""
+        executor = self.run_workload(300, max_running=100)
+
+        self.assertCountEqual(self.keys, [call[0][0] for call in success_mock.call_args_list])
+        self.assertFalse(fail_mock.called)
+        self.assertGreater(executor.ecs.calls['RunTask'], len(self.keys))
+
+    def run_workload(self, num_tasks, **fake_ecs_kwargs) -> AwsEcsFargateExecutor:
+        """Runs num_tasks through the executor, until there's nothing left to track"""
+        clock = FakeClock()
+        executor = AwsEcsFargateExecutor()
+        executor.start()
+        executor.ecs = FakeEcsClient(clock=clock, provisioning_seconds=20, run_seconds=60, **fake_ecs_kwargs)
+        executor.relaunches.clock = clock
+        self.keys = [('dag', 'task', i) for i in range(num_tasks)]
+        for key in self.keys:
+            executor.execute_async(key, ['airflow', 'tasks', 'run', str(key[-1])])
+
+        for _ in range(100):
+            executor.sync()
+            clock.advance(10)
+            if not executor.active_workers and not executor.pending_tasks and not executor.relaunches:
+                break
+        self.assertEqual(0, len(executor.active_workers))
+        self.assertGreater(executor.ecs.calls['DescribeTasks'], 0)
+        return executor
+
+    def test_throttling(self):
+        """Throttled calls raise the same ClientError as Boto3"""
+        ecs = FakeEcsClient(throttle_rate=1)
+        with self.assertRaises(ClientError) as ctx:
+            ecs.describe_tasks(tasks=['AAA'], cluster='some-cluster')
+        self.assertEqual('ThrottlingException', ctx.exception.response['Error']['Code'])
+        self.assertEqual(1, ecs.throttled['DescribeTasks'])
+
+    def test_validation(self):
+        """Requests are validated against the Botocore model"""
+        with self.assertRaises(AssertionError):
+            FakeEcsClient().run_task(cluster='some-cluster')
+
+
+class TestFakeBatchClient(TestCase):
+    """Drives the Batch executor against the fake Batch service"""
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.fail')
+    @mock.patch('airflow.executors.base_executor.BaseExecutor.success')
+    def test_lifecycle(self, success_mock, fail_mock):
+        """Every job eventually succeeds or fails"""
+        clock = FakeClock()
+        executor = AwsBatchExecutor()
+        executor.start()
+        executor.batch = FakeBatchClient(clock=clock, queue_seconds=20, run_seconds=60, failure_rate=0.1)
+        keys = [('dag', 'task', i) for i in range(300)]
+        for key in keys:
+            executor.execute_async(key, ['airflow', 'tasks', 'run', str(key[-1])])
+        clock.advance(1)
+        self.assertSetEqual({'RUNNABLE'}, {job['status'] for job in executor.batch.describe_jobs(
+            jobs=executor.active_workers.get_all_jobs()[:100])['jobs']})
+
+        for _ in range(20):
+            executor.sync()
+            clock.advance(10)
+            if not executor.active_workers:
+                break
+
+        finished = [call[0][0] for call in success_mock.call_args_list + fail_mock.call_args_list]
+        self.assertCountEqual(keys, finished)
+        self.assertTrue(fail_mock.called)
+
+    def test_terminate(self):
+        """Terminated jobs fail"""
+        batch = FakeBatchClient(clock=FakeClock())
+        job_id = batch.submit_job(jobName='name', jobQueue='queue', jobDefinition='def')['jobId']
+        batch.terminate_job(jobId=job_id, reason='UnitTest')
+        self.assertEqual('FAILED', batch.describe_jobs(jobs=[job_id])['jobs'][0]['status'])
+        self.assertEqual(1, batch.list_jobs(jobQueue='queue', jobStatus='FAILED')['jobSummaryList'].__len__())
@@ -0,0 +1,92 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections import namedtuple
+from unittest import TestCase
+
+from airflow_aws_executors.journal import JournalRecord, StateJournal
+
+TaskKey = namedtuple('TaskKey', ('dag_id', 'task_id', 'try_number'))
+
+
+class TestStateJournal(TestCase):
+    """Tests the StateJournal"""
+    def test_replay(self):
+        """Adds, pops, relaunches, and failure counts are replayed in order"""
+        self.journal.record_add('AAA', TaskKey('dag', 'a', 1), {'cmd': ['airflow']})
+        self.journal.record_add('BBB', TaskKey('dag', 'b', 1))
+        self.journal.record_add('CCC', TaskKey('dag', 'c', 1))
+        self.journal.record_failure_count(TaskKey('dag', 'a', 1), 1)
+        self.journal.record_add('AAA-2', TaskKey('dag', 'a', 1), {'cmd': ['airflow']})
+        self.journal.record_failure_count(TaskKey('dag', 'b', 1), 2)
+        self.journal.record_pop(TaskKey('dag', 'b', 1))
+        self.journal.flush()
+
+        records = StateJournal(self.path).load()
+        self.assertListEqual([
+            JournalRecord('CCC', TaskKey('dag', 'c', 1), None, 0),
+            JournalRecord('AAA-2', TaskKey('dag', 'a', 1), {'cmd': ['airflow']}, 1),
+        ], records)
+        # keys keep their types
+        self.assertIsInstance(records[0].key, TaskKey)
+
+    def test_unflushed(self):
+        """Entries are durable once they're flushed"""
+        self.journal.record_add('AAA', TaskKey('dag', 'a', 1))
+        self.assertListEqual([], StateJournal(self.path).load())
+        self.journal.close()
+        self.assertEqual(1, len(StateJournal(self.path).load()))
+
+    def test_compact(self):
+        """Compacting the journal keeps its replayed state"""
+        for i in range(100):
+            self.journal.record_add(str(i), TaskKey('dag', 'a', i))
+            self.journal.record_failure_count(TaskKey('dag', 'a', i), 1)
+            if i % 10:
+                self.journal.record_pop(TaskKey('dag', 'a', i))
+        records = self.journal.load()
+        self.assertEqual(10, len(records))
+        self.journal.compact()
+        self.assertListEqual(records, StateJournal(self.path).load())
+
+    def test_relaunch(self):
+        """Tasks that wait to be relaunched are replayed without an AWS ID, and survive compaction"""
+        self.journal.record_add('AAA', TaskKey('dag', 'a', 1), {'cmd': ['airflow']})
+        self.journal.record_add('BBB', TaskKey('dag', 'b', 1))
+        self.journal.record_relaunch(TaskKey('dag', 'a', 1), {'cmd': ['airflow']}, 2)
+        self.journal.record_relaunch(TaskKey('dag', 'b', 1), None, 1)
+        self.journal.record_add('BBB-2', TaskKey('dag', 'b', 1))
+        expected = [
+            JournalRecord(None, TaskKey('dag', 'a', 1), {'cmd': ['airflow']}, 2),
+            JournalRecord('BBB-2', TaskKey('dag', 'b', 1), None, 1),
+        ]
+        self.assertListEqual(expected, self.journal.load())
+        self.journal.compact()
+        self.assertListEqual(expected, StateJournal(self.path).load())
+
+    def test_compact_on_flush(self):
+        """The journal is compacted on flush once it grows past its row threshold"""
+        journal = StateJournal(self.path, compact_rows=100)
+        for i in range(49):
+            journal.record_add(str(i), TaskKey('dag', 'a', i))
+            journal.record_pop(TaskKey('dag', 'a', i))
+        journal.record_add('AAA', TaskKey('dag', 'a', 49))
+        journal.flush()
+        self.assertEqual(99, self.count_rows())
+        journal.record_add('BBB', TaskKey('dag', 'b', 1))
+        journal.flush()
+        self.assertEqual(2, self.count_rows())
+        self.assertListEqual(['AAA', 'BBB'], [record.task_id for record in StateJournal(self.path).load()])
+
+    def count_rows(self) -> int:
+        """The number of rows in the journal's table"""
+        return sqlite3.connect(self.path).execute('SELECT COUNT(*) FROM journal').fetchone()[0]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal.sqlite')
+        self.journal = StateJournal(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
@@ -0,0 +1,57 @@
+import datetime as dt
+from unittest import TestCase, mock
+
+from airflow_aws_executors.metrics import ExecutorMetrics
+
+from .fake_aws import FakeClock
+
+
+class TestExecutorMetrics(TestCase):
+    """Tests the ExecutorMetrics"""
+    def test_stat_names(self):
+        """Metrics are prefixed, and sanitized into valid StatsD names"""
+        self.metrics.incr('run_task_failures.RESOURCE:MEMORY')
+        self.metrics.gauge('pending_tasks', 3)
+        self.stats.incr.assert_called_once_with('ecs_executor.run_task_failures.RESOURCE_MEMORY', 1)
+        self.stats.gauge.assert_called_once_with('ecs_executor.pending_tasks', 3)
+
+    def test_api_call(self):
+        """API calls are timed, and their errors are counted by error code"""
+        self.metrics.api_call('run_task', 0.25)
+        self.metrics.api_call('run_task', 0.5, 'ThrottlingException')
+        self.stats.timing.assert_has_calls([
+            mock.call('ecs_executor.api.run_task', dt.timedelta(seconds=0.25)),
+            mock.call('ecs_executor.api.run_task', dt.timedelta(seconds=0.5)),
+        ])
+        self.stats.incr.assert_called_once_with('ecs_executor.api.run_task.errors.ThrottlingException', 1)
+
+    def test_lifecycle(self):
+        """The time between consecutive stages of a task's lifecycle is emitted once"""
+        self.metrics.task_queued('key')
+        self.clock.advance(2)
+        self.metrics.task_launched('key')
+        self.clock.advance(30)
+        self.metrics.task_running('key')
+        self.clock.advance(10)
+        self.metrics.task_running('key')
+        self.clock.advance(50)
+        self.metrics.task_finished('key')
+        self.assertListEqual([
+            mock.call('ecs_executor.launch_latency', dt.timedelta(seconds=2)),
+            mock.call('ecs_executor.start_latency', dt.timedelta(seconds=30)),
+            mock.call('ecs_executor.run_duration', dt.timedelta(seconds=60)),
+        ], self.stats.timing.call_args_list)
+
+    def test_skipped_stages(self):
+        """Tasks that fail before running, or that weren't queued by the executor, don't emit later timers"""
+        self.metrics.task_queued('failed')
+        self.metrics.task_launched('failed')
+        self.metrics.task_finished('failed')
+        self.metrics.task_running('adopted')
+        self.metrics.task_finished('adopted')
+        self.assertListEqual(['ecs_executor.launch_latency'], [c[0][0] for c in self.stats.timing.call_args_list])
+
+    def setUp(self):
+        self.stats = mock.Mock()
+        self.clock = FakeClock()
+        self.metrics = ExecutorMetrics('ecs_executor', stats=self.stats, clock=self.clock)
@@ -0,0 +1,100 @@
+import json
+from collections import namedtuple
+from unittest import TestCase, mock
+
+from airflow.utils.state import State
+
+from airflow_aws_executors.packing import (MAX_PACK_SIZE, PACK_EXIT_CODE_BASE, TaskPack, TaskPacker, failed_commands,
+                                           main, pack_command, pack_exit_code, run_pack, task_keys, unpack_states)
+
+QueuedTask = namedtuple('QueuedTask', ('key', 'command', 'queue', 'executor_config'))
+
+
+class TestTaskPacker(TestCase):
+    """Tests the TaskPacker"""
+    def test_pack(self):
+        """Compatible tasks are packed in order, up to the pack size"""
+        queued_tasks = [QueuedTask(i, ['airflow', str(i)], 'default', {}) for i in range(5)]
+        queued_tasks.insert(1, QueuedTask('gpu', ['airflow', 'gpu'], 'default', {'gpu': 1}))
+        queued_tasks.append(QueuedTask('other', ['airflow', 'other'], 'other', {}))
+        packs = TaskPacker(3, 'sequential').pack(queued_tasks)
+
+        self.assertListEqual([TaskPack((0, 1, 2)), 'gpu', TaskPack((3, 4)), 'other'], [pack.key for pack in packs])
+        self.assertListEqual(pack_command([['airflow', '0'], ['airflow', '1'], ['airflow', '2']], 'sequential'),
+                             packs[0].command)
+        self.assertEqual(('default', {}), (packs[0].queue, packs[0].executor_config))
+        self.assertIs(queued_tasks[1], packs[1])
+        # packs are left as they are
+        self.assertListEqual(packs, TaskPacker(3).pack(packs))
+
+    def test_executor_configs(self):
+        """Executor configs are compared by value"""
+        queued_tasks = [QueuedTask(i, ['airflow'], 'default', {'memory': 512, 'cpu': 256}) for i in range(2)]
+        queued_tasks.append(QueuedTask(2, ['airflow'], 'default', {'cpu': 256, 'memory': 512}))
+        self.assertListEqual([TaskPack((0, 1, 2))], [pack.key for pack in TaskPacker(MAX_PACK_SIZE).pack(queued_tasks)])
+
+    def test_invalid(self):
+        """Pack sizes must fit in an exit code"""
+        with self.assertRaises(ValueError):
+            TaskPacker(MAX_PACK_SIZE + 1)
+        with self.assertRaises(ValueError):
+            TaskPacker(2, 'parallel')
+
+
+class TestUnpacking(TestCase):
+    """Tests that the exit code of a pack is unpacked into the state of each task"""
+    def test_failed_commands(self):
+        """Exit codes are offset bitmasks of the failed commands, unless they can't be"""
+        self.assertSetEqual(set(), failed_commands(0, 3))
+        self.assertSetEqual({0, 2}, failed_commands(pack_exit_code(0b101), 3))
+        self.assertSetEqual({0, 1, 2}, failed_commands(137, 3))
+        self.assertSetEqual({0, 1, 2}, failed_commands(pack_exit_code(0b1000), 3))
+        self.assertSetEqual({0, 1}, failed_commands(None, 2))
+        # the runner crashed (ex: an uncaught exception, or a usage error) before it ran any command
+        for exit_code in (1, 2, PACK_EXIT_CODE_BASE):
+            self.assertSetEqual(set(range(MAX_PACK_SIZE)), failed_commands(exit_code, MAX_PACK_SIZE))
+
+    def test_unpack_states(self):
+        """Single tasks keep their state, and pack members get their own"""
+        self.assertListEqual([('a', State.FAILED)], unpack_states('a', State.FAILED, 0))
+        self.assertListEqual(['a', 'b'], list(task_keys(TaskPack(('a', 'b')))))
+        self.assertListEqual(['a'], list(task_keys('a')))
+        self.assertListEqual([('a', State.SUCCESS), ('b', State.SUCCESS)],
+                             unpack_states(TaskPack(('a', 'b')), State.SUCCESS))
+        self.assertListEqual([('a', State.SUCCESS), ('b', State.FAILED)],
+                             unpack_states(TaskPack(('a', 'b')), State.FAILED, pack_exit_code(0b10)))
+        self.assertListEqual([('a', State.FAILED), ('b', State.FAILED)],
+                             unpack_states(TaskPack(('a', 'b')), State.FAILED))
+        # the pack failed for another reason than its commands (ex: an essential sidecar failed)
+        self.assertListEqual([('a', State.FAILED), ('b', State.FAILED)],
+                             unpack_states(TaskPack(('a', 'b')), State.FAILED, 0))
+
+
+class TestRunPack(TestCase):
+    """Tests the container side of a pack"""
+    def test_modes(self):
+        """Every command is run, and the failed ones are set in the exit code"""
+        for mode in ('concurrent', 'sequential'):
+            started = []
+
+            def popen(command, started=started):
+                if command == ['missing']:
+                    raise FileNotFoundError(command[0])
+                started.append(command)
+                return mock.Mock(wait=mock.Mock(return_value=int(command[-1])))
+
+            self.assertEqual(0b1010, run_pack([['true', '0'], ['false', '1'], ['true', '0'], ['missing']], mode,
+                                              popen=popen))
+            self.assertListEqual([['true', '0'], ['false', '1'], ['true', '0']], started)
+
+    def test_main(self):
+        """The pack's command line exits with the offset bitmask, or with 0 if every command succeeded"""
+        command = pack_command([['python', '-c', 'pass'], ['python', '-c', 'raise SystemExit(3)']])
+        with self.assertRaises(SystemExit) as context:
+            main(command[3:])
+        self.assertEqual(PACK_EXIT_CODE_BASE + 0b10, context.exception.code)
+        with self.assertRaises(SystemExit) as context:
+            main(pack_command([['python', '-c', 'pass']])[3:])
+        self.assertEqual(0, context.exception.code)
+        with self.assertRaises(SystemExit):
+            main([json.dumps([['true']] * (MAX_PACK_SIZE + 1))])
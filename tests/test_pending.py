@@ -0,0 +1,136 @@
+import itertools
+from collections import Counter, namedtuple
+from unittest import TestCase
+
+from airflow.models.taskinstance import TaskInstanceKey
+
+from airflow_aws_executors.packing import TaskPack, TaskPacker
+from airflow_aws_executors.pending import PendingTaskQueue, task_share
+
+from .fake_aws import FakeClock
+
+QueuedTask = namedtuple('QueuedTask', ('key', 'command', 'queue', 'executor_config'))
+
+
+def queued_task(dag_id, i, queue='default'):
+    return QueuedTask((dag_id, i), ['airflow', dag_id, str(i)], queue, {})
+
+
+class TestPendingTaskQueue(TestCase):
+    """Tests the order of pending tasks"""
+    def test_priority(self):
+        """Higher priorities go first, and equal priorities go in the order that they were queued"""
+        for i, priority in enumerate([1, 5, 1, 3, 5]):
+            self.pending.push(queued_task('dag', i), priority)
+
+        self.assertEqual(5, len(self.pending))
+        self.assertListEqual([1, 4, 3, 0, 2], [task.key[1] for task in self.pending])
+        # iterating doesn't dequeue anything
+        self.assertListEqual([1, 4, 3, 0, 2], [self.pending.pop().key[1] for _ in range(5)])
+        self.assertFalse(self.pending)
+        with self.assertRaises(IndexError):
+            self.pending.pop()
+
+    def test_aging(self):
+        """A task gains a point of priority for every aging_seconds that it waits, so that nothing waits forever"""
+        self.pending.push(queued_task('dag', 'old'), 1)
+        self.clock.advance(30)
+        self.pending.push(queued_task('dag', 'new'), 3)
+        self.assertEqual(('dag', 'new'), self.pending.pop().key)
+
+        self.pending.push(queued_task('dag', 'new'), 3)
+        self.clock.advance(100)
+        self.pending.push(queued_task('dag', 'newer'), 3)
+        self.assertListEqual(['new', 'old', 'newer'], [task.key[1] for task in self.pending])
+
+        # without aging, priority always wins
+        pending = PendingTaskQueue(aging_seconds=0, clock=self.clock)
+        pending.push(queued_task('dag', 'old'), 1)
+        self.clock.advance(1000)
+        pending.push(queued_task('dag', 'new'), 2)
+        self.assertListEqual(['new', 'old'], [task.key[1] for task in pending])
+
+    def test_fair_share(self):
+        """DAGs and queues take turns in proportion to their weights, regardless of how many tasks they queue"""
+        pending = PendingTaskQueue.from_config(60, '{"dags": {"heavy": 2}, "queues": {"backfill": 0.5}}')
+        pending.clock = self.clock
+        for i in range(100):
+            pending.push(queued_task('flood', i), 10)
+        for i in range(4):
+            pending.push(queued_task('heavy', i))
+            pending.push(queued_task('light', i))
+            pending.push(queued_task('light', i, queue='backfill'))
+
+        first = [task_share(task.key, task.queue) for task in itertools.islice(pending, 9)]
+        self.assertDictEqual({('heavy', 'default'): 4, ('flood', 'default'): 2, ('light', 'default'): 2,
+                              ('light', 'backfill'): 1}, Counter(first))
+
+    def test_idle_share(self):
+        """A share that was idle starts from the current turn, instead of claiming the turns that it missed"""
+        for i in range(10):
+            self.pending.push(queued_task('busy', i))
+        for _ in range(8):
+            self.pending.pop()
+        self.pending.push(queued_task('idle', 0))
+        self.pending.push(queued_task('idle', 1))
+        self.assertListEqual(['idle', 'busy', 'idle', 'busy'], [task.key[0] for task in self.pending])
+
+    def test_requeue(self):
+        """Requeued tasks keep their priority and their place in line until they're forgotten"""
+        first, second = queued_task('dag', 0), queued_task('dag', 1)
+        self.pending.push(first, 2)
+        self.pending.push(second, 2)
+        self.pending.pop()
+        self.clock.advance(1000)
+        self.pending.requeue(first)
+        self.assertListEqual([first, second], list(self.pending))
+
+        self.pending.forget(first.key)
+        self.pending.pop()
+        self.pending.requeue(first)
+        self.assertListEqual([second, first], list(self.pending))
+
+    def test_regroup(self):
+        """Packs take the highest priority and the earliest place of their tasks"""
+        for i, priority in enumerate([1, 1, 1, 9]):
+            self.pending.push(queued_task('dag', i), priority)
+        self.pending.push(QueuedTask(('dag', 'gpu'), ['airflow'], 'default', {'gpu': 1}), 5)
+        self.pending.regroup(TaskPacker(2).pack)
+
+        self.assertListEqual([TaskPack((('dag', 3), ('dag', 0))), ('dag', 'gpu'), TaskPack((('dag', 1), ('dag', 2)))],
+                             [task.key for task in self.pending])
+        self.pending.forget(TaskPack((('dag', 3), ('dag', 0))))
+        self.assertNotIn(('dag', 3), self.pending._info)
+
+    def test_regroup_new_tasks(self):
+        """Only the tasks that were pushed since the last regroup are grouped, and the rest keep their place"""
+        for i in range(3):
+            self.pending.push(queued_task('dag', i))
+        self.pending.regroup(TaskPacker(2).pack)
+        first_pack = self.pending.pop()
+        self.assertEqual(TaskPack((('dag', 0), ('dag', 1))), first_pack.key)
+        self.pending.requeue(first_pack)
+
+        self.pending.push(queued_task('other', 3))
+        self.pending.push(queued_task('dag', 4))
+        self.pending.regroup(TaskPacker(2).pack)
+        self.assertSetEqual({TaskPack((('dag', 0), ('dag', 1))), TaskPack((('other', 3), ('dag', 4))), ('dag', 2)},
+                            {task.key for task in self.pending})
+        self.assertEqual(3, len(self.pending))
+        # nothing new was pushed
+        self.pending.regroup(TaskPacker(2).pack)
+        self.assertEqual(3, len(self.pending))
+        while self.pending:
+            self.pending.pop()
+        self.assertDictEqual({}, self.pending._ungrouped)
+
+    def test_task_share(self):
+        """Tasks are shared by DAG and queue"""
+        key = TaskInstanceKey('dag', 'task', 'run', 1)
+        self.assertEqual(('dag', 'default'), task_share(key, 'default'))
+        self.assertEqual(('dag', None), task_share(TaskPack((('dag', 0), ('other', 1))), None))
+        self.assertEqual((None, None), task_share('key', None))
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pending = PendingTaskQueue(aging_seconds=60, clock=self.clock)
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+from airflow.utils.state import State
+
+from airflow_aws_executors.polling import StatusPollingScheduler
+
+
+class TestStatusPollingScheduler(TestCase):
+    """Tests the StatusPollingScheduler"""
+    def test_untiered(self):
+        """Without tiers, every task is due on every heartbeat"""
+        scheduler = StatusPollingScheduler.from_config('')
+        scheduler.observe('AAA', State.RUNNING)
+        self.assertListEqual(['AAA', 'BBB'], scheduler.due(['AAA', 'BBB']))
+
+    def test_intervals(self):
+        """Tiers are picked by state and age"""
+        self.assertEqual(0, self.scheduler.interval(State.RUNNING, 0))
+        self.assertEqual(0, self.scheduler.interval(State.RUNNING, 599))
+        self.assertEqual(60, self.scheduler.interval(State.RUNNING, 600))
+        self.assertEqual(300, self.scheduler.interval(State.RUNNING, 36000))
+        self.assertEqual(10, self.scheduler.interval(State.QUEUED, 0))
+        # states without tiers are always due
+        self.assertEqual(0, self.scheduler.interval(State.SUCCESS, 36000))
+
+    def test_due(self):
+        """Tasks are only due once their interval has passed"""
+        self.assertListEqual(['AAA'], self.scheduler.due(['AAA']))
+        self.scheduler.observe('AAA', State.RUNNING)
+        self.assertListEqual(['AAA'], self.scheduler.due(['AAA']))
+
+        # once the task is older than 10 minutes it's checked every minute
+        self.now = 600
+        self.scheduler.observe('AAA', State.RUNNING)
+        self.now = 659
+        self.assertListEqual([], self.scheduler.due(['AAA']))
+        self.now = 660
+        self.assertListEqual(['AAA'], self.scheduler.due(['AAA']))
+
+        # a full sweep checks everything
+        self.now = 600
+        self.scheduler.observe('AAA', State.RUNNING)
+        self.scheduler.full_sweep = True
+        self.assertListEqual(['AAA'], self.scheduler.due(['AAA']))
+
+    def test_prune(self):
+        """Tasks that are no longer tracked are dropped"""
+        self.scheduler.due(['AAA', 'BBB'])
+        self.scheduler.observe('AAA', State.QUEUED)
+        self.scheduler.due(['BBB'])
+        self.assertNotIn('AAA', self.scheduler._first_seen)  # pylint: disable=protected-access
+        self.assertNotIn('AAA', self.scheduler._next_check)  # pylint: disable=protected-access
+
+    def test_invalid_config(self):
+        """Tiers must be a JSON object"""
+        with self.assertRaises(ValueError):
+            StatusPollingScheduler.from_config('[[0, 0]]')
+
+    def setUp(self):
+        self.now = 0
+        self.scheduler = StatusPollingScheduler.from_config(
+            '{"running": [[600, 60], [0, 0], [3600, 300]], "queued": [[0, 10]]}'
+        )
+        self.scheduler.clock = lambda: self.now
@@ -0,0 +1,48 @@
+from collections import namedtuple
+from unittest import TestCase
+
+from airflow_aws_executors.relaunch import RelaunchScheduler
+
+from .fake_aws import FakeClock
+
+QueuedTask = namedtuple('QueuedTask', ('key', 'command', 'queue', 'executor_config'))
+
+
+class TestRelaunchScheduler(TestCase):
+    """Tests the RelaunchScheduler"""
+    def test_backoff(self):
+        """Delays double with every failure up to the maximum, less a random fraction of up to the jitter"""
+        scheduler = RelaunchScheduler(initial_delay=10, max_delay=60, jitter=0, clock=self.clock)
+        self.assertListEqual([10, 20, 40, 60, 60], [scheduler.delay(failures) for failures in range(1, 6)])
+
+        scheduler = RelaunchScheduler(initial_delay=10, max_delay=60, jitter=0.5, rand=lambda: 1.0)
+        self.assertEqual(5, scheduler.delay(1))
+        self.assertEqual(30, scheduler.delay(10))
+
+    def test_pop_due(self):
+        """Tasks are only released once their backoff has elapsed, in the order that they became due"""
+        self.assertEqual(20, self.scheduler.schedule(QueuedTask('a', [], None, {}), 2))
+        self.assertEqual(10, self.scheduler.schedule(QueuedTask('b', [], None, {}), 1))
+        self.assertIn('a', self.scheduler)
+        self.assertEqual(2, len(self.scheduler))
+
+        self.clock.advance(9)
+        self.assertListEqual([], self.scheduler.pop_due())
+        self.clock.advance(11)
+        self.assertListEqual(['b', 'a'], [task.key for task in self.scheduler.pop_due()])
+        self.assertFalse(self.scheduler)
+
+    def test_reschedule(self):
+        """Scheduling a waiting task again replaces its previous relaunch"""
+        self.scheduler.schedule(QueuedTask('a', ['first'], None, {}), 1)
+        self.scheduler.schedule(QueuedTask('a', ['second'], None, {}), 2)
+        self.assertEqual(1, len(self.scheduler))
+        self.clock.advance(10)
+        self.assertListEqual([], self.scheduler.pop_due())
+        self.clock.advance(10)
+        self.assertListEqual([['second']], [task.command for task in self.scheduler.pop_due()])
+        self.assertNotIn('a', self.scheduler)
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = RelaunchScheduler(initial_delay=10, max_delay=300, jitter=0, clock=self.clock)
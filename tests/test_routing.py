@@ -0,0 +1,50 @@
+from unittest import TestCase, mock
+
+from airflow_aws_executors.routing import distinct_routes, load_queue_routes
+from airflow_aws_executors.templating import RequestTemplate
+
+DEFAULT_KWARGS = {'cluster': 'default-cluster', 'launchType': 'FARGATE', 'overrides': {'command': []}}
+
+# Routes for test_load
+QUEUE_ROUTES = {
+    'spot': {'launchType': None, 'capacityProviderStrategy': [{'capacityProvider': 'FARGATE_SPOT'}],
+             'failover_strategy': [{'capacityProvider': 'FARGATE'}]},
+    'heavy': {'cluster': 'heavy-cluster'},
+    'heavy_remote': {'cluster': 'heavy-cluster', 'region': 'us-east-2'},
+}
+
+
+class TestQueueRoutes(TestCase):
+    """Tests the loading of queue routes"""
+    def test_load(self):
+        """Routes update the default kwargs, and each gets its own client and template"""
+        create_client = mock.Mock(side_effect=lambda region: 'client-' + region)
+        routes = load_queue_routes('tests.test_routing.QUEUE_ROUTES', DEFAULT_KWARGS, 'us-west-1', create_client,
+                                   lambda kwargs: RequestTemplate(kwargs, ('overrides',)), 'default-failover')
+
+        self.assertDictEqual({
+            'cluster': 'default-cluster',
+            'overrides': {'command': []},
+            'capacityProviderStrategy': [{'capacityProvider': 'FARGATE_SPOT'}]
+        }, routes['spot'].kwargs)
+        self.assertEqual('heavy-cluster', routes['heavy'].kwargs['cluster'])
+        self.assertEqual('client-us-west-1', routes['heavy'].client)
+        self.assertEqual(('us-east-2', 'client-us-east-2'), (routes['heavy_remote'].region,
+                                                             routes['heavy_remote'].client))
+        self.assertNotIn('region', routes['heavy_remote'].kwargs)
+        self.assertEqual([{'capacityProvider': 'FARGATE'}], routes['spot'].failover_strategy)
+        self.assertEqual('default-failover', routes['heavy'].failover_strategy)
+        self.assertEqual(['airflow'], routes['heavy'].template.render(['airflow'])['overrides']['command'])
+        self.assertEqual(3, create_client.call_count)
+        # the default kwargs aren't modified
+        self.assertEqual('FARGATE', DEFAULT_KWARGS['launchType'])
+
+        # the spot route runs in the default cluster, so it isn't listed
+        self.assertListEqual([routes['heavy'], routes['heavy_remote']],
+                             distinct_routes(routes, 'cluster', 'us-west-1', 'default-cluster'))
+
+    def test_no_routes(self):
+        """Routing is optional, and routing tables must be dictionaries"""
+        self.assertDictEqual({}, load_queue_routes(None, DEFAULT_KWARGS, 'us-west-1', None, None))
+        with self.assertRaises(ValueError):
+            load_queue_routes('tests.test_routing.TestQueueRoutes', DEFAULT_KWARGS, 'us-west-1', None, None)
@@ -0,0 +1,50 @@
+from collections import namedtuple
+from unittest import TestCase, mock
+
+from airflow_aws_executors.packing import TaskPack
+from airflow_aws_executors.tagging import (TaggedTaskMatcher, packed_task_key_tag, tagged_task_key_identity,
+                                           task_key_identity, task_key_tags)
+
+TaskKey = namedtuple('TaskKey', ('dag_id', 'task_id', 'run_id', 'try_number'))
+
+
+class TestTaskKeyTags(TestCase):
+    """Tests the tags that identify an Airflow task key"""
+    def test_tags(self):
+        """Named members are tagged by name, and plain tuples by position"""
+        self.assertDictEqual(
+            {'airflow.dag_id': 'dag', 'airflow.task_id': 'task', 'airflow.run_id': 'manual__2021-01-01T00:00:00+00:00',
+             'airflow.try_number': '1'},
+            task_key_tags(TaskKey('dag', 'task', 'manual__2021-01-01T00:00:00+00:00', 1))
+        )
+        self.assertDictEqual({'airflow.key0': 'dag', 'airflow.key1': '2'}, task_key_tags(('dag', 2)))
+        self.assertEqual(256, len(task_key_tags(('d' * 300,))['airflow.key0']))
+
+    def test_identity(self):
+        """A task key is matched with the tags of a task, ignoring any other tags"""
+        key = TaskKey('dag', 'task', 'run', 1)
+        tags = dict(task_key_tags(key), team='data')
+        self.assertEqual(task_key_identity(key), tagged_task_key_identity(tags))
+        self.assertNotEqual(task_key_identity(key._replace(try_number=2)), tagged_task_key_identity(tags))
+        self.assertIsNone(tagged_task_key_identity({'team': 'data'}))
+
+    def test_pack_tags(self):
+        """The tasks of a pack are tagged by position, and keys that are too long for a tag by their digest"""
+        long_key = ('d' * 300, 'task')
+        tags = task_key_tags(TaskPack((('dag', 1), long_key)))
+        self.assertDictEqual({'airflow.pack.0': '["dag","1"]', 'airflow.pack.1': packed_task_key_tag(long_key)}, tags)
+        self.assertEqual(64, len(tags['airflow.pack.1']))
+        self.assertIsNone(tagged_task_key_identity(tags))
+
+    def test_matcher(self):
+        """Tags are matched once with orphaned task instances, and packs only once all of their tasks are orphaned"""
+        tis = [mock.Mock(key=('dag', i)) for i in range(5)]
+        matcher = TaggedTaskMatcher(tis[:4])
+        self.assertIsNone(matcher.match(task_key_tags(TaskPack((('dag', 3), ('dag', 4))))))
+        self.assertEqual((TaskPack((('dag', 0), ('dag', 1))), tis[:2]),
+                         matcher.match(dict(task_key_tags(TaskPack((('dag', 0), ('dag', 1)))), team='data')))
+        self.assertIsNone(matcher.match(task_key_tags(('dag', 1))))
+        self.assertEqual((('dag', 2), [tis[2]]), matcher.match(task_key_tags(('dag', 2))))
+        self.assertTrue(matcher)
+        self.assertEqual((('dag', 3), [tis[3]]), matcher.match(task_key_tags(('dag', 3))))
+        self.assertFalse(matcher)
@@ -0,0 +1,62 @@
+import json
+from copy import deepcopy
+from unittest import TestCase
+
+from airflow_aws_executors.templating import RequestTemplate
+
+
+class TestRequestTemplate(TestCase):
+    """Tests the copy-on-write RequestTemplate"""
+    def test_render(self):
+        """Rendered kwargs are identical to deep-copying and merging the template"""
+        for exec_config in ({}, {'memory': 512}, {'environment': [{'name': 'A', 'value': '1'}], 'cpu': 256}):
+            expected = deepcopy(self.kwargs)
+            expected['overrides']['containerOverrides'][1]['command'] = ['airflow', 'run']
+            expected['overrides']['containerOverrides'][1].update(exec_config)
+
+            actual = self.template.render(['airflow', 'run'], exec_config)
+            self.assertEqual(json.dumps(expected), json.dumps(actual))
+
+    def test_copy_on_write(self):
+        """Only the path to the container override is copied, and the template is never modified"""
+        original = deepcopy(self.kwargs)
+        first = self.template.render(['first'], {'memory': 512})
+        second = self.template.render(['second'], {'memory': 512})
+
+        self.assertEqual(['first'], first['overrides']['containerOverrides'][1]['command'])
+        self.assertEqual(['second'], second['overrides']['containerOverrides'][1]['command'])
+        self.assertDictEqual(original, self.kwargs)
+        # copied along the path
+        self.assertIsNot(first, self.kwargs)
+        self.assertIsNot(first['overrides'], self.kwargs['overrides'])
+        self.assertIsNot(first['overrides']['containerOverrides'], self.kwargs['overrides']['containerOverrides'])
+        # shared everywhere else
+        self.assertIs(first['networkConfiguration'], self.kwargs['networkConfiguration'])
+        self.assertIs(first['overrides']['containerOverrides'][0], self.kwargs['overrides']['containerOverrides'][0])
+        self.assertIs(first['overrides']['containerOverrides'][1]['environment'],
+                      self.kwargs['overrides']['containerOverrides'][1]['environment'])
+
+    def test_memoized_per_exec_config(self):
+        """Equal executor configs are merged once; unserializable executor configs are merged every time"""
+        self.template.render(['first'], {'memory': 512})
+        self.template.render(['second'], {'memory': 512})
+        self.template.render(['third'], {'memory': 1024})
+        self.assertEqual(2, len(self.template._merged_overrides))  # pylint: disable=protected-access
+
+        rendered = self.template.render(['fourth'], {'memory': object()})
+        self.assertEqual(['fourth'], rendered['overrides']['containerOverrides'][1]['command'])
+        self.assertEqual(2, len(self.template._merged_overrides))  # pylint: disable=protected-access
+
+    def setUp(self):
+        self.kwargs = {
+            'cluster': 'some-cluster',
+            'networkConfiguration': {'awsvpcConfiguration': {'subnets': ['SUB1', 'SUB2']}},
+            'overrides': {
+                'containerOverrides': [
+                    {'name': 'sidecar', 'command': ['sleep']},
+                    {'name': 'airflow', 'command': [], 'environment': [{'name': 'X', 'value': 'Y'}]}
+                ]
+            },
+            'count': 1
+        }
+        self.template = RequestTemplate(self.kwargs, ('overrides', 'containerOverrides', 1))
@@ -0,0 +1,113 @@
+from unittest import TestCase, mock
+
+from botocore.exceptions import ClientError
+
+from airflow_aws_executors.throttling import AdaptiveRateLimiter, TokenBucket, is_throttling_error
+
+
+def throttling_error(operation_name='DescribeTasks'):
+    """The error that Boto3 raises when a call is throttled"""
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation_name)
+
+
+class TestTokenBucket(TestCase):
+    """Tests the TokenBucket"""
+    def test_reserve(self):
+        """Tokens are handed out up to the burst, after which callers wait for the refill"""
+        now = 0
+        bucket = TokenBucket(rate=2, burst=2, clock=lambda: now)
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0.5, bucket.reserve())
+        self.assertEqual(1.0, bucket.reserve())
+        now = 10
+        self.assertEqual(0, bucket.reserve())
+
+
+class TestAdaptiveRateLimiter(TestCase):
+    """Tests the AdaptiveRateLimiter"""
+    def test_throttling_errors(self):
+        """Only throttling errors are retried"""
+        self.assertTrue(is_throttling_error(throttling_error()))
+        self.assertTrue(is_throttling_error(ClientError(
+            {'Error': {'Code': 'ClientException'}, 'ResponseMetadata': {'HTTPStatusCode': 429}}, 'SubmitJob'
+        )))
+        self.assertFalse(is_throttling_error(ClientError({'Error': {'Code': 'AccessDenied'}}, 'SubmitJob')))
+        self.assertFalse(is_throttling_error(ValueError()))
+
+    def test_retry(self):
+        """Throttled calls are retried with a jittered exponential backoff"""
+        api = mock.Mock(side_effect=[throttling_error(), throttling_error(), 'response'])
+        self.assertEqual('response', self.limiter.call('describe_tasks', api, tasks=['AAA']))
+        api.assert_called_with(tasks=['AAA'])
+        self.assertListEqual([0.05, 0.1], self.sleeps[:2])
+        # the retry then waits for the limit that was learned from throttling
+        self.assertEqual(0.5, self.limiter.limit('describe_tasks'))
+        self.assertEqual(3, len(self.sleeps))
+
+        # errors other than throttling are raised right away
+        api = mock.Mock(side_effect=ValueError())
+        with self.assertRaises(ValueError):
+            self.limiter.call('describe_tasks', api)
+        self.assertEqual(1, api.call_count)
+
+    def test_on_call(self):
+        """Every attempt is reported with its latency and error code"""
+        on_call = mock.Mock()
+        self.limiter.on_call = on_call
+        self.limiter.call('describe_tasks', mock.Mock(side_effect=[throttling_error(), 'response']))
+        with self.assertRaises(ValueError):
+            self.limiter.call('run_task', mock.Mock(side_effect=ValueError()))
+        self.assertListEqual([
+            mock.call('describe_tasks', mock.ANY, 'ThrottlingException'),
+            mock.call('describe_tasks', mock.ANY, None),
+            mock.call('run_task', mock.ANY, 'ValueError'),
+        ], on_call.call_args_list)
+
+    def test_max_retries(self):
+        """Calls that are still throttled after the maximum number of retries raise the error"""
+        api = mock.Mock(side_effect=throttling_error())
+        with self.assertRaises(ClientError):
+            self.limiter.call('run_task', api)
+        self.assertEqual(4, api.call_count)
+        self.assertEqual(4, self.limiter.stats()['run_task']['throttled'])
+
+    def test_budget(self):
+        """Operations with a budget are limited to it"""
+        limiter = AdaptiveRateLimiter.from_config('{"run_task": 2}')
+        self.assertEqual(2, limiter.limit('run_task'))
+        self.assertIsNone(limiter.limit('describe_tasks'))
+        limiter = AdaptiveRateLimiter({'run_task': 2}, clock=lambda: self.now, sleep=self.sleeps.append)
+        for _ in range(3):
+            limiter.call('run_task', lambda: None)
+        self.assertListEqual([0.5], self.sleeps)
+        with self.assertRaises(ValueError):
+            AdaptiveRateLimiter.from_config('[]')
+
+    def test_adaptation(self):
+        """Throttling cuts the limit, and successful calls recover it"""
+        api = mock.Mock(return_value='response')
+        for _ in range(600):
+            self.limiter.call('describe_tasks', api)
+        self.assertEqual(10, self.limiter.observed_rate('describe_tasks'))
+        self.assertIsNone(self.limiter.limit('describe_tasks'))
+
+        # the limit is learned from the throttled rate
+        api.side_effect = [throttling_error(), 'response']
+        self.limiter.call('describe_tasks', api)
+        self.assertAlmostEqual(5.0, self.limiter.limit('describe_tasks'), delta=0.2)
+
+        # once it has recovered to the throttled rate, the operation is unlimited again
+        api.side_effect = None
+        for _ in range(100):
+            self.limiter.call('describe_tasks', api)
+        self.assertIsNone(self.limiter.limit('describe_tasks'))
+        stats = self.limiter.stats()['describe_tasks']
+        self.assertEqual(1, stats['throttled'])
+        self.assertEqual(702, stats['calls'])
+        self.assertIsNone(stats['budget'])
+
+    def setUp(self):
+        self.now = 0
+        self.sleeps = []
+        self.limiter = AdaptiveRateLimiter(clock=lambda: self.now, sleep=self.sleeps.append, jitter=lambda: 0.5)
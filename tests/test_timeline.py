@@ -0,0 +1,126 @@
+import datetime as dt
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from airflow_aws_executors.timeline import (
+    JsonlTimelineSink, TaskTimeline, breakdown, epoch_seconds, load_timelines, main, report
+)
+
+from .fake_aws import FakeClock
+
+
+def task_events(key, *events):
+    """Timeline events of one ECS task, from (time, event, details) tuples"""
+    return [dict({'time': time, 'executor': 'ecs', 'event': event, 'key': list(key)}, **details)
+            for time, event, details in events]
+
+
+class TestTaskTimeline(TestCase):
+    """Tests the TaskTimeline"""
+    def test_record(self):
+        """Events are sent to the sink, and a task is only recorded running once per launch"""
+        events = []
+        clock = FakeClock(100)
+        timeline = TaskTimeline(events.append, 'ecs', clock=clock)
+        timeline.record(('dag', 'task', 1), 'queued')
+        timeline.record(('dag', 'task', 1), 'launched', arn='AAA')
+        for _ in range(2):
+            clock.advance(5)
+            timeline.record(('dag', 'task', 1), 'running', arn='AAA')
+        timeline.record(('dag', 'task', 1), 'queued', reason='MISSING')
+        timeline.record(('dag', 'task', 1), 'running', arn='BBB')
+        self.assertListEqual(['queued', 'launched', 'running', 'queued', 'running'], [e['event'] for e in events])
+        self.assertDictEqual({'time': 105, 'executor': 'ecs', 'event': 'running', 'key': ['dag', 'task', 1],
+                              'arn': 'AAA'}, events[2])
+
+    def test_from_config(self):
+        """Timelines go to a custom sink, or to a JSONL file, and are disabled if neither is configured"""
+        self.assertIsNone(TaskTimeline.from_config('ecs', None, None))
+        events = []
+        self.assertEqual(events.append, TaskTimeline.from_config('ecs', None, events.append).sink)
+        timeline = TaskTimeline.from_config('ecs', os.path.join(self.directory, 'timeline.jsonl'), None)
+        self.assertIsInstance(timeline.sink, JsonlTimelineSink)
+        timeline.close()
+
+    def test_jsonl_sink(self):
+        """Events are appended as JSON lines, and the file is rotated"""
+        path = os.path.join(self.directory, 'timeline.jsonl')
+        sink = JsonlTimelineSink(path, max_bytes=200, backup_count=2)
+        for i in range(10):
+            sink({'time': i, 'executor': 'batch', 'event': 'queued', 'key': ['dag', 'task', i]})
+        sink.close()
+        self.assertTrue(os.path.exists(path + '.1'))
+        self.assertFalse(os.path.exists(path + '.3'))
+        with open(path) as timeline_file:
+            self.assertEqual(9, json.loads(timeline_file.readlines()[-1])['key'][2])
+
+    def test_epoch_seconds(self):
+        """ECS timestamps are datetimes, Batch timestamps are milliseconds since the epoch"""
+        self.assertEqual(1600000000.5, epoch_seconds(1600000000500))
+        self.assertEqual(1600000000.0, epoch_seconds(dt.datetime.fromtimestamp(1600000000, dt.timezone.utc)))
+        self.assertIsNone(epoch_seconds(None))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+class TestTimelineReport(TestCase):
+    """Tests the offline breakdown of timelines"""
+    def test_breakdown(self):
+        """A task's time is broken down into segments between its events"""
+        self.assertDictEqual({
+            'pending': 1, 'launch_retries': 10, 'provisioning': 30, 'runtime': 100, 'detection': 15, 'reporting': 0,
+            'total': 156
+        }, breakdown(self.slow_task))
+        # without AWS' stop time, the runtime lasts until the task is seen stopped
+        self.assertDictEqual({'pending': 0, 'launch_retries': 0, 'provisioning': 5, 'runtime': 20, 'reporting': 1,
+                              'total': 26},
+                             breakdown(self.fast_task))
+        self.assertDictEqual({'pending': 0, 'launch_retries': 0}, breakdown(self.fast_task[:2]))
+
+    def test_report(self):
+        """The report has the percentiles of every segment, the critical segments, and the slowest tasks"""
+        lines = self.slow_task + self.fast_task + self.fast_task[:2]
+        output = report(load_timelines(json.dumps(line) for line in lines), slowest=1)
+        self.assertIn('2 tasks, 2 finished', output)
+        self.assertIn('by number of tasks: runtime 2', output)
+        self.assertIn('Launch failures by reason: RESOURCE:MEMORY 1', output)
+        self.assertIn("ecs ['dag', 'slow', 1] total=156.00s pending=1.00s launch_retries=10.00s", output)
+        self.assertNotIn("'fast'", output.split('Slowest tasks:')[1])
+
+    def test_main(self):
+        """The report is printed for the given JSONL files"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'timeline.jsonl')
+        with open(path, 'w') as timeline_file:
+            timeline_file.writelines(json.dumps(event) + '\n' for event in self.slow_task)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main([path])
+        self.assertIn('1 tasks, 1 finished', output.getvalue())
+
+    def setUp(self):
+        self.slow_task = task_events(
+            ('dag', 'slow', 1),
+            (0, 'queued', {}),
+            (1, 'launch_failed', {'reason': 'RESOURCE:MEMORY'}),
+            (11, 'launched', {'arn': 'AAA'}),
+            (41, 'running', {'arn': 'AAA'}),
+            (156, 'stopped', {'arn': 'AAA', 'stopped_at': 141}),
+            (156, 'finished', {'state': 'success'}),
+        )
+        self.fast_task = task_events(
+            ('dag', 'fast', 1),
+            (0, 'queued', {}),
+            (0, 'launched', {'arn': 'BBB'}),
+            (5, 'running', {'arn': 'BBB'}),
+            (25, 'stopped', {'arn': 'BBB', 'stopped_at': None}),
+            (26, 'finished', {'state': 'failed'}),
+        )
@@ -0,0 +1,201 @@
+import json
+from unittest import TestCase, mock
+
+from airflow_aws_executors.warm_pool import WarmWorkerPool
+from airflow_aws_executors.work_queue import LocalWorkQueue, SqsWorkQueue, WorkQueue, WorkResult
+from airflow_aws_executors.worker import COMMAND_NOT_RUN_EXIT_CODE, run_worker
+
+from .botocore_helper import assert_botocore_call, get_botocore_model
+from .fake_aws import FakeClock
+
+QUEUE_URL = 'https://sqs.us-west-1.amazonaws.com/000000000000/work'
+RESULTS_QUEUE_URL = 'https://sqs.us-west-1.amazonaws.com/000000000000/results'
+
+
+class FakeSqsClient:
+    """Simulates the SQS calls of a work queue, and checks every call against Botocore's API docs"""
+    def __init__(self):
+        self.model = get_botocore_model('sqs')
+        self.messages = {QUEUE_URL: [], RESULTS_QUEUE_URL: []}
+        self.in_flight = {}
+        self.fail_ids = set()
+        self._receipts = 0
+
+    def send_message(self, **kwargs):
+        self.__call('SendMessage', kwargs)
+        self.messages[kwargs['QueueUrl']].append(kwargs['MessageBody'])
+        return {}
+
+    def send_message_batch(self, **kwargs):
+        self.__call('SendMessageBatch', kwargs)
+        failed = [{'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError'}
+                  for entry in kwargs['Entries'] if entry['Id'] in self.fail_ids]
+        self.messages[kwargs['QueueUrl']].extend(entry['MessageBody'] for entry in kwargs['Entries']
+                                                 if entry['Id'] not in self.fail_ids)
+        return {'Successful': [], 'Failed': failed}
+
+    def receive_message(self, **kwargs):
+        self.__call('ReceiveMessage', kwargs)
+        queue = self.messages[kwargs['QueueUrl']]
+        messages = []
+        for body in queue[:kwargs['MaxNumberOfMessages']]:
+            self._receipts += 1
+            receipt = 'receipt-{}'.format(self._receipts)
+            self.in_flight[receipt] = body
+            messages.append({'Body': body, 'ReceiptHandle': receipt})
+        del queue[:kwargs['MaxNumberOfMessages']]
+        return {'Messages': messages} if messages else {}
+
+    def delete_message(self, **kwargs):
+        self.__call('DeleteMessage', kwargs)
+        del self.in_flight[kwargs['ReceiptHandle']]
+
+    def delete_message_batch(self, **kwargs):
+        self.__call('DeleteMessageBatch', kwargs)
+        for entry in kwargs['Entries']:
+            del self.in_flight[entry['ReceiptHandle']]
+        return {'Successful': [], 'Failed': []}
+
+    def __call(self, operation_name, kwargs):
+        assert_botocore_call(self.model, operation_name, [], kwargs)
+
+
+class TestWorkQueues(TestCase):
+    """Tests the local and SQS work queues"""
+    def test_interface(self):
+        """Work queues have to implement every operation"""
+        with self.assertRaises(TypeError):
+            WorkQueue()  # pylint: disable=abstract-class-instantiated
+
+    def test_local(self):
+        """Items are delivered in order, and results are drained"""
+        work_queue = LocalWorkQueue()
+        self.assertListEqual([], work_queue.put_many([('a', ['airflow', 'a']), ('b', ['airflow', 'b'])]))
+        self.assertIsNone(LocalWorkQueue().get(0))
+        item = work_queue.get(0.01)
+        self.assertEqual(('a', ['airflow', 'a']), (item.item_id, item.command))
+        work_queue.started(item, 'worker')
+        work_queue.finished(item, 'worker', 0)
+        self.assertListEqual([WorkResult('a', 'worker', None), WorkResult('a', 'worker', 0)], work_queue.results())
+        self.assertListEqual([], work_queue.results())
+        self.assertEqual(1, len(work_queue))
+
+    def test_sqs(self):
+        """Commands are sent in batches of 10, deleted once started, and results are received until none are left"""
+        sqs = FakeSqsClient()
+        work_queue = SqsWorkQueue(QUEUE_URL, RESULTS_QUEUE_URL, sqs_client=sqs)
+        sqs.fail_ids = {'1'}
+        failed = work_queue.put_many([(str(i), ['airflow', str(i)]) for i in range(12)])
+        # the second entry of each batch failed
+        self.assertListEqual(['1', '11'], failed)
+        self.assertEqual(10, len(sqs.messages[QUEUE_URL]))
+
+        for _ in range(10):
+            item = work_queue.get(60)
+            work_queue.started(item, 'worker')
+            work_queue.finished(item, 'worker', int(item.item_id) % 2)
+        self.assertIsNone(work_queue.get(0))
+        self.assertDictEqual({}, sqs.in_flight)
+        results = work_queue.results()
+        self.assertEqual(20, len(results))
+        self.assertEqual(WorkResult('0', 'worker', None), results[0])
+        # the failed item '1' was never sent
+        self.assertEqual(WorkResult('2', 'worker', 0), results[3])
+        self.assertDictEqual({}, sqs.in_flight)
+        self.assertListEqual([], work_queue.results())
+
+        work_queue.put('a', ('airflow', 'a'))
+        self.assertDictEqual({'item_id': 'a', 'command': ['airflow', 'a']}, json.loads(sqs.messages[QUEUE_URL][0]))
+
+
+class TestWarmWorkerPool(TestCase):
+    """Tests the WarmWorkerPool"""
+    def test_scaling(self):
+        """One worker is wanted per outstanding command, between the minimum and maximum"""
+        pool = WarmWorkerPool(LocalWorkQueue(), max_workers=3, min_workers=1)
+        self.assertEqual(1, pool.workers_wanted())
+        self.assertEqual(0, pool.workers_wanted(keep_warm=False))
+        for i in range(5):
+            pool.submit(('dag', 'task', i), ['airflow', str(i)])
+        self.assertEqual(3, pool.workers_wanted())
+        self.assertEqual(3, pool.workers_wanted(keep_warm=False))
+        pool.worker_launched('w1')
+        self.assertEqual(2, pool.workers_wanted())
+        self.assertListEqual([('dag', 'task', i) for i in range(5)], pool.flush())
+        self.assertListEqual([], pool.flush())
+        self.assertEqual(5, pool.outstanding)
+
+    def test_results(self):
+        """Started and finished commands are reported, and commands are lost with their worker"""
+        work_queue = LocalWorkQueue()
+        pool = WarmWorkerPool(work_queue, max_workers=3)
+        for i in range(3):
+            pool.submit(('dag', 'task', i), ['airflow', str(i)])
+        pool.flush()
+        for worker_id in ('w0', 'w1', 'w2'):
+            pool.worker_launched(worker_id)
+        first, second, third = work_queue.get(0), work_queue.get(0), work_queue.get(0)
+        work_queue.started(first, 'w0')
+        work_queue.finished(first, 'w0', 0)
+        work_queue.started(second, 'w1')
+        self.assertListEqual([(('dag', 'task', 0), 'w0', None), (('dag', 'task', 0), 'w0', 0),
+                              (('dag', 'task', 1), 'w1', None)], pool.collect())
+
+        # a worker that finished its command before stopping doesn't lose it
+        work_queue.finished(second, 'w1', 2)
+        pool.worker_stopped('w1')
+        self.assertListEqual([(('dag', 'task', 1), 'w1', 2)], pool.collect())
+        # a stopped worker's start is reported late
+        pool.worker_stopped('w2')
+        work_queue.started(third, 'w2')
+        self.assertListEqual([(('dag', 'task', 2), 'w2', None)], pool.collect())
+        self.assertListEqual([(('dag', 'task', 2), 'w2')], pool.pop_lost())
+        self.assertListEqual([], pool.pop_lost())
+        # the lost command's late exit code is ignored
+        work_queue.finished(third, 'w2', 0)
+        self.assertListEqual([], pool.collect())
+        self.assertEqual(0, pool.outstanding)
+        self.assertSetEqual({'w0'}, pool.workers)
+
+    def test_failed_put(self):
+        """Commands that couldn't be queued are sent again on the next flush"""
+        work_queue = mock.Mock(spec=LocalWorkQueue)
+        pool = WarmWorkerPool(work_queue, max_workers=1)
+        first_id = pool.submit(('dag', 'task', 0), ['airflow', '0'])
+        pool.submit(('dag', 'task', 1), ['airflow', '1'])
+        work_queue.put_many.return_value = [first_id]
+        self.assertListEqual([('dag', 'task', 1)], pool.flush())
+        work_queue.put_many.return_value = []
+        self.assertListEqual([('dag', 'task', 0)], pool.flush())
+        work_queue.put_many.assert_called_with([(first_id, ['airflow', '0'])])
+
+
+class TestWorker(TestCase):
+    """Tests the warm worker's loop"""
+    def test_run_worker(self):
+        """Commands are run until the worker has been idle for idle_timeout seconds"""
+        clock = FakeClock()
+        work_queue = LocalWorkQueue()
+        work_queue.put('a', ['airflow', 'a'])
+        work_queue.put('b', ['missing'])
+
+        def run(command):
+            clock.advance(100)
+            if command == ['missing']:
+                raise FileNotFoundError(command[0])
+            return 0
+
+        def get(wait_seconds):
+            item = LocalWorkQueue.get(work_queue, 0)
+            if item is None:
+                clock.advance(wait_seconds)
+            return item
+
+        with mock.patch.object(work_queue, 'get', side_effect=get) as get_mock:
+            self.assertEqual(2, run_worker(work_queue, 'worker', idle_timeout=50, poll_seconds=20, run=run,
+                                           clock=clock))
+        self.assertListEqual([20, 20, 20, 20, 10], [call_args[0][0] for call_args in get_mock.call_args_list])
+        self.assertListEqual([
+            WorkResult('a', 'worker', None), WorkResult('a', 'worker', 0),
+            WorkResult('b', 'worker', None), WorkResult('b', 'worker', COMMAND_NOT_RUN_EXIT_CODE),
+        ], work_queue.results())